@@ -0,0 +1,55 @@
+"""
+Chat service layer using API.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, convert_to_messages
+from loguru import logger
+
+from api.client import api_client
+
+
+class ChatService:
+    """Service layer for chat operations using API."""
+    
+    def __init__(self):
+        logger.info("Using API for chat operations")
+    
+    def get_history(self, session_id: str) -> Dict[str, Any]:
+        """Get the recent messages of a chat session and the summary of older ones."""
+        result = api_client.get_chat_messages(session_id)
+        return {
+            "messages": convert_to_messages(
+                [
+                    {"role": message["type"], "content": message["content"], "id": message["id"]}
+                    for message in result["messages"]
+                ]
+            ),
+            "summary": result.get("summary"),
+        }
+    
+    def get_messages(self, session_id: str) -> List[BaseMessage]:
+        """Get the recent messages of a chat session."""
+        return self.get_history(session_id)["messages"]
+    
+    def send_message(
+        self,
+        session_id: str,
+        message: str,
+        notebook_id: Optional[str] = None,
+        context_config: Optional[Dict] = None,
+        model_id: Optional[str] = None
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Send a chat message; yields the events of the streamed answer."""
+        yield from api_client.stream_chat_message(
+            session_id=session_id,
+            message=message,
+            notebook_id=notebook_id,
+            context_config=context_config,
+            model_id=model_id
+        )
+
+
+# Global service instance
+chat_service = ChatService()
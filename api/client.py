@@ -3,8 +3,9 @@ API client for Open Notebook API.
 This module provides a client interface to interact with the Open Notebook API.
 """
 
+import json
 import os
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import httpx
 from loguru import logger
@@ -184,6 +185,7 @@ class APIClient:
         description: str,
         prompt: str,
         apply_default: bool = False,
+        execution_mode: str = "single",
     ) -> Dict:
         """Create a new transformation."""
         data = {
@@ -192,6 +194,7 @@ class APIClient:
             "description": description,
             "prompt": prompt,
             "apply_default": apply_default,
+            "execution_mode": execution_mode,
         }
         return self._make_request("POST", "/api/transformations", json=data)
 
@@ -282,16 +285,71 @@ class APIClient:
 
     # Context API methods
     def get_notebook_context(
-        self, notebook_id: str, context_config: Optional[Dict] = None
+        self,
+        notebook_id: str,
+        context_config: Optional[Dict] = None,
+        question: Optional[str] = None,
+        token_budget: Optional[int] = None,
     ) -> Dict:
         """Get context for a notebook."""
-        data = {"notebook_id": notebook_id}
+        data: Dict = {"notebook_id": notebook_id}
         if context_config:
             data["context_config"] = context_config
+        if question:
+            data["question"] = question
+        if token_budget is not None:
+            data["token_budget"] = token_budget
         return self._make_request(
             "POST", f"/api/notebooks/{notebook_id}/context", json=data
         )
 
+    # Chat API methods
+    def get_chat_messages(self, session_id: str) -> Dict:
+        """Get the messages of a chat session."""
+        return self._make_request("GET", f"/api/chat/sessions/{session_id}/messages")
+
+    def stream_chat_message(
+        self,
+        session_id: str,
+        message: str,
+        notebook_id: Optional[str] = None,
+        context_config: Optional[Dict] = None,
+        model_id: Optional[str] = None,
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Send a chat message and yield the (event, data) pairs of its answer stream."""
+        url = f"{self.base_url}/api/chat/sessions/{session_id}/messages"
+        data: Dict[str, Any] = {"message": message}
+        if notebook_id:
+            data["notebook_id"] = notebook_id
+        if context_config:
+            data["context_config"] = context_config
+        if model_id:
+            data["model_id"] = model_id
+        # The answer may wait in the LLM queue before its first token
+        timeout = httpx.Timeout(self.timeout, read=300.0)
+        try:
+            with httpx.Client(timeout=timeout) as client:
+                with client.stream(
+                    "POST", url, json=data, headers=self.headers
+                ) as response:
+                    if response.is_error:
+                        response.read()
+                        logger.error(
+                            f"HTTP error {response.status_code} for POST {url}: {response.text}"
+                        )
+                        raise RuntimeError(
+                            f"API request failed: {response.status_code} - {response.text}"
+                        )
+                    event = "message"
+                    for line in response.iter_lines():
+                        if line.startswith("event:"):
+                            event = line[len("event:") :].strip()
+                        elif line.startswith("data:"):
+                            yield event, json.loads(line[len("data:") :])
+        except httpx.RequestError as e:
+            logger.error(f"Request error for POST {url}: {str(e)}")
+            raise ConnectionError(f"Failed to connect to API: {str(e)}")
+
     # Sources API methods
     def get_sources(self, notebook_id: Optional[str] = None) -> List[Dict]:
         """Get all sources with optional notebook filtering."""
@@ -348,9 +406,14 @@ class APIClient:
         """Update a source."""
         return self._make_request("PUT", f"/api/sources/{source_id}", json=updates)
 
-    def delete_source(self, source_id: str) -> Dict:
-        """Delete a source."""
-        return self._make_request("DELETE", f"/api/sources/{source_id}")
+    def delete_source(self, source_id: str, notebook_id: Optional[str] = None) -> Dict:
+        """Delete a source, or only remove it from a notebook."""
+        params = {}
+        if notebook_id:
+            params["notebook_id"] = notebook_id
+        return self._make_request(
+            "DELETE", f"/api/sources/{source_id}", params=params
+        )
 
     # Insights API methods
     def get_source_insights(self, source_id: str) -> List[Dict]:
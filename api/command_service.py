@@ -4,6 +4,7 @@ from loguru import logger
 from surreal_commands import get_command_status, submit_command
 
 from api.models import ErrorResponse
+from open_notebook.database.repository import ensure_record_id, repo_query
 
 
 class CommandService:
@@ -48,6 +49,10 @@ class CommandService:
         """Get status of any command job"""
         try:
             status = await get_command_status(job_id)
+            # surreal-commands does not expose progress; commands that report it
+            # store it on their command record
+            record = await CommandService.get_command_record(job_id)
+            progress = record.get("progress") if record else None
             return {
                 "job_id": job_id,
                 "status": status.status if status else "unknown",
@@ -61,12 +66,20 @@ class CommandService:
                 "updated": str(status.updated)
                 if status and hasattr(status, "updated") and status.updated
                 else None,
-                "progress": getattr(status, "progress", None) if status else None,
+                "progress": progress,
             }
         except Exception as e:
             logger.error(f"Failed to get command status: {e}")
             raise
 
+    @staticmethod
+    async def get_command_record(job_id: str) -> Optional[Dict[str, Any]]:
+        """Raw command record, including its arguments and stored progress"""
+        records = await repo_query(
+            "SELECT * FROM $job_id", {"job_id": ensure_record_id(job_id)}
+        )
+        return records[0] if records else None
+
     @staticmethod
     async def list_command_jobs(
         module_filter: Optional[str] = None,
@@ -18,12 +18,16 @@ class ContextService:
     def get_notebook_context(
         self,
         notebook_id: str,
-        context_config: Optional[Dict] = None
+        context_config: Optional[Dict] = None,
+        question: Optional[str] = None,
+        token_budget: Optional[int] = None
     ) -> Dict:
-        """Get context for a notebook."""
+        """Get context for a notebook, packed into the token budget."""
         result = api_client.get_notebook_context(
             notebook_id=notebook_id,
-            context_config=context_config
+            context_config=context_config,
+            question=question,
+            token_budget=token_budget
         )
         return result
 
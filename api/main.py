@@ -1,9 +1,12 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from api.auth import PasswordAuthMiddleware
-from api.routers import commands as commands_router
 from api.routers import (
+    chat,
     context,
     embedding,
     insights,
@@ -15,11 +18,22 @@ from api.routers import (
     sources,
     transformations,
 )
+from api.routers import commands as commands_router
+from open_notebook.checkpointer import close_checkpointer
+from open_notebook.metrics import render_metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_checkpointer()
+
 
 app = FastAPI(
     title="Open Notebook API",
     description="API for Open Notebook - Research Assistant",
     version="0.2.2",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -43,6 +57,7 @@ app.include_router(notes.router, prefix="/api", tags=["notes"])
 app.include_router(embedding.router, prefix="/api", tags=["embedding"])
 app.include_router(settings.router, prefix="/api", tags=["settings"])
 app.include_router(context.router, prefix="/api", tags=["context"])
+app.include_router(chat.router, prefix="/api", tags=["chat"])
 app.include_router(sources.router, prefix="/api", tags=["sources"])
 app.include_router(insights.router, prefix="/api", tags=["insights"])
 app.include_router(commands_router.router, prefix="/api", tags=["commands"])
@@ -56,3 +71,11 @@ async def root():
 @app.get("/health")
 async def health():
     return {"status": "healthy"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for this API process."""
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -106,6 +106,10 @@ class TransformationCreate(BaseModel):
     description: str = Field(..., description="Description of what this transformation does")
     prompt: str = Field(..., description="The transformation prompt")
     apply_default: bool = Field(False, description="Whether to apply this transformation by default")
+    execution_mode: Literal["single", "map_reduce"] = Field(
+        "single",
+        description="'single' sends the whole text in one prompt; 'map_reduce' transforms chunks of long texts concurrently and combines the results",
+    )
 
 
 class TransformationUpdate(BaseModel):
@@ -114,6 +118,9 @@ class TransformationUpdate(BaseModel):
     description: Optional[str] = Field(None, description="Description of what this transformation does")
     prompt: Optional[str] = Field(None, description="The transformation prompt")
     apply_default: Optional[bool] = Field(None, description="Whether to apply this transformation by default")
+    execution_mode: Optional[Literal["single", "map_reduce"]] = Field(
+        None, description="How the transformation runs on long texts"
+    )
 
 
 class TransformationResponse(BaseModel):
@@ -123,6 +130,7 @@ class TransformationResponse(BaseModel):
     description: str
     prompt: str
     apply_default: bool
+    execution_mode: str = "single"
     created: str
     updated: str
 
@@ -199,6 +207,20 @@ class SettingsUpdate(BaseModel):
 # Sources API models
 class SourceUploadResponse(BaseModel):
     file_path: str
+    sha256: Optional[str] = Field(None, description="SHA-256 of the stored file")
+    size: Optional[int] = Field(None, description="Size of the stored file in bytes")
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., description="Name of the file being uploaded")
+    size: Optional[int] = Field(None, description="Total size in bytes, if known", ge=0)
+
+
+class UploadSessionResponse(BaseModel):
+    upload_id: str
+    filename: str
+    size: Optional[int]
+    offset: int = Field(..., description="Bytes received so far; send the next piece from here")
 
 
 class ModelProvidersResponse(BaseModel):
@@ -222,6 +244,44 @@ class SourceCreate(BaseModel):
     transformations: Optional[List[str]] = Field(default_factory=list, description="Transformation IDs to apply")
     embed: bool = Field(False, description="Whether to embed content for vector search")
     delete_source: bool = Field(False, description="Whether to delete uploaded file after processing")
+    deduplicate: bool = Field(True, description="Reuse an existing source with identical content instead of creating a copy")
+    async_processing: bool = Field(False, description="Process in a background job and return its ID instead of waiting for the source")
+
+
+class SourceBulkItem(BaseModel):
+    type: str = Field(..., description="Source type: link, upload, or text")
+    url: Optional[str] = Field(None, description="URL for link type")
+    file_path: Optional[str] = Field(None, description="File path for upload type")
+    content: Optional[str] = Field(None, description="Text content for text type")
+    delete_source: bool = Field(False, description="Whether to delete uploaded file after processing")
+
+
+class SourceBulkCreate(BaseModel):
+    notebook_id: str = Field(..., description="Notebook ID to add the sources to")
+    items: List[SourceBulkItem] = Field(..., description="Sources to ingest", min_length=1, max_length=1000)
+    transformations: Optional[List[str]] = Field(default_factory=list, description="Transformation IDs to apply to every source")
+    embed: bool = Field(False, description="Whether to embed content for vector search")
+    deduplicate: bool = Field(True, description="Reuse an existing source with identical content instead of creating a copy")
+    max_retries: int = Field(1, description="Times a failing item is retried before it is marked as failed", ge=0, le=5)
+
+
+class SourceJobResponse(BaseModel):
+    job_id: str = Field(..., description="Background job ID, see /api/commands/jobs/{job_id}")
+    status: str
+    message: str
+
+
+class SourceIngestionResponse(BaseModel):
+    id: str
+    stage: str = Field(..., description="Last finished stage: pending, extracted, saved, embedded or done")
+    notebook_id: Optional[str]
+    source_id: Optional[str]
+    chunks_embedded: int
+    transformations: List[str]
+    transformations_done: List[str]
+    error: Optional[str]
+    created: str
+    updated: str
 
 
 class SourceUpdate(BaseModel):
@@ -260,6 +320,10 @@ class ContextConfig(BaseModel):
 class ContextRequest(BaseModel):
     notebook_id: str = Field(..., description="Notebook ID to get context for")
     context_config: Optional[ContextConfig] = Field(None, description="Context configuration")
+    question: Optional[str] = Field(None, description="Current question, used to rank context items by relevance")
+    token_budget: Optional[int] = Field(
+        None, ge=0, description="Token budget of the context; all selected items are returned if omitted or 0"
+    )
 
 
 class ContextResponse(BaseModel):
@@ -267,6 +331,37 @@ class ContextResponse(BaseModel):
     sources: List[Dict[str, Any]] = Field(..., description="Source context data")
     notes: List[Dict[str, Any]] = Field(..., description="Note context data")
     total_tokens: Optional[int] = Field(None, description="Estimated token count")
+    token_budget: Optional[int] = Field(None, description="Token budget applied to the context")
+    dropped: List[Dict[str, Any]] = Field(
+        default_factory=list, description="Items left out to fit the budget, with their token counts and relevance scores"
+    )
+
+
+# Chat API models
+class ChatMessageRequest(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
+    message: str = Field(..., description="User message")
+    notebook_id: Optional[str] = Field(
+        None, description="Notebook whose context is sent with the message; the session's last context is kept if omitted"
+    )
+    context_config: Optional[ContextConfig] = Field(None, description="Context configuration")
+    token_budget: Optional[int] = Field(
+        None, ge=0, description="Token budget of the context; defaults to CONTEXT_TOKEN_BUDGET, 0 disables it"
+    )
+    model_id: Optional[str] = Field(None, description="Model ID (uses the default chat model if not provided)")
+
+
+class ChatMessage(BaseModel):
+    id: Optional[str] = None
+    type: str = Field(..., description="Message type: human or ai")
+    content: str
+
+
+class ChatSessionMessagesResponse(BaseModel):
+    session_id: str
+    messages: List[ChatMessage] = Field(default_factory=list, description="Recent messages of the session, oldest first")
+    summary: Optional[str] = Field(None, description="Summary of the earlier messages that are no longer kept")
 
 
 # Insights API models
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import weakref
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+from loguru import logger
+
+from api.models import ChatMessage, ChatMessageRequest, ChatSessionMessagesResponse
+from open_notebook.checkpointer import prune_checkpoints_periodically
+from open_notebook.context_cache import notebook_context_cache
+from open_notebook.context_packer import (
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    pack_notebook_context,
+)
+from open_notebook.domain.notebook import ChatSession
+from open_notebook.exceptions import InvalidInputError, NotFoundError
+from open_notebook.graphs.chat import get_chat_graph, message_text, stream_chat
+
+router = APIRouter()
+
+# One turn at a time per session, so concurrent requests do not fork its history
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+def _chat_messages(messages: List[Any]) -> List[ChatMessage]:
+    return [
+        ChatMessage(
+            id=message.id, type=message.type, content=message_text(message.content)
+        )
+        for message in messages
+        if message.type in ("human", "ai")
+    ]
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _chat_context(request: ChatMessageRequest) -> Optional[Dict[str, Any]]:
+    """Notebook context for the message, packed against it as the question."""
+    if not request.notebook_id:
+        return None
+    context = await notebook_context_cache.get(
+        request.notebook_id, request.context_config
+    )
+    budget = (
+        request.token_budget
+        if request.token_budget is not None
+        else DEFAULT_CONTEXT_TOKEN_BUDGET
+    )
+    packed_context, _ = pack_notebook_context(
+        context.sources, context.notes, budget, request.message, items=context.items
+    )
+    return packed_context
+
+
+async def _stream_turn(
+    session: ChatSession, state: Dict[str, Any], config: RunnableConfig
+) -> AsyncIterator[str]:
+    lock = _session_locks.setdefault(str(session.id), asyncio.Lock())
+    try:
+        async with lock:
+            graph = await get_chat_graph()
+            async for kind, data in stream_chat(graph, state, config):
+                if kind == "token":
+                    yield _sse("token", {"content": data})
+                    continue
+                messages = _chat_messages((data or {}).get("messages", []))
+                if messages:
+                    yield _sse("message", messages[-1].model_dump())
+            await session.save()
+            await prune_checkpoints_periodically()
+        yield _sse("done", {})
+    except Exception as e:
+        logger.error(f"Error in chat session {session.id}: {str(e)}")
+        logger.exception(e)
+        yield _sse("error", {"message": str(e)})
+
+
+@router.get(
+    "/chat/sessions/{session_id}/messages",
+    response_model=ChatSessionMessagesResponse,
+)
+async def get_chat_messages(session_id: str):
+    """Get the messages of a chat session from its saved state."""
+    try:
+        await ChatSession.get(session_id)
+        graph = await get_chat_graph()
+        snapshot = await graph.aget_state({"configurable": {"thread_id": session_id}})
+        return ChatSessionMessagesResponse(
+            session_id=session_id,
+            messages=_chat_messages(snapshot.values.get("messages", [])),
+            summary=snapshot.values.get("summary"),
+        )
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    except Exception as e:
+        logger.error(f"Error getting messages of chat session {session_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error getting chat messages: {str(e)}"
+        )
+
+
+@router.post("/chat/sessions/{session_id}/messages")
+async def send_chat_message(session_id: str, chat_request: ChatMessageRequest):
+    """
+    Send a message to a chat session and stream the answer as Server-Sent
+    Events: "token" events while it is generated, then "message" with the
+    saved answer and "done" (or "error").
+    """
+    if not chat_request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    try:
+        session = await ChatSession.get(session_id)
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+
+    try:
+        state: Dict[str, Any] = {
+            "messages": [HumanMessage(content=chat_request.message)]
+        }
+        context = await _chat_context(chat_request)
+        if context is not None:
+            state["context"] = context
+            state["context_config"] = (
+                chat_request.context_config.model_dump()
+                if chat_request.context_config
+                else {}
+            )
+        config = RunnableConfig(
+            configurable={"thread_id": session_id, "model_id": chat_request.model_id}
+        )
+        return StreamingResponse(
+            _stream_turn(session, state, config),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Notebook not found")
+    except InvalidInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error starting chat turn in session {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
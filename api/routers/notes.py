@@ -4,6 +4,7 @@ from fastapi import APIRouter, HTTPException, Query
 from loguru import logger
 
 from api.models import NoteCreate, NoteResponse, NoteUpdate
+from open_notebook.database.repository import transaction
 from open_notebook.domain.notebook import Note
 from open_notebook.exceptions import InvalidInputError
 
@@ -65,15 +66,18 @@ async def create_note(note_data: NoteCreate):
             content=note_data.content,
             note_type=note_data.note_type,
         )
-        await new_note.save()
-        
-        # Add to notebook if specified
+        # Verify the notebook before writing so a missing one leaves no orphan note
         if note_data.notebook_id:
             from open_notebook.domain.notebook import Notebook
             notebook = await Notebook.get(note_data.notebook_id)
             if not notebook:
                 raise HTTPException(status_code=404, detail="Notebook not found")
-            await new_note.add_to_notebook(note_data.notebook_id)
+
+        async with transaction():
+            await new_note.save()
+            # Add to notebook if specified
+            if note_data.notebook_id:
+                await new_note.add_to_notebook(note_data.notebook_id)
         
         return NoteResponse(
             id=new_note.id,
@@ -1,25 +1,35 @@
-import os
-from pathlib import Path
-import uuid
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Union
 
-from fastapi import APIRouter, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile
 from loguru import logger
+from starlette.requests import ClientDisconnect
 
+from api.command_service import CommandService
 from api.models import (
     AssetModel,
     CreateSourceInsightRequest,
     SourceCreate,
+    SourceBulkCreate,
+    SourceBulkItem,
+    SourceIngestionResponse,
     SourceInsightResponse,
+    SourceJobResponse,
     SourceListResponse,
     SourceResponse,
-    SourceUpdate, SourceUploadResponse,
+    SourceUpdate,
+    SourceUploadResponse,
+    UploadSessionCreate,
+    UploadSessionResponse,
 )
-from open_notebook.domain.notebook import Notebook, Source
-from open_notebook.config import UPLOADS_FOLDER
+from open_notebook.domain.notebook import Notebook, Source, SourceIngestion
 from open_notebook.domain.transformation import Transformation
-from open_notebook.exceptions import InvalidInputError
+from open_notebook.exceptions import (
+    FileTooLargeError,
+    InvalidInputError,
+    NotFoundError,
+)
 from open_notebook.graphs.source import source_graph
+from open_notebook.uploads import UPLOAD_BLOCK_SIZE, UploadSession, save_upload
 
 router = APIRouter()
 
@@ -28,30 +38,164 @@ router = APIRouter()
 
 @router.post("/sources/upload", response_model=SourceUploadResponse)
 async def upload_source_file(file: UploadFile = File(...)):
-    """Upload a file to the server and return its stored path."""
+    """
+    Upload a file to the server and return its stored path and SHA-256.
+
+    For large files prefer the resumable /sources/uploads endpoints, which
+    stream each piece straight to disk.
+    """
     if not file.filename:
         raise HTTPException(status_code=400, detail="Filename is required")
 
-    os.makedirs(UPLOADS_FOLDER, exist_ok=True)
-    original_name = Path(file.filename).stem
-    extension = Path(file.filename).suffix
-    safe_name = f"{original_name}_{uuid.uuid4().hex}{extension}"
-    destination = Path(UPLOADS_FOLDER) / safe_name
+    async def chunks():
+        while chunk := await file.read(UPLOAD_BLOCK_SIZE):
+            yield chunk
 
     try:
-        with destination.open('wb') as buffer:
-            while True:
-                chunk = await file.read(1024 * 1024)
-                if not chunk:
-                    break
-                buffer.write(chunk)
+        destination, sha256, size = await save_upload(chunks(), file.filename)
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as exc:
-        if destination.exists():
-            destination.unlink(missing_ok=True)
         logger.error(f"Error saving uploaded file: {exc}")
         raise HTTPException(status_code=500, detail="Failed to store uploaded file")
 
-    return SourceUploadResponse(file_path=str(destination))
+    return SourceUploadResponse(file_path=str(destination), sha256=sha256, size=size)
+
+
+def _upload_session_response(session: UploadSession) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        upload_id=session.id,
+        filename=session.filename,
+        size=session.size,
+        offset=session.offset,
+    )
+
+
+async def _load_upload_session(upload_id: str) -> UploadSession:
+    try:
+        return await UploadSession.load(upload_id)
+    except NotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+
+@router.post("/sources/uploads", response_model=UploadSessionResponse)
+async def create_upload_session(session_data: UploadSessionCreate):
+    """
+    Start a resumable upload. Send the file in pieces with
+    PUT /sources/uploads/{upload_id}?offset=N, then finish it with
+    POST /sources/uploads/{upload_id}/complete.
+    """
+    try:
+        session = await UploadSession.create(session_data.filename, session_data.size)
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _upload_session_response(session)
+
+
+@router.get("/sources/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload_session(upload_id: str):
+    """Bytes received so far, to resume an interrupted upload."""
+    return _upload_session_response(await _load_upload_session(upload_id))
+
+
+@router.put("/sources/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def append_upload_piece(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., description="Position of this piece in the file", ge=0),
+):
+    """
+    Append the raw request body at `offset`, which must equal the bytes
+    received so far (409 otherwise, with the expected offset in the detail).
+    """
+    session = await _load_upload_session(upload_id)
+    try:
+        await session.append(request.stream(), offset)
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidInputError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ClientDisconnect:
+        logger.warning(
+            f"Upload {upload_id} interrupted at {session.offset} bytes, can be resumed"
+        )
+        raise HTTPException(status_code=400, detail="Upload interrupted")
+    except Exception as e:
+        logger.error(f"Error storing upload piece for {upload_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to store upload piece")
+    return _upload_session_response(session)
+
+
+@router.post(
+    "/sources/uploads/{upload_id}/complete", response_model=SourceUploadResponse
+)
+async def complete_upload_session(upload_id: str):
+    """Finish a resumable upload and return the stored path and SHA-256."""
+    session = await _load_upload_session(upload_id)
+    try:
+        destination, sha256, size = await session.complete()
+    except InvalidInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error completing upload {upload_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to complete upload")
+    return SourceUploadResponse(file_path=str(destination), sha256=sha256, size=size)
+
+
+@router.delete("/sources/uploads/{upload_id}")
+async def abort_upload_session(upload_id: str):
+    """Discard a resumable upload and the data received for it."""
+    session = await _load_upload_session(upload_id)
+    await session.abort()
+    return {"message": "Upload discarded"}
+
+
+def build_content_state(
+    source_data: Union[SourceCreate, SourceBulkItem],
+) -> Dict[str, Any]:
+    """Content state for source_graph, validating the fields of the source type."""
+    content_state: Dict[str, Any] = {}
+
+    if source_data.type == "link":
+        if not source_data.url:
+            raise HTTPException(status_code=400, detail="URL is required for link type")
+        content_state["url"] = source_data.url
+    elif source_data.type == "upload":
+        if not source_data.file_path:
+            raise HTTPException(
+                status_code=400, detail="File path is required for upload type"
+            )
+        content_state["file_path"] = source_data.file_path
+        content_state["delete_source"] = source_data.delete_source
+    elif source_data.type == "text":
+        if not source_data.content:
+            raise HTTPException(
+                status_code=400, detail="Content is required for text type"
+            )
+        content_state["content"] = source_data.content
+    else:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid source type. Must be link, upload, or text",
+        )
+    return content_state
+
+
+async def get_transformations(
+    transformation_ids: Optional[List[str]],
+) -> List[Transformation]:
+    transformations = []
+    for trans_id in transformation_ids or []:
+        transformation = await Transformation.get(trans_id)
+        if not transformation:
+            raise HTTPException(
+                status_code=404, detail=f"Transformation {trans_id} not found"
+            )
+        transformations.append(transformation)
+    return transformations
+
 
 @router.get("/sources", response_model=List[SourceListResponse])
 async def get_sources(
@@ -99,9 +243,15 @@ async def get_sources(
         raise HTTPException(status_code=500, detail=f"Error fetching sources: {str(e)}")
 
 
-@router.post("/sources", response_model=SourceResponse)
+@router.post("/sources", response_model=Union[SourceResponse, SourceJobResponse])
 async def create_source(source_data: SourceCreate):
-    """Create a new source."""
+    """
+    Create a new source.
+
+    With `async_processing` the source is processed by a background command and
+    the job ID is returned right away; poll /api/commands/jobs/{job_id} for its
+    stage-level progress.
+    """
     try:
         # Verify notebook exists
         notebook = await Notebook.get(source_data.notebook_id)
@@ -109,43 +259,28 @@ async def create_source(source_data: SourceCreate):
             raise HTTPException(status_code=404, detail="Notebook not found")
 
         # Prepare content_state for source_graph
-        content_state = {}
-
-        if source_data.type == "link":
-            if not source_data.url:
-                raise HTTPException(
-                    status_code=400, detail="URL is required for link type"
-                )
-            content_state["url"] = source_data.url
-        elif source_data.type == "upload":
-            if not source_data.file_path:
-                raise HTTPException(
-                    status_code=400, detail="File path is required for upload type"
-                )
-            content_state["file_path"] = source_data.file_path
-            content_state["delete_source"] = source_data.delete_source
-        elif source_data.type == "text":
-            if not source_data.content:
-                raise HTTPException(
-                    status_code=400, detail="Content is required for text type"
-                )
-            content_state["content"] = source_data.content
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid source type. Must be link, upload, or text",
-            )
+        content_state = build_content_state(source_data)
 
         # Get transformations to apply
-        transformations = []
-        if source_data.transformations:
-            for trans_id in source_data.transformations:
-                transformation = await Transformation.get(trans_id)
-                if not transformation:
-                    raise HTTPException(
-                        status_code=404, detail=f"Transformation {trans_id} not found"
-                    )
-                transformations.append(transformation)
+        transformations = await get_transformations(source_data.transformations)
+
+        if source_data.async_processing:
+            job_id = await CommandService.submit_command_job(
+                "open_notebook",
+                "process_source",
+                {
+                    "notebook_id": source_data.notebook_id,
+                    "content_state": content_state,
+                    "transformations": [str(t.id) for t in transformations],
+                    "embed": source_data.embed,
+                    "deduplicate": source_data.deduplicate,
+                },
+            )
+            return SourceJobResponse(
+                job_id=job_id,
+                status="submitted",
+                message="Source submitted for background processing",
+            )
 
         # Process source using the source_graph
         result = await source_graph.ainvoke(
@@ -154,6 +289,7 @@ async def create_source(source_data: SourceCreate):
                 "notebook_id": source_data.notebook_id,
                 "apply_transformations": transformations,
                 "embed": source_data.embed,
+                "deduplicate": source_data.deduplicate,
             }
         )
 
@@ -183,6 +319,170 @@ async def create_source(source_data: SourceCreate):
         raise HTTPException(status_code=500, detail=f"Error creating source: {str(e)}")
 
 
+@router.post("/sources/bulk", response_model=SourceJobResponse)
+async def create_sources_bulk(bulk_data: SourceBulkCreate):
+    """
+    Ingest many sources into one notebook in a single background job.
+
+    Items are processed concurrently with separate limits for extraction,
+    embedding and transformations. Poll /api/commands/jobs/{job_id} for the
+    status of every item; failed items can be resumed with
+    POST /api/sources/bulk/{job_id}/retry.
+    """
+    try:
+        notebook = await Notebook.get(bulk_data.notebook_id)
+        if not notebook:
+            raise HTTPException(status_code=404, detail="Notebook not found")
+
+        items = []
+        for index, item in enumerate(bulk_data.items):
+            try:
+                items.append(build_content_state(item))
+            except HTTPException as e:
+                raise HTTPException(
+                    status_code=e.status_code, detail=f"Item {index}: {e.detail}"
+                )
+        transformations = await get_transformations(bulk_data.transformations)
+
+        job_id = await CommandService.submit_command_job(
+            "open_notebook",
+            "process_source_batch",
+            {
+                "notebook_id": bulk_data.notebook_id,
+                "items": items,
+                "transformations": [str(t.id) for t in transformations],
+                "embed": bulk_data.embed,
+                "deduplicate": bulk_data.deduplicate,
+                "max_retries": bulk_data.max_retries,
+            },
+        )
+        return SourceJobResponse(
+            job_id=job_id,
+            status="submitted",
+            message=f"{len(items)} sources submitted for background processing",
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error submitting bulk sources: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error submitting bulk sources: {str(e)}"
+        )
+
+
+@router.post("/sources/bulk/{job_id}/retry", response_model=SourceJobResponse)
+async def retry_sources_bulk(job_id: str):
+    """
+    Resume the failed items of a bulk ingestion job in a new job. Items that
+    reached a checkpoint continue from it, so only their missing stages,
+    chunks and transformations run; the others start over.
+    """
+    try:
+        record = await CommandService.get_command_record(job_id)
+        if not record or record.get("name") != "process_source_batch":
+            raise HTTPException(status_code=404, detail="Bulk ingestion job not found")
+
+        progress = record.get("progress") or {}
+        failed = [
+            (index, item.get("ingestion_id"))
+            for index, item in enumerate(progress.get("items", []))
+            if item.get("status") == "failed"
+        ]
+        if not failed:
+            raise HTTPException(status_code=400, detail="No failed items to retry")
+
+        args = {
+            key: value
+            for key, value in record["args"].items()
+            if key != "execution_context"
+        }
+        args["items"] = [args["items"][index] for index, _ in failed]
+        args["ingestion_ids"] = [ingestion_id for _, ingestion_id in failed]
+        new_job_id = await CommandService.submit_command_job(
+            "open_notebook", "process_source_batch", args
+        )
+        resumed = sum(1 for ingestion_id in args["ingestion_ids"] if ingestion_id)
+        return SourceJobResponse(
+            job_id=new_job_id,
+            status="submitted",
+            message=(
+                f"{len(failed)} failed sources resubmitted, "
+                f"{resumed} of them from their checkpoint"
+            ),
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrying bulk sources {job_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error retrying bulk sources: {str(e)}"
+        )
+
+
+@router.get("/sources/ingestions", response_model=List[SourceIngestionResponse])
+async def get_incomplete_ingestions(
+    limit: int = Query(100, description="Maximum number of ingestions", le=1000),
+):
+    """List background ingestions that have not finished, oldest first."""
+    try:
+        ingestions = await SourceIngestion.get_incomplete(limit)
+        return [
+            SourceIngestionResponse(
+                id=ingestion.id,
+                stage=ingestion.stage,
+                notebook_id=ingestion.notebook_id,
+                source_id=ingestion.source,
+                chunks_embedded=ingestion.chunks_embedded,
+                transformations=ingestion.transformations,
+                transformations_done=ingestion.transformations_done,
+                error=ingestion.error,
+                created=str(ingestion.created),
+                updated=str(ingestion.updated),
+            )
+            for ingestion in ingestions
+        ]
+    except Exception as e:
+        logger.error(f"Error fetching ingestions: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error fetching ingestions: {str(e)}"
+        )
+
+
+@router.post(
+    "/sources/ingestions/{ingestion_id}/resume", response_model=SourceJobResponse
+)
+async def resume_ingestion(ingestion_id: str):
+    """
+    Resume an interrupted background ingestion from its last checkpoint. Only
+    the missing stages, chunks and transformations are processed.
+    """
+    try:
+        try:
+            ingestion = await SourceIngestion.get(ingestion_id)
+        except NotFoundError:
+            raise HTTPException(status_code=404, detail="Ingestion not found")
+        if ingestion.reached("done"):
+            raise HTTPException(status_code=400, detail="Ingestion already finished")
+
+        job_id = await CommandService.submit_command_job(
+            "open_notebook",
+            "resume_source_ingestion",
+            {"ingestion_id": ingestion_id},
+        )
+        return SourceJobResponse(
+            job_id=job_id,
+            status="submitted",
+            message=f"Ingestion resumed after stage '{ingestion.stage}'",
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error resuming ingestion {ingestion_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error resuming ingestion: {str(e)}"
+        )
+
+
 @router.get("/sources/{source_id}", response_model=SourceResponse)
 async def get_source(source_id: str):
     """Get a specific source by ID."""
@@ -254,14 +554,24 @@ async def update_source(source_id: str, source_update: SourceUpdate):
 
 
 @router.delete("/sources/{source_id}")
-async def delete_source(source_id: str):
-    """Delete a source."""
+async def delete_source(
+    source_id: str,
+    notebook_id: Optional[str] = Query(
+        None,
+        description="Only remove the source from this notebook; it is deleted once no notebook references it",
+    ),
+):
+    """Delete a source, or remove it from one notebook."""
     try:
         source = await Source.get(source_id)
         if not source:
             raise HTTPException(status_code=404, detail="Source not found")
 
-        await source.delete()
+        if notebook_id:
+            if not await source.remove_from_notebook(notebook_id):
+                return {"message": "Source removed from notebook"}
+        else:
+            await source.delete()
 
         return {"message": "Source deleted successfully"}
     except HTTPException:
@@ -318,7 +628,8 @@ async def create_source_insight(
         # Run transformation graph
         from open_notebook.graphs.transformation import graph as transform_graph
         await transform_graph.ainvoke(
-            input=dict(source=source, transformation=transformation)
+            input=dict(source=source, transformation=transformation),
+            config=dict(configurable={"llm_priority": "interactive"}),
         )
         
         # Get the newly created insight (last one)
@@ -32,6 +32,7 @@ async def get_transformations():
                 description=transformation.description,
                 prompt=transformation.prompt,
                 apply_default=transformation.apply_default,
+                execution_mode=transformation.execution_mode,
                 created=str(transformation.created),
                 updated=str(transformation.updated),
             )
@@ -54,6 +55,7 @@ async def create_transformation(transformation_data: TransformationCreate):
             description=transformation_data.description,
             prompt=transformation_data.prompt,
             apply_default=transformation_data.apply_default,
+            execution_mode=transformation_data.execution_mode,
         )
         await new_transformation.save()
 
@@ -64,6 +66,7 @@ async def create_transformation(transformation_data: TransformationCreate):
             description=new_transformation.description,
             prompt=new_transformation.prompt,
             apply_default=new_transformation.apply_default,
+            execution_mode=new_transformation.execution_mode,
             created=str(new_transformation.created),
             updated=str(new_transformation.updated),
         )
@@ -93,6 +96,7 @@ async def get_transformation(transformation_id: str):
             description=transformation.description,
             prompt=transformation.prompt,
             apply_default=transformation.apply_default,
+            execution_mode=transformation.execution_mode,
             created=str(transformation.created),
             updated=str(transformation.updated),
         )
@@ -128,6 +132,8 @@ async def update_transformation(
             transformation.prompt = transformation_update.prompt
         if transformation_update.apply_default is not None:
             transformation.apply_default = transformation_update.apply_default
+        if transformation_update.execution_mode is not None:
+            transformation.execution_mode = transformation_update.execution_mode
 
         await transformation.save()
 
@@ -138,6 +144,7 @@ async def update_transformation(
             description=transformation.description,
             prompt=transformation.prompt,
             apply_default=transformation.apply_default,
+            execution_mode=transformation.execution_mode,
             created=str(transformation.created),
             updated=str(transformation.updated),
         )
@@ -192,7 +199,12 @@ async def execute_transformation(execute_request: TransformationExecuteRequest):
                 input_text=execute_request.input_text,
                 transformation=transformation,
             ),
-            config=dict(configurable={"model_id": execute_request.model_id}),
+            config=dict(
+                configurable={
+                    "model_id": execute_request.model_id,
+                    "llm_priority": "interactive",
+                }
+            ),
         )
 
         return TransformationExecuteResponse(
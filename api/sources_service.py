@@ -173,9 +173,9 @@ class SourcesService:
 
         return source
 
-    def delete_source(self, source_id: str) -> bool:
-        """Delete a source."""
-        api_client.delete_source(source_id)
+    def delete_source(self, source_id: str, notebook_id: Optional[str] = None) -> bool:
+        """Delete a source, or only remove it from a notebook."""
+        api_client.delete_source(source_id, notebook_id=notebook_id)
         return True
 
 
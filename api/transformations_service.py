@@ -29,6 +29,7 @@ class TransformationsService:
                 description=trans_data["description"],
                 prompt=trans_data["prompt"],
                 apply_default=trans_data["apply_default"],
+                execution_mode=trans_data.get("execution_mode", "single"),
             )
             transformation.id = trans_data["id"]
             transformation.created = datetime.fromisoformat(trans_data["created"].replace('Z', '+00:00'))
@@ -45,6 +46,7 @@ class TransformationsService:
             description=trans_data["description"],
             prompt=trans_data["prompt"],
             apply_default=trans_data["apply_default"],
+            execution_mode=trans_data.get("execution_mode", "single"),
         )
         transformation.id = trans_data["id"]
         transformation.created = datetime.fromisoformat(trans_data["created"].replace('Z', '+00:00'))
@@ -57,7 +59,8 @@ class TransformationsService:
         title: str,
         description: str,
         prompt: str,
-        apply_default: bool = False
+        apply_default: bool = False,
+        execution_mode: str = "single"
     ) -> Transformation:
         """Create a new transformation."""
         trans_data = api_client.create_transformation(
@@ -65,7 +68,8 @@ class TransformationsService:
             title=title,
             description=description,
             prompt=prompt,
-            apply_default=apply_default
+            apply_default=apply_default,
+            execution_mode=execution_mode
         )
         transformation = Transformation(
             name=trans_data["name"],
@@ -73,6 +77,7 @@ class TransformationsService:
             description=trans_data["description"],
             prompt=trans_data["prompt"],
             apply_default=trans_data["apply_default"],
+            execution_mode=trans_data.get("execution_mode", "single"),
         )
         transformation.id = trans_data["id"]
         transformation.created = datetime.fromisoformat(trans_data["created"].replace('Z', '+00:00'))
@@ -87,6 +92,7 @@ class TransformationsService:
             "description": transformation.description,
             "prompt": transformation.prompt,
             "apply_default": transformation.apply_default,
+            "execution_mode": transformation.execution_mode,
         }
         trans_data = api_client.update_transformation(transformation.id, **updates)
         
@@ -96,6 +102,7 @@ class TransformationsService:
         transformation.description = trans_data["description"]
         transformation.prompt = trans_data["prompt"]
         transformation.apply_default = trans_data["apply_default"]
+        transformation.execution_mode = trans_data.get("execution_mode", "single")
         transformation.updated = datetime.fromisoformat(trans_data["updated"].replace('Z', '+00:00'))
         
         return transformation
@@ -1,8 +1,16 @@
 """Surreal-commands integration for Open Notebook"""
 
 from .example_commands import analyze_data_command, process_text_command
+from .source_commands import (
+    process_source_batch_command,
+    process_source_command,
+    resume_source_ingestion_command,
+)
 
 __all__ = [
     "process_text_command",
     "analyze_data_command",
+    "process_source_command",
+    "process_source_batch_command",
+    "resume_source_ingestion_command",
 ]
@@ -0,0 +1,415 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from pydantic import BaseModel, Field
+from surreal_commands import CommandInput, command
+
+from open_notebook.database.repository import ensure_record_id, repo_query
+from open_notebook.domain.notebook import SourceIngestion
+from open_notebook.domain.transformation import Transformation
+from open_notebook.exceptions import NotFoundError
+
+# Bulk ingestion: items processed at once, and how many of them may be in each
+# stage at the same time
+BULK_INGESTION_WORKERS = int(os.getenv("BULK_INGESTION_WORKERS", "8"))
+EXTRACTION_CONCURRENCY = int(os.getenv("INGESTION_EXTRACTION_CONCURRENCY", "4"))
+EMBEDDING_CONCURRENCY = int(os.getenv("INGESTION_EMBEDDING_CONCURRENCY", "2"))
+TRANSFORMATION_CONCURRENCY = int(os.getenv("INGESTION_TRANSFORMATION_CONCURRENCY", "2"))
+# Batch progress is written to the command record at most this often, except
+# for item status changes which are written right away
+PROGRESS_FLUSH_INTERVAL = 1.0
+# Seconds to wait before retrying a failed item, multiplied by the attempt
+RETRY_BACKOFF = 2.0
+
+
+class SourceProcessingInput(CommandInput):
+    notebook_id: str
+    content_state: Dict[str, Any]
+    transformations: List[str] = Field(default_factory=list)
+    embed: bool = False
+    deduplicate: bool = True
+
+
+class SourceProcessingOutput(BaseModel):
+    success: bool
+    source_id: Optional[str] = None
+    ingestion_id: Optional[str] = None
+    processing_time: float
+    error_message: Optional[str] = None
+
+
+class ResumeIngestionInput(CommandInput):
+    ingestion_id: str
+
+
+class BulkSourceProcessingInput(CommandInput):
+    notebook_id: str
+    items: List[Dict[str, Any]] = Field(
+        default_factory=list, description="Content state of each source"
+    )
+    transformations: List[str] = Field(default_factory=list)
+    embed: bool = False
+    deduplicate: bool = True
+    max_retries: int = 1
+    ingestion_ids: List[Optional[str]] = Field(
+        default_factory=list,
+        description="Checkpointed ingestion to resume for each item, if any",
+    )
+
+
+class BulkSourceProcessingOutput(BaseModel):
+    success: bool
+    total: int
+    completed: int
+    failed: int
+    source_ids: List[Optional[str]] = Field(default_factory=list)
+    processing_time: float
+    error_message: Optional[str] = None
+
+
+async def save_command_progress(command_id: str, progress: Dict[str, Any]) -> None:
+    """Store progress on the command record, where the job status endpoint reads it."""
+    await repo_query(
+        "UPDATE $command_id MERGE {progress: $progress} RETURN NONE;",
+        {"command_id": ensure_record_id(command_id), "progress": progress},
+    )
+
+
+async def load_transformations(transformation_ids: List[str]) -> List[Transformation]:
+    transformations = []
+    for transformation_id in transformation_ids:
+        transformation = await Transformation.get(transformation_id)
+        if not transformation:
+            raise ValueError(f"Transformation {transformation_id} not found")
+        transformations.append(transformation)
+    return transformations
+
+
+async def start_ingestion(
+    content_state: Dict[str, Any],
+    notebook_id: str,
+    transformations: List[str],
+    embed: bool,
+    deduplicate: bool,
+) -> SourceIngestion:
+    """Persist the request of a new ingestion, so it can be resumed."""
+    ingestion = SourceIngestion(
+        notebook_id=notebook_id,
+        content_state=content_state,
+        transformations=transformations,
+        embed=embed,
+        deduplicate=deduplicate,
+    )
+    await ingestion.save()
+    return ingestion
+
+
+async def ingest_source(
+    ingestion: SourceIngestion,
+    transformations: List[Transformation],
+    progress: Any,
+    limits: Any = None,
+) -> str:
+    """
+    Run the source graph for a checkpointed ingestion, skipping the stages it
+    already finished, and return the resulting source ID.
+    """
+    # Imported here so registering the commands does not load the graphs
+    from open_notebook.graphs.source import source_graph
+
+    if ingestion.reached("done"):
+        return str(ingestion.source)
+    try:
+        result = await source_graph.ainvoke(
+            {
+                # The graph adds processing settings to the state; keep the
+                # stored request untouched
+                "content_state": dict(ingestion.content_state),
+                "notebook_id": ingestion.notebook_id,
+                "apply_transformations": transformations,
+                "embed": ingestion.embed,
+                "deduplicate": ingestion.deduplicate,
+            },
+            config={
+                "configurable": {
+                    "progress": progress,
+                    "limits": limits,
+                    "ingestion": ingestion,
+                }
+            },
+        )
+    except Exception as e:
+        try:
+            await ingestion.checkpoint(error=str(e))
+        except Exception as checkpoint_error:
+            logger.warning(
+                f"Could not record failure of ingestion {ingestion.id}: "
+                f"{str(checkpoint_error)}"
+            )
+        raise
+    await ingestion.checkpoint(stage="done", error=None)
+    return str(result["source"].id)
+
+
+@command("process_source", app="open_notebook")
+async def process_source_command(
+    input_data: SourceProcessingInput,
+) -> SourceProcessingOutput:
+    """
+    Run the source ingestion graph (extraction, save, embedding and
+    transformations) in the background, reporting stage-level progress.
+    """
+    from open_notebook.graphs.source import IngestionProgress
+
+    start_time = time.time()
+    context = input_data.execution_context
+    command_id = context.command_id if context else None
+
+    async def sink(progress: Dict[str, Any]) -> None:
+        if command_id:
+            await save_command_progress(command_id, progress)
+
+    progress = IngestionProgress(sink)
+    ingestion = None
+    try:
+        transformations = await load_transformations(input_data.transformations)
+        ingestion = await start_ingestion(
+            input_data.content_state,
+            input_data.notebook_id,
+            [str(t.id) for t in transformations],
+            input_data.embed,
+            input_data.deduplicate,
+        )
+        await progress.update(ingestion_id=ingestion.id)
+        source_id = await ingest_source(ingestion, transformations, progress)
+        await progress.update(stage="done")
+        return SourceProcessingOutput(
+            success=True,
+            source_id=source_id,
+            ingestion_id=ingestion.id,
+            processing_time=time.time() - start_time,
+        )
+    except Exception as e:
+        logger.error(f"Source processing failed: {e}")
+        logger.exception(e)
+        await progress.update(stage="failed")
+        return SourceProcessingOutput(
+            success=False,
+            ingestion_id=ingestion.id if ingestion else None,
+            processing_time=time.time() - start_time,
+            error_message=str(e),
+        )
+
+
+@command("resume_source_ingestion", app="open_notebook")
+async def resume_source_ingestion_command(
+    input_data: ResumeIngestionInput,
+) -> SourceProcessingOutput:
+    """
+    Finish an interrupted ingestion from its last checkpoint. Resuming a
+    finished ingestion only returns its source.
+    """
+    from open_notebook.graphs.source import IngestionProgress
+
+    start_time = time.time()
+    context = input_data.execution_context
+    command_id = context.command_id if context else None
+
+    async def sink(progress: Dict[str, Any]) -> None:
+        if command_id:
+            await save_command_progress(command_id, progress)
+
+    progress = IngestionProgress(sink)
+    try:
+        ingestion = await SourceIngestion.get(input_data.ingestion_id)
+        transformations = await load_transformations(ingestion.transformations)
+        await progress.update(ingestion_id=ingestion.id, resumed_from=ingestion.stage)
+        source_id = await ingest_source(ingestion, transformations, progress)
+        await progress.update(stage="done")
+        return SourceProcessingOutput(
+            success=True,
+            source_id=source_id,
+            ingestion_id=ingestion.id,
+            processing_time=time.time() - start_time,
+        )
+    except Exception as e:
+        logger.error(f"Resuming ingestion {input_data.ingestion_id} failed: {e}")
+        logger.exception(e)
+        await progress.update(stage="failed")
+        return SourceProcessingOutput(
+            success=False,
+            ingestion_id=input_data.ingestion_id,
+            processing_time=time.time() - start_time,
+            error_message=str(e),
+        )
+
+
+class BatchProgress:
+    """
+    Per-item status of a bulk ingestion (pending, running, completed or
+    failed, plus the item's current stage), persisted on the command record.
+    """
+
+    def __init__(self, command_id: Optional[str], total: int):
+        self.command_id = command_id
+        self.items: List[Dict[str, Any]] = [
+            {"status": "pending", "attempts": 0} for _ in range(total)
+        ]
+        self._last_flush = 0.0
+        self._lock = asyncio.Lock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        counts = Counter(item["status"] for item in self.items)
+        return {
+            "total": len(self.items),
+            **{
+                status: counts.get(status, 0)
+                for status in ("pending", "running", "completed", "failed")
+            },
+            "items": [dict(item) for item in self.items],
+        }
+
+    async def update_item(self, index: int, force: bool = False, **changes: Any):
+        self.items[index].update(changes)
+        await self.flush(force)
+
+    async def flush(self, force: bool = False) -> None:
+        if not self.command_id:
+            return
+        if not force and time.monotonic() - self._last_flush < PROGRESS_FLUSH_INTERVAL:
+            return
+        async with self._lock:
+            self._last_flush = time.monotonic()
+            try:
+                await save_command_progress(self.command_id, self.snapshot())
+            except Exception as e:
+                logger.warning(f"Could not save bulk ingestion progress: {str(e)}")
+
+
+@command("process_source_batch", app="open_notebook")
+async def process_source_batch_command(
+    input_data: BulkSourceProcessingInput,
+) -> BulkSourceProcessingOutput:
+    """
+    Ingest many sources into one notebook through a bounded worker pool.
+
+    Extraction, embedding and transformations have separate concurrency
+    limits. A failing item is retried up to `max_retries` times and then
+    marked as failed without affecting the rest of the batch. Items with an
+    entry in `ingestion_ids` resume that ingestion from its checkpoint instead
+    of starting over.
+    """
+    from open_notebook.graphs.source import IngestionLimits, IngestionProgress
+
+    start_time = time.time()
+    context = input_data.execution_context
+    batch = BatchProgress(
+        context.command_id if context else None, len(input_data.items)
+    )
+    limits = IngestionLimits(
+        extraction=EXTRACTION_CONCURRENCY,
+        embedding=EMBEDDING_CONCURRENCY,
+        transformation=TRANSFORMATION_CONCURRENCY,
+    )
+
+    try:
+        transformations = await load_transformations(input_data.transformations)
+    except Exception as e:
+        logger.error(f"Bulk source processing failed: {e}")
+        logger.exception(e)
+        return BulkSourceProcessingOutput(
+            success=False,
+            total=len(input_data.items),
+            completed=0,
+            failed=len(input_data.items),
+            processing_time=time.time() - start_time,
+            error_message=str(e),
+        )
+
+    async def load_ingestion(index: int, ingestion_id: Optional[str]):
+        if ingestion_id:
+            try:
+                return await SourceIngestion.get(ingestion_id)
+            except NotFoundError:
+                logger.warning(
+                    f"Ingestion {ingestion_id} of bulk item {index} not found, "
+                    "starting over"
+                )
+        return await start_ingestion(
+            input_data.items[index],
+            input_data.notebook_id,
+            input_data.transformations,
+            input_data.embed,
+            input_data.deduplicate,
+        )
+
+    async def process_item(index: int) -> None:
+        ingestion_id = (
+            input_data.ingestion_ids[index]
+            if index < len(input_data.ingestion_ids)
+            else None
+        )
+        for attempt in range(1, input_data.max_retries + 2):
+            await batch.update_item(
+                index, force=True, status="running", attempts=attempt, error=None
+            )
+
+            async def sink(state: Dict[str, Any]) -> None:
+                await batch.update_item(index, **state)
+
+            try:
+                # Retries continue from the checkpoint of the failed attempt
+                ingestion = await load_ingestion(index, ingestion_id)
+                ingestion_id = ingestion.id
+                await batch.update_item(index, ingestion_id=ingestion_id)
+                source_id = await ingest_source(
+                    ingestion, transformations, IngestionProgress(sink), limits
+                )
+            except Exception as e:
+                logger.error(
+                    f"Bulk ingestion item {index} failed (attempt {attempt}): {e}"
+                )
+                logger.exception(e)
+                if attempt <= input_data.max_retries:
+                    await batch.update_item(index, error=str(e))
+                    await asyncio.sleep(RETRY_BACKOFF * attempt)
+                    continue
+                await batch.update_item(
+                    index, force=True, status="failed", error=str(e)
+                )
+                return
+            await batch.update_item(
+                index, force=True, status="completed", source_id=source_id
+            )
+            return
+
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for index in range(len(input_data.items)):
+        queue.put_nowait(index)
+
+    async def worker() -> None:
+        while not queue.empty():
+            await process_item(queue.get_nowait())
+
+    workers = max(1, min(BULK_INGESTION_WORKERS, len(input_data.items)))
+    async with asyncio.TaskGroup() as group:
+        for _ in range(workers):
+            group.create_task(worker())
+    await batch.flush(force=True)
+
+    summary = batch.snapshot()
+    return BulkSourceProcessingOutput(
+        success=summary["failed"] == 0,
+        total=summary["total"],
+        completed=summary["completed"],
+        failed=summary["failed"],
+        source_ids=[item.get("source_id") for item in batch.items],
+        processing_time=time.time() - start_time,
+        error_message=f"{summary['failed']} of {summary['total']} items failed"
+        if summary["failed"]
+        else None,
+    )
@@ -143,6 +143,7 @@ export interface Transformation {
   description: string;
   prompt: string;
   apply_default: boolean;
+  execution_mode: 'single' | 'map_reduce';
   created: string;
   updated: string;
 }
@@ -153,6 +154,7 @@ export interface TransformationCreatePayload {
   description: string;
   prompt: string;
   apply_default?: boolean;
+  execution_mode?: 'single' | 'map_reduce';
 }
 
 export interface TransformationUpdatePayload {
@@ -161,6 +163,7 @@ export interface TransformationUpdatePayload {
   description?: string;
   prompt?: string;
   apply_default?: boolean;
+  execution_mode?: 'single' | 'map_reduce';
 }
 
 export interface ModelProvidersResponse {
@@ -40,7 +40,7 @@ except ImportError:  # Optional dependency for Tavily web search
 from open_deep_research.configuration import Configuration, SearchAPI
 from open_deep_research.prompts import summarize_webpage_prompt
 from open_deep_research.state import ResearchComplete, Summary
-from open_notebook.database.repository import ensure_record_id, repo_query
+from open_notebook.database.repository import ensure_record_id, repo_batch
 from open_notebook.domain.notebook import vector_search
 
 ##########################
@@ -68,11 +68,11 @@ def _truncate_text(value: str, max_length: int = 400) -> str:
 
 async def _load_notebook_membership(notebook_id: str) -> tuple[set[str], set[str]]:
     notebook_record = ensure_record_id(notebook_id)
-    source_rows = await repo_query(
-        "SELECT in FROM reference WHERE out=$notebook", {"notebook": notebook_record}
-    )
-    note_rows = await repo_query(
-        "SELECT in FROM artifact WHERE out=$notebook", {"notebook": notebook_record}
+    source_rows, note_rows = await repo_batch(
+        [
+            ("SELECT in FROM reference WHERE out=$notebook", {"notebook": notebook_record}),
+            ("SELECT in FROM artifact WHERE out=$notebook", {"notebook": notebook_record}),
+        ]
     )
     sources = {str(row.get("in")) for row in source_rows if row.get("in")}
     notes = {str(row.get("in")) for row in note_rows if row.get("in")}
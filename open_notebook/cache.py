@@ -0,0 +1,155 @@
+"""
+Size-bounded on-disk cache for expensive, repeatable results such as content
+extraction.
+
+Each entry is a JSON file named after the hash of its key. Reads refresh the
+file's modification time, and once the cache grows past its size limit the
+least recently used entries are deleted. Writes are atomic, so several
+processes (API, worker, UI) can share one cache directory.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+from loguru import logger
+
+# Eviction trims the cache to this fraction of its limit, so it does not run
+# again on every subsequent write
+_EVICTION_TARGET = 0.9
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Hash arbitrary JSON-serializable parts into a stable cache key."""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    JSON value cache stored under `directory`, bounded to `max_bytes`.
+
+    A `max_bytes` of 0 or less disables the cache. All methods block on disk
+    I/O; call them through `asyncio.to_thread` from async code.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, or None if missing or expired."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {str(e)}")
+            self.delete(key)
+            return None
+
+        expires = entry.get("expires")
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get("value")
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a JSON-serializable value, optionally expiring after `ttl` seconds."""
+        if not self.enabled:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            "expires": time.time() + ttl if ttl is not None else None,
+            "value": value,
+        }
+        data = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data) - previous
+            over_limit = self._size > self.max_bytes
+        if over_limit:
+            self._evict()
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until under the size target."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * _EVICTION_TARGET
+            removed = 0
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            self._size = total
+        if removed:
+            logger.debug(f"Evicted {removed} entries from cache {self.directory}")
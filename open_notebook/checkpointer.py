@@ -0,0 +1,215 @@
+"""
+Checkpoint storage of LangGraph threads (chat sessions).
+
+The backend is chosen with CHAT_CHECKPOINTER:
+
+- "sqlite" (default): LANGGRAPH_CHECKPOINT_FILE in WAL mode, so readers do
+  not block on the writer and commits skip most fsyncs.
+- "memory": kept in the process only, for development and tests.
+
+Savers hold connections that belong to an event loop, so one is opened per
+loop and shared by all sessions in it, instead of a connection per request;
+`close_checkpointer()` closes them on shutdown. Only the latest
+CHAT_CHECKPOINTS_KEEP checkpoints of each thread are needed to continue it;
+`prune_checkpoints` deletes the rest.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import aiosqlite
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from loguru import logger
+
+from open_notebook.config import LANGGRAPH_CHECKPOINT_FILE
+
+CHECKPOINTER_BACKEND = os.getenv("CHAT_CHECKPOINTER", "sqlite").lower()
+# Checkpoints kept per thread when pruning; 0 keeps all of them
+CHECKPOINTS_KEEP = int(os.getenv("CHAT_CHECKPOINTS_KEEP", "10"))
+# Pruning runs at most this often
+CHECKPOINT_PRUNE_INTERVAL = int(os.getenv("CHAT_CHECKPOINT_PRUNE_SECONDS", "300"))
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+
+async def _connect(path: str) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(path)
+    # NORMAL is durable with WAL except for the last commits on power loss
+    await conn.executescript(
+        f"""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS};
+        """
+    )
+    return conn
+
+
+class SqliteCheckpointer(AsyncSqliteSaver):
+    """AsyncSqliteSaver on a WAL connection, with pruning of old checkpoints."""
+
+    @classmethod
+    async def open(cls, path: str) -> "SqliteCheckpointer":
+        saver = cls(await _connect(path))
+        await saver.setup()
+        return saver
+
+    async def aprune(self, keep: int, thread_id: Optional[str] = None) -> int:
+        """
+        Delete all but the latest `keep` checkpoints of each thread (or only
+        of `thread_id`) with their pending writes. Returns how many
+        checkpoints were deleted.
+        """
+        await self.setup()
+        where = "WHERE thread_id = ?" if thread_id else ""
+        params = (str(thread_id),) if thread_id else ()
+        async with self.lock, self.conn.cursor() as cur:
+            await cur.execute(
+                f"""
+                DELETE FROM checkpoints WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY thread_id, checkpoint_ns
+                            ORDER BY checkpoint_id DESC
+                        ) AS position
+                        FROM checkpoints {where}
+                    )
+                    WHERE position > ?
+                )
+                """,
+                (*params, keep),
+            )
+            deleted = cur.rowcount
+            await cur.execute(
+                f"""
+                DELETE FROM writes {where} {"AND" if where else "WHERE"} NOT EXISTS (
+                    SELECT 1 FROM checkpoints
+                    WHERE checkpoints.thread_id = writes.thread_id
+                    AND checkpoints.checkpoint_ns = writes.checkpoint_ns
+                    AND checkpoints.checkpoint_id = writes.checkpoint_id
+                )
+                """,
+                params,
+            )
+            await self.conn.commit()
+        return deleted
+
+    async def aclose(self) -> None:
+        await self.conn.close()
+
+
+class MemoryCheckpointer(InMemorySaver):
+    """In-process saver with the same pruning as the sqlite backend."""
+
+    async def aprune(self, keep: int, thread_id: Optional[str] = None) -> int:
+        deleted = 0
+        thread_ids = [thread_id] if thread_id else list(self.storage)
+        for tid in thread_ids:
+            referenced = set()
+            for checkpoint_ns, checkpoints in self.storage.get(tid, {}).items():
+                for checkpoint_id in sorted(checkpoints, reverse=True)[keep:]:
+                    del checkpoints[checkpoint_id]
+                    self.writes.pop((tid, checkpoint_ns, checkpoint_id), None)
+                    deleted += 1
+                for saved, _, _ in checkpoints.values():
+                    versions = self.serde.loads_typed(saved)["channel_versions"]
+                    referenced.update(
+                        (tid, checkpoint_ns, channel, version)
+                        for channel, version in versions.items()
+                    )
+            for key in [key for key in self.blobs if key[0] == tid]:
+                if key not in referenced:
+                    del self.blobs[key]
+        return deleted
+
+    async def aclose(self) -> None:
+        return None
+
+
+async def _open_sqlite() -> BaseCheckpointSaver:
+    return await SqliteCheckpointer.open(LANGGRAPH_CHECKPOINT_FILE)
+
+
+async def _open_memory() -> BaseCheckpointSaver:
+    return MemoryCheckpointer()
+
+
+CHECKPOINTER_BACKENDS: Dict[str, Callable[[], Awaitable[BaseCheckpointSaver]]] = {
+    "sqlite": _open_sqlite,
+    "memory": _open_memory,
+}
+
+# Savers of each event loop. The API runs one loop, so this is process-wide
+# there.
+_checkpointers: Dict[asyncio.AbstractEventLoop, "asyncio.Task[Any]"] = {}
+_last_prune = 0.0
+
+
+def _discard_closed_loops() -> None:
+    for loop in [loop for loop in _checkpointers if loop.is_closed()]:
+        opening = _checkpointers.pop(loop)
+        if opening.done() and not opening.cancelled() and not opening.exception():
+            saver = opening.result()
+            # Its loop is gone, so only stop the connection's thread
+            if isinstance(saver, SqliteCheckpointer):
+                saver.conn.stop()
+
+
+async def get_checkpointer() -> BaseCheckpointSaver:
+    """Saver of the running event loop, opened on first use."""
+    loop = asyncio.get_running_loop()
+    opening = _checkpointers.get(loop)
+    if opening is None:
+        _discard_closed_loops()
+        factory = CHECKPOINTER_BACKENDS.get(CHECKPOINTER_BACKEND)
+        if factory is None:
+            raise ValueError(f"Unknown CHAT_CHECKPOINTER {CHECKPOINTER_BACKEND}")
+        logger.debug(f"Opening {CHECKPOINTER_BACKEND} chat checkpointer")
+        opening = loop.create_task(factory())
+        _checkpointers[loop] = opening
+    try:
+        return await asyncio.shield(opening)
+    except Exception:
+        if _checkpointers.get(loop) is opening:
+            del _checkpointers[loop]
+        raise
+
+
+async def close_checkpointer() -> None:
+    """Close the saver of the running event loop."""
+    opening = _checkpointers.pop(asyncio.get_running_loop(), None)
+    if opening is None:
+        return
+    saver = await opening
+    await saver.aclose()  # type: ignore[attr-defined]
+
+
+async def prune_checkpoints(
+    thread_id: Optional[str] = None, keep: int = CHECKPOINTS_KEEP
+) -> int:
+    """
+    Delete all but the latest `keep` checkpoints of `thread_id`, or of every
+    thread. Returns how many were deleted; a `keep` of 0 deletes nothing.
+    """
+    if keep <= 0:
+        return 0
+    saver = await get_checkpointer()
+    deleted = await saver.aprune(keep, thread_id)  # type: ignore[attr-defined]
+    if deleted:
+        logger.debug(f"Pruned {deleted} chat checkpoints")
+    return deleted
+
+
+async def prune_checkpoints_periodically() -> None:
+    """Prune all threads if the last pruning was CHECKPOINT_PRUNE_INTERVAL ago."""
+    global _last_prune
+    if time.monotonic() - _last_prune < CHECKPOINT_PRUNE_INTERVAL:
+        return
+    _last_prune = time.monotonic()
+    try:
+        await prune_checkpoints()
+    except Exception as e:
+        logger.warning(f"Could not prune chat checkpoints: {str(e)}")
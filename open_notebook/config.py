@@ -11,3 +11,7 @@ LANGGRAPH_CHECKPOINT_FILE = f"{sqlite_folder}/checkpoints.sqlite"
 # UPLOADS FOLDER
 UPLOADS_FOLDER = f"{DATA_FOLDER}/uploads"
 os.makedirs(UPLOADS_FOLDER, exist_ok=True)
+
+# CACHE FOLDER
+CACHE_FOLDER = f"{DATA_FOLDER}/cache"
+os.makedirs(CACHE_FOLDER, exist_ok=True)
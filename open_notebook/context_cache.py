@@ -0,0 +1,376 @@
+"""
+In-process cache of the notebook context used by chat.
+
+Each source and note context is kept together with its packable items and
+their token counts, keyed by record ID and context size. Saving, deleting or
+relating a record through the models drops its entry, so the next request
+reloads only what changed. Changes made by other processes (e.g. insights
+created by the worker) are detected with one version query per notebook and
+context configuration, run at most every CONTEXT_CACHE_REVALIDATE_SECONDS.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from open_notebook.cache import make_cache_key
+from open_notebook.context_packer import (
+    ContextItem,
+    cached_token_counts,
+    context_items,
+    payload_text,
+)
+from open_notebook.database.repository import ensure_record_id, repo_batch
+from open_notebook.domain.base import add_change_listener
+from open_notebook.domain.notebook import Note, Source, SourceInsight
+from open_notebook.exceptions import NotFoundError
+
+CONTEXT_CACHE_MAX_ITEMS = int(os.getenv("CONTEXT_CACHE_MAX_ITEMS", "5000"))
+CONTEXT_CACHE_REVALIDATE_SECONDS = float(
+    os.getenv("CONTEXT_CACHE_REVALIDATE_SECONDS", "5")
+)
+
+SOURCE_VERSIONS_QUERY = """
+    SELECT id, updated,
+        (SELECT VALUE id FROM source_insight WHERE source=$parent.id) AS insights
+    FROM $ids
+"""
+NOTE_VERSIONS_QUERY = "SELECT id, updated FROM $ids"
+NOTEBOOK_EXISTS_QUERY = "SELECT VALUE id FROM $id"
+NOTEBOOK_SOURCE_VERSIONS_QUERY = """
+    SELECT in AS id, in.updated AS updated,
+        (SELECT VALUE id FROM source_insight WHERE source=$parent.in) AS insights
+    FROM reference WHERE out=$id ORDER BY updated DESC
+"""
+NOTEBOOK_NOTE_VERSIONS_QUERY = """
+    SELECT in AS id, in.updated AS updated FROM artifact WHERE out=$id
+    ORDER BY updated DESC
+"""
+
+# Changed entries are fetched in batches of this many records, with this
+# many batches in flight at once
+CONTEXT_LOAD_BATCH_SIZE = 100
+CONTEXT_LOAD_CONCURRENCY = 4
+
+# Short source contexts leave out the full text, so it is not transferred
+SOURCES_SHORT_QUERY = "SELECT * OMIT full_text FROM $ids"
+SOURCES_LONG_QUERY = "SELECT * FROM $ids"
+INSIGHTS_QUERY = "SELECT * OMIT embedding FROM source_insight WHERE source IN $ids"
+NOTES_QUERY = "SELECT * OMIT embedding FROM $ids"
+
+# (kind, record ID, context size) of one context entry
+ContextKey = Tuple[str, str, str]
+
+
+class NotebookContext(BaseModel):
+    sources: List[Dict[str, Any]] = Field(default_factory=list)
+    notes: List[Dict[str, Any]] = Field(default_factory=list)
+    items: List[ContextItem] = Field(
+        default_factory=list, description="Packable items with token counts"
+    )
+
+
+class _Entry:
+    __slots__ = ("context", "items", "version")
+
+    def __init__(self, context: Dict[str, Any], items: List[ContextItem], version):
+        self.context = context
+        self.items = items
+        self.version = version
+
+
+def _full_id(table: str, record_id: str) -> str:
+    return record_id if record_id.startswith(f"{table}:") else f"{table}:{record_id}"
+
+
+def _wanted_keys(context_config: Any) -> List[ContextKey]:
+    """Entries selected by a context configuration ({id: status} per kind)."""
+    keys: List[ContextKey] = []
+    for source_id, status in context_config.sources.items():
+        if "not in" in status:
+            continue
+        if "insights" in status:
+            keys.append(("source", _full_id("source", source_id), "short"))
+        elif "full content" in status:
+            keys.append(("source", _full_id("source", source_id), "long"))
+    for note_id, status in context_config.notes.items():
+        if "not in" not in status and "full content" in status:
+            keys.append(("note", _full_id("note", note_id), "long"))
+    return keys
+
+
+async def _fetch_contexts(keys: List[ContextKey]) -> Dict[ContextKey, Dict[str, Any]]:
+    """Contexts of several sources and notes, fetched in one round trip."""
+    short_sources = [key[1] for key in keys if key[0] == "source" and key[2] == "short"]
+    long_sources = [key[1] for key in keys if key[0] == "source" and key[2] == "long"]
+    notes = [key[1] for key in keys if key[0] == "note"]
+    short_rows, long_rows, insight_rows, note_rows = await repo_batch(
+        [
+            (
+                SOURCES_SHORT_QUERY,
+                {"ids": [ensure_record_id(i) for i in short_sources]},
+            ),
+            (SOURCES_LONG_QUERY, {"ids": [ensure_record_id(i) for i in long_sources]}),
+            (
+                INSIGHTS_QUERY,
+                {"ids": [ensure_record_id(i) for i in short_sources + long_sources]},
+            ),
+            (NOTES_QUERY, {"ids": [ensure_record_id(i) for i in notes]}),
+        ]
+    )
+
+    insights: Dict[str, List[SourceInsight]] = {}
+    for row in insight_rows or []:
+        insights.setdefault(str(row.get("source")), []).append(SourceInsight(**row))
+    contexts: Dict[ContextKey, Dict[str, Any]] = {}
+    for size, rows in (("short", short_rows), ("long", long_rows)):
+        for row in rows or []:
+            try:
+                source = Source(**row)
+            except Exception as e:
+                logger.warning(f"Error processing source {row.get('id')}: {str(e)}")
+                continue
+            contexts[("source", str(source.id), size)] = source.build_context(
+                insights.get(str(source.id), []), size
+            )
+    notes_by_id = {}
+    for row in note_rows or []:
+        try:
+            notes_by_id[str(row["id"])] = Note(**row)
+        except Exception as e:
+            logger.warning(f"Error processing note {row.get('id')}: {str(e)}")
+    for key in keys:
+        if key[0] == "note" and key[1] in notes_by_id:
+            contexts[key] = notes_by_id[key[1]].get_context(key[2])
+    return contexts
+
+
+class NotebookContextCache:
+    """
+    Source and note contexts shared by every notebook and configuration that
+    selects them, plus the list of entries each (notebook, configuration)
+    pair resolved to when it was last checked against the database.
+    """
+
+    def __init__(self, max_items: int, revalidate_after: float):
+        self.max_items = max_items
+        self.revalidate_after = revalidate_after
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._views: "OrderedDict[Tuple[str, str], Tuple[List[ContextKey], float]]" = (
+            OrderedDict()
+        )
+        # Insight ID -> source ID, so deleting an insight drops its source
+        self._parents: Dict[str, str] = {}
+        # Bumped by every invalidation, to detect changes during a load
+        self._generation = 0
+
+    def invalidate(self, record_id: str) -> None:
+        """Drop the entries of a record and recheck the views that use it."""
+        self._generation += 1
+        record_id = self._parents.pop(record_id, record_id)
+        for size in ("short", "long"):
+            self._drop_entry((record_id, size))
+        for view_key, (keys, _) in list(self._views.items()):
+            if view_key[0] == record_id or any(key[1] == record_id for key in keys):
+                self._views[view_key] = (keys, 0.0)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._views.clear()
+        self._parents.clear()
+
+    async def get(
+        self, notebook_id: str, context_config: Any = None
+    ) -> NotebookContext:
+        """
+        Context of a notebook for a configuration, or of all its sources and
+        notes (short) without one. Only missing or changed entries are loaded.
+        Raises NotFoundError if the notebook does not exist.
+        """
+        view_key = (
+            notebook_id,
+            make_cache_key(context_config.model_dump() if context_config else None),
+        )
+        view = self._views.get(view_key)
+        if view and time.monotonic() - view[1] < self.revalidate_after:
+            entries = [self._entries.get(key[1:]) for key in view[0]]
+            if all(entry is not None for entry in entries):
+                for key in view[0]:
+                    self._entries.move_to_end(key[1:])
+                return self._assemble(view[0], entries)
+
+        generation = self._generation
+        keys, versions = await self._versions(notebook_id, context_config)
+        keys = [key for key in keys if key[1] in versions]
+        stale = [
+            key
+            for key in keys
+            if (entry := self._entries.get(key[1:])) is None
+            or entry.version != versions[key[1]]
+        ]
+        if stale:
+            logger.debug(
+                f"Loading {len(stale)} of {len(keys)} context entries "
+                f"for notebook {notebook_id}"
+            )
+            loaded = await self._load(stale)
+            await self._store(loaded, versions)
+            keys = [key for key in keys if key not in stale or key in loaded]
+
+        # Anything invalidated meanwhile may have been loaded in its old state
+        checked = time.monotonic() if generation == self._generation else 0.0
+        self._views[view_key] = (keys, checked)
+        self._views.move_to_end(view_key)
+        for key in keys:
+            self._entries.move_to_end(key[1:])
+        self._evict()
+        return self._assemble(keys, [self._entries.get(key[1:]) for key in keys])
+
+    async def _versions(
+        self, notebook_id: str, context_config: Any
+    ) -> Tuple[List[ContextKey], Dict[str, Any]]:
+        """Entries to include and the current version of their records."""
+        if context_config:
+            keys = _wanted_keys(context_config)
+            statements = [
+                (
+                    SOURCE_VERSIONS_QUERY,
+                    {
+                        "ids": [
+                            ensure_record_id(key[1])
+                            for key in keys
+                            if key[0] == "source"
+                        ]
+                    },
+                ),
+                (
+                    NOTE_VERSIONS_QUERY,
+                    {
+                        "ids": [
+                            ensure_record_id(key[1]) for key in keys if key[0] == "note"
+                        ]
+                    },
+                ),
+            ]
+        else:
+            keys = []
+            notebook = ensure_record_id(notebook_id)
+            statements = [
+                (NOTEBOOK_SOURCE_VERSIONS_QUERY, {"id": notebook}),
+                (NOTEBOOK_NOTE_VERSIONS_QUERY, {"id": notebook}),
+            ]
+        notebook_rows, sources, notes = await repo_batch(
+            [(NOTEBOOK_EXISTS_QUERY, {"id": ensure_record_id(notebook_id)})]
+            + statements
+        )
+        if not notebook_rows:
+            raise NotFoundError(f"Notebook {notebook_id} not found")
+
+        versions: Dict[str, Any] = {}
+        for row in sources or []:
+            versions[str(row["id"])] = (
+                str(row.get("updated")),
+                tuple(sorted(str(insight) for insight in row.get("insights") or [])),
+            )
+        for row in notes or []:
+            versions[str(row["id"])] = (str(row.get("updated")),)
+        if not context_config:
+            keys = [("source", str(row["id"]), "short") for row in sources or []] + [
+                ("note", str(row["id"]), "short") for row in notes or []
+            ]
+        return keys, versions
+
+    async def _load(self, keys: List[ContextKey]) -> Dict[ContextKey, Dict[str, Any]]:
+        """
+        Fetch the contexts of `keys` in batches of CONTEXT_LOAD_BATCH_SIZE
+        records, each a single round trip, running up to
+        CONTEXT_LOAD_CONCURRENCY batches at once. Records that fail to load
+        are skipped.
+        """
+        limit = asyncio.Semaphore(CONTEXT_LOAD_CONCURRENCY)
+
+        async def load_batch(batch: List[ContextKey]) -> Dict[ContextKey, Dict]:
+            async with limit:
+                try:
+                    return await _fetch_contexts(batch)
+                except Exception as e:
+                    logger.warning(
+                        f"Error loading context of {len(batch)} records: {str(e)}"
+                    )
+                    return {}
+
+        results = await asyncio.gather(
+            *(
+                load_batch(keys[idx : idx + CONTEXT_LOAD_BATCH_SIZE])
+                for idx in range(0, len(keys), CONTEXT_LOAD_BATCH_SIZE)
+            )
+        )
+        return {key: context for result in results for key, context in result.items()}
+
+    async def _store(
+        self, loaded: Dict[ContextKey, Dict[str, Any]], versions: Dict[str, Any]
+    ) -> None:
+        items = {
+            key: (
+                context_items([context], [])
+                if key[0] == "source"
+                else context_items([], [context])
+            )
+            for key, context in loaded.items()
+        }
+        # Full texts can be large, so count tokens off the event loop
+        flat = [item for key_items in items.values() for item in key_items]
+        counts = await asyncio.to_thread(
+            cached_token_counts, [payload_text(item.payload) for item in flat]
+        )
+        for item, count in zip(flat, counts):
+            item.tokens = count
+
+        for key, context in loaded.items():
+            record_id = key[1]
+            self._entries[key[1:]] = _Entry(context, items[key], versions[record_id])
+            for insight in context.get("insights") or []:
+                self._parents[str(insight.get("id"))] = record_id
+
+    def _drop_entry(self, key: Tuple[str, str], entry: Optional[_Entry] = None) -> None:
+        """Remove an entry, and its insights' parents once no entry uses them."""
+        entry = entry or self._entries.pop(key, None)
+        if entry is None or any(
+            (key[0], size) in self._entries for size in ("short", "long")
+        ):
+            return
+        for insight in entry.context.get("insights") or []:
+            self._parents.pop(str(insight.get("id")), None)
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_items:
+            self._drop_entry(*self._entries.popitem(last=False))
+        while len(self._views) > self.max_items:
+            self._views.popitem(last=False)
+
+    @staticmethod
+    def _assemble(
+        keys: List[ContextKey], entries: List[Optional[_Entry]]
+    ) -> NotebookContext:
+        result = NotebookContext()
+        for key, entry in zip(keys, entries):
+            # Dropped by an invalidation while loading; reloaded next time
+            if entry is None:
+                continue
+            if key[0] == "source":
+                result.sources.append(entry.context)
+            else:
+                result.notes.append(entry.context)
+            result.items.extend(entry.items)
+        return result
+
+
+notebook_context_cache = NotebookContextCache(
+    CONTEXT_CACHE_MAX_ITEMS, CONTEXT_CACHE_REVALIDATE_SECONDS
+)
+add_change_listener(notebook_context_cache.invalidate)
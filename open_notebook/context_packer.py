@@ -0,0 +1,269 @@
+"""
+Token-budgeted packing of context for chat and ask prompts.
+
+Candidate items (source insights, full texts, notes, search results) are
+ranked by relevance to the current question and added greedily until the
+token budget is used up. Token counts are cached per item text, so packing
+the same notebook again on the next turn does not tokenize it again.
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from open_notebook.utils import token_counts
+
+# Default budget of the notebook context sent with chat prompts; 0 disables it
+DEFAULT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "60000"))
+
+# Without a question, smaller and denser items are kept first
+KIND_PRIORITY = {"insight": 0, "result": 0, "note": 1, "full_text": 2}
+
+_TOKEN_CACHE_SIZE = 20_000
+_token_cache: "OrderedDict[bytes, int]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def cached_token_counts(texts: List[str]) -> List[int]:
+    """Token counts of `texts`, tokenizing only the ones not seen recently."""
+    keys = [
+        hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest() for text in texts
+    ]
+    counts: List[Optional[int]] = []
+    with _token_cache_lock:
+        for key in keys:
+            count = _token_cache.get(key)
+            if count is not None:
+                _token_cache.move_to_end(key)
+            counts.append(count)
+    missing = [idx for idx, count in enumerate(counts) if count is None]
+    if missing:
+        fresh = token_counts([texts[idx] for idx in missing])
+        with _token_cache_lock:
+            for idx, count in zip(missing, fresh):
+                counts[idx] = count
+                _token_cache[keys[idx]] = count
+            while len(_token_cache) > _TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    return counts  # type: ignore[return-value]
+
+
+def payload_text(payload: Dict[str, Any]) -> str:
+    """An item's payload serialized as it is sent out, for token counting."""
+    return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class ContextItem(BaseModel):
+    """One piece of context that can be kept or dropped as a whole."""
+
+    id: str
+    kind: str = Field(..., description="insight, full_text, note or result")
+    parent_id: Optional[str] = None
+    text: str = Field("", description="Text matched against the question")
+    payload: Dict[str, Any] = Field(
+        default_factory=dict, description="What is placed in the prompt"
+    )
+    score: float = 0.0
+    tokens: int = 0
+
+
+class DroppedItem(BaseModel):
+    id: str
+    kind: str
+    parent_id: Optional[str] = None
+    tokens: int
+    score: float
+
+
+class PackedContext(BaseModel):
+    items: List[ContextItem] = Field(
+        default_factory=list, description="Kept items, in their original order"
+    )
+    tokens: int = 0
+    budget: Optional[int] = None
+    dropped: List[DroppedItem] = Field(default_factory=list)
+
+
+def _terms(text: str) -> List[str]:
+    return _WORD_PATTERN.findall(text.lower())
+
+
+def score_items(items: List[ContextItem], question: str) -> List[float]:
+    """BM25 relevance of each item to `question`."""
+    query = set(_terms(question))
+    if not query or not items:
+        return [0.0] * len(items)
+    documents = [Counter(_terms(item.text)) for item in items]
+    lengths = [sum(doc.values()) for doc in documents]
+    average = (sum(lengths) / len(lengths)) or 1
+    frequency = Counter(term for doc in documents for term in query & doc.keys())
+    k1, b = 1.2, 0.75
+    scores = []
+    for doc, length in zip(documents, lengths):
+        score = 0.0
+        for term in query:
+            tf = doc.get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(
+                1 + (len(items) - frequency[term] + 0.5) / (frequency[term] + 0.5)
+            )
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average))
+        scores.append(score)
+    return scores
+
+
+def pack_items(
+    items: List[ContextItem],
+    budget: Optional[int],
+    question: Optional[str] = None,
+) -> PackedContext:
+    """
+    Keep the most relevant items that fit in `budget` tokens.
+
+    With a question, items are scored against it; otherwise their own
+    scores are used (e.g. search similarity), then the item kind. Items that
+    do not fit are skipped in favour of smaller ones further down the ranking.
+    A budget of None or 0 keeps everything. Token counts are stored on the
+    items, so items kept between calls are only counted once.
+    """
+    uncounted = [item for item in items if not item.tokens]
+    counts = cached_token_counts([payload_text(item.payload) for item in uncounted])
+    for item, count in zip(uncounted, counts):
+        item.tokens = count
+    scores = (
+        score_items(items, question) if question else [item.score for item in items]
+    )
+
+    if not budget:
+        return PackedContext(
+            items=list(items), tokens=sum(item.tokens for item in items), budget=budget
+        )
+
+    ranking = sorted(
+        range(len(items)),
+        key=lambda idx: (-scores[idx], KIND_PRIORITY.get(items[idx].kind, 1), idx),
+    )
+    kept = set()
+    used = 0
+    for idx in ranking:
+        if used + items[idx].tokens <= budget:
+            kept.add(idx)
+            used += items[idx].tokens
+    return PackedContext(
+        items=[item for idx, item in enumerate(items) if idx in kept],
+        tokens=used,
+        budget=budget,
+        dropped=[
+            DroppedItem(
+                id=item.id,
+                kind=item.kind,
+                parent_id=item.parent_id,
+                tokens=item.tokens,
+                score=scores[idx],
+            )
+            for idx, item in enumerate(items)
+            if idx not in kept
+        ],
+    )
+
+
+def context_items(
+    sources: List[Dict[str, Any]], notes: List[Dict[str, Any]]
+) -> List[ContextItem]:
+    """
+    Packable items of source and note contexts (as returned by `get_context`).
+    Insights and full texts are separate items, so a source can keep its
+    insights when its full text does not fit.
+    """
+    items: List[ContextItem] = []
+    for source in sources:
+        for insight in source.get("insights") or []:
+            items.append(
+                ContextItem(
+                    id=str(insight.get("id")),
+                    kind="insight",
+                    parent_id=str(source["id"]),
+                    text=f"{source.get('title') or ''} {insight.get('insight_type', '')} {insight.get('content', '')}",
+                    payload=insight,
+                )
+            )
+        if source.get("full_text"):
+            items.append(
+                ContextItem(
+                    id=str(source["id"]),
+                    kind="full_text",
+                    parent_id=str(source["id"]),
+                    text=f"{source.get('title') or ''} {source['full_text']}",
+                    payload={"full_text": source["full_text"]},
+                )
+            )
+    for note in notes:
+        items.append(
+            ContextItem(
+                id=str(note["id"]),
+                kind="note",
+                text=f"{note.get('title') or ''} {note.get('content') or ''}",
+                payload=note,
+            )
+        )
+    return items
+
+
+def pack_notebook_context(
+    sources: List[Dict[str, Any]],
+    notes: List[Dict[str, Any]],
+    budget: Optional[int],
+    question: Optional[str] = None,
+    items: Optional[List[ContextItem]] = None,
+) -> Tuple[Dict[str, List[Dict[str, Any]]], PackedContext]:
+    """
+    Pack source and note contexts into `budget` tokens. `items` may hold
+    their `context_items`, e.g. kept with token counts from an earlier call.
+
+    Returns the packed context, shaped like the input, and the packing report.
+    """
+    if items is None:
+        items = context_items(sources, notes)
+    packed = pack_items(items, budget, question)
+    kept_insights: Dict[str, List[Dict[str, Any]]] = {}
+    kept_full_texts = set()
+    kept_notes = set()
+    for item in packed.items:
+        if item.kind == "insight":
+            kept_insights.setdefault(item.parent_id or "", []).append(item.payload)
+        elif item.kind == "full_text":
+            kept_full_texts.add(item.id)
+        else:
+            kept_notes.add(item.id)
+
+    packed_sources = []
+    for source in sources:
+        source_id = str(source["id"])
+        had_items = bool(source.get("insights") or source.get("full_text"))
+        if (
+            had_items
+            and source_id not in kept_insights
+            and source_id not in kept_full_texts
+        ):
+            continue
+        packed_source = {
+            key: value
+            for key, value in source.items()
+            if key not in ("insights", "full_text")
+        }
+        packed_source["insights"] = kept_insights.get(source_id, [])
+        if source_id in kept_full_texts:
+            packed_source["full_text"] = source["full_text"]
+        packed_sources.append(packed_source)
+    packed_notes = [note for note in notes if str(note["id"]) in kept_notes]
+    return {"source": packed_sources, "note": packed_notes}, packed
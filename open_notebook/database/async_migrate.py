@@ -9,6 +9,9 @@ from loguru import logger
 
 from .repository import db_connection, repo_query
 
+# Migration 9 adds source.content_hash, which is computed in Python
+CONTENT_HASH_MIGRATION = 9
+
 
 class AsyncMigration:
     """
@@ -103,6 +106,10 @@ class AsyncMigrationManager:
             AsyncMigration.from_file("migrations/5.surrealql"),
             AsyncMigration.from_file("migrations/6.surrealql"),
             AsyncMigration.from_file("migrations/7.surrealql"),
+            AsyncMigration.from_file("migrations/8.surrealql"),
+            AsyncMigration.from_file("migrations/9.surrealql"),
+            AsyncMigration.from_file("migrations/10.surrealql"),
+            AsyncMigration.from_file("migrations/11.surrealql"),
         ]
         self.down_migrations = [
             AsyncMigration.from_file("migrations/1_down.surrealql"),
@@ -112,6 +119,10 @@ class AsyncMigrationManager:
             AsyncMigration.from_file("migrations/5_down.surrealql"),
             AsyncMigration.from_file("migrations/6_down.surrealql"),
             AsyncMigration.from_file("migrations/7_down.surrealql"),
+            AsyncMigration.from_file("migrations/8_down.surrealql"),
+            AsyncMigration.from_file("migrations/9_down.surrealql"),
+            AsyncMigration.from_file("migrations/10_down.surrealql"),
+            AsyncMigration.from_file("migrations/11_down.surrealql"),
         ]
         self.runner = AsyncMigrationRunner(
             up_migrations=self.up_migrations,
@@ -140,10 +151,24 @@ class AsyncMigrationManager:
             except Exception as e:
                 logger.error(f"Migration failed: {str(e)}")
                 raise
+            if current_version < CONTENT_HASH_MIGRATION <= new_version:
+                await backfill_content_hashes()
         else:
             logger.info("Database is already at the latest version")
 
 
+async def backfill_content_hashes() -> None:
+    """Hash existing sources, so they are deduplicated like new ones."""
+    from open_notebook.domain.notebook import Source
+
+    try:
+        await Source.backfill_content_hashes()
+    except Exception as e:
+        # The schema is migrated; sources left without a hash are only not
+        # reused, and Source.backfill_content_hashes() can be run again
+        logger.error(f"Could not hash existing sources: {str(e)}")
+
+
 # Database version management functions
 async def get_latest_version() -> int:
     """Get the latest version from the migrations table."""
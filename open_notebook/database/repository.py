@@ -1,11 +1,29 @@
 import os
+import re
+import secrets
+import string
+import time
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional, TypeVar, Union
+from functools import lru_cache
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 from loguru import logger
 from surrealdb import AsyncSurreal, RecordID  # type: ignore
 
+from open_notebook.metrics import COUNT_BUCKETS, SIZE_BUCKETS, counter, histogram
+
 T = TypeVar("T", Dict[str, Any], List[Dict[str, Any]])
 
 
@@ -26,12 +44,32 @@ def get_database_password():
     return os.getenv("SURREAL_PASSWORD") or os.getenv("SURREAL_PASS")
 
 
+_NUMERIC_TYPES = frozenset((int, float))
+
+
 def parse_record_ids(obj: Any) -> Any:
-    """Recursively parse and convert RecordIDs into strings."""
+    """
+    Recursively convert RecordIDs into strings.
+
+    Query results are freshly decoded and owned by the caller, so dicts and lists
+    are updated in place instead of being rebuilt. Homogeneous numeric arrays
+    (embeddings) cannot contain RecordIDs and are returned without being walked
+    element by element in Python.
+    """
     if isinstance(obj, dict):
-        return {k: parse_record_ids(v) for k, v in obj.items()}
+        for key, value in obj.items():
+            if isinstance(value, (dict, list, RecordID)):
+                obj[key] = parse_record_ids(value)
     elif isinstance(obj, list):
-        return [parse_record_ids(item) for item in obj]
+        if (
+            obj
+            and type(obj[0]) in _NUMERIC_TYPES
+            and _NUMERIC_TYPES.issuperset(map(type, obj))
+        ):
+            return obj
+        for idx, item in enumerate(obj):
+            if isinstance(item, (dict, list, RecordID)):
+                obj[idx] = parse_record_ids(item)
     elif isinstance(obj, RecordID):
         return str(obj)
     return obj
@@ -62,33 +100,331 @@ async def db_connection():
         await db.close()
 
 
+# Statements slower than this (in milliseconds) are written to the slow-query log
+SLOW_QUERY_MS = float(os.getenv("SURREAL_SLOW_QUERY_MS", "500"))
+
+_QUERY_LABELS = ("operation", "statement")
+_query_duration = histogram(
+    "open_notebook_db_query_duration_seconds",
+    "Wall time of repository calls, including connection setup.",
+    _QUERY_LABELS,
+)
+_query_rows = histogram(
+    "open_notebook_db_query_rows",
+    "Rows returned by repository calls.",
+    _QUERY_LABELS,
+    COUNT_BUCKETS,
+)
+_query_payload = histogram(
+    "open_notebook_db_query_payload_bytes",
+    "Approximate size of the data returned by repository calls.",
+    _QUERY_LABELS,
+    SIZE_BUCKETS,
+)
+_query_errors = counter(
+    "open_notebook_db_query_errors_total",
+    "Repository calls that raised.",
+    _QUERY_LABELS,
+)
+_slow_queries = counter(
+    "open_notebook_db_slow_queries_total",
+    "Repository calls slower than SURREAL_SLOW_QUERY_MS.",
+    _QUERY_LABELS,
+)
+
+_FINGERPRINT_PATTERNS = [
+    (re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\""), "?"),
+    (re.compile(r"(?<![:\w])([A-Za-z_]\w*):(?!:)(?:⟨[^⟩]*⟩|`[^`]*`|\w+)"), r"\1:?"),
+    (re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+@lru_cache(maxsize=1024)
+def query_fingerprint(query_str: str) -> str:
+    """
+    Normalize a statement so calls that differ only in literals or record ids
+    share one series, e.g. `UPDATE source:abc MERGE $data` -> `UPDATE source:? MERGE $data`.
+    """
+    fingerprint = query_str
+    for pattern, replacement in _FINGERPRINT_PATTERNS:
+        fingerprint = pattern.sub(replacement, fingerprint)
+    return fingerprint.strip().rstrip(";")[:200]
+
+
+def _payload_size(obj: Any) -> int:
+    """Approximate the encoded size of a result without serializing it."""
+    if isinstance(obj, dict):
+        return sum(len(str(k)) + _payload_size(v) for k, v in obj.items())
+    if isinstance(obj, list):
+        if obj and type(obj[0]) in _NUMERIC_TYPES:
+            # embeddings: CBOR encodes each float in up to 9 bytes
+            return 9 * len(obj)
+        return sum(_payload_size(item) for item in obj)
+    if isinstance(obj, (str, bytes)):
+        return len(obj)
+    return 8
+
+
+def _record_query(
+    operation: str,
+    query_str: str,
+    started: float,
+    result: Any = None,
+    failed: bool = False,
+) -> None:
+    """Record duration, rows and payload size of a repository call."""
+    elapsed = time.perf_counter() - started
+    statement = query_fingerprint(query_str)
+    labels = {"operation": operation, "statement": statement}
+    _query_duration.observe(elapsed, **labels)
+    if failed:
+        _query_errors.inc(**labels)
+        return
+    rows = len(result) if isinstance(result, list) else int(result is not None)
+    payload = _payload_size(result)
+    _query_rows.observe(rows, **labels)
+    _query_payload.observe(payload, **labels)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        _slow_queries.inc(**labels)
+        logger.warning(
+            f"Slow query ({elapsed * 1000:.0f} ms, {rows} rows, {payload} bytes) "
+            f"[{operation}]: {statement}"
+        )
+
+
+# SurrealDB reports this for every statement of a transaction that was cancelled
+# because another statement failed; the real cause is on the failing statement.
+_CANCELLED_TRANSACTION_ERROR = "The query was not executed due to a failed transaction"
+
+_RECORD_KEY_ALPHABET = string.ascii_lowercase + string.digits
+
+
+def _new_record_key() -> str:
+    """Generate a record key in the same shape as SurrealDB's default ids."""
+    return secrets.choice(string.ascii_lowercase) + "".join(
+        secrets.choice(_RECORD_KEY_ALPHABET) for _ in range(19)
+    )
+
+
+def _prepare_statement(
+    query_str: str, vars: Optional[Dict[str, Any]], prefix: str
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Rename the $vars of a single statement with a prefix so it can share a
+    request with other statements without their variables colliding.
+    """
+    statement = query_str.strip().rstrip(";")
+    if not vars:
+        return f"{statement};", {}
+    names = "|".join(re.escape(name) for name in vars)
+    statement = re.sub(rf"\$({names})\b", lambda m: f"${prefix}{m.group(1)}", statement)
+    return f"{statement};", {f"{prefix}{name}": value for name, value in vars.items()}
+
+
+async def _run_statements(
+    query_str: str, vars: Optional[Dict[str, Any]] = None
+) -> List[Any]:
+    """Execute a multi-statement query and return the result of every statement."""
+    operation = "transaction" if query_str.startswith("BEGIN") else "batch"
+    started = time.perf_counter()
+    try:
+        results = await _execute_statements(query_str, vars)
+    except Exception:
+        _record_query(operation, query_str, started, failed=True)
+        raise
+    _record_query(operation, query_str, started, results)
+    return results
+
+
+async def _execute_statements(
+    query_str: str, vars: Optional[Dict[str, Any]]
+) -> List[Any]:
+    # query_raw (surrealdb >= 1.0.4, WS and HTTP) returns the RPC response as
+    # is: {"result": [{"status", "result", "time"}, ...]} or {"error": ...}
+    async with db_connection() as connection:
+        response = await connection.query_raw(query_str, vars)
+
+    if response.get("error"):
+        error = response["error"]
+        raise RuntimeError(
+            error.get("message", str(error)) if isinstance(error, dict) else error
+        )
+
+    results = []
+    errors = []
+    for item in response.get("result") or []:
+        if item.get("status") != "OK":
+            errors.append(str(item.get("result")))
+        results.append(item.get("result"))
+    if errors:
+        causes = [e for e in errors if not e.startswith(_CANCELLED_TRANSACTION_ERROR)]
+        raise RuntimeError((causes or errors)[0])
+    return parse_record_ids(results)
+
+
+class Transaction:
+    """
+    Unit of work that buffers write statements and commits them atomically.
+
+    Statements are sent as a single BEGIN ... COMMIT request over one connection
+    when the transaction() block exits. Nothing is sent if the block raises, so a
+    failure before commit leaves the database untouched, and SurrealDB rolls back
+    every statement if one of them fails during commit. Callbacks registered
+    with `after_commit` only run once the commit succeeded.
+    """
+
+    def __init__(self) -> None:
+        self.statements: List[str] = []
+        self.vars: Dict[str, Any] = {}
+        self.results: List[Any] = []
+        self._after_commit: List[Callable[[], None]] = []
+
+    def query(self, query_str: str, vars: Optional[Dict[str, Any]] = None) -> int:
+        """Buffer a statement and return its index in `results` after commit."""
+        idx = len(self.statements)
+        statement, statement_vars = _prepare_statement(query_str, vars, f"tx{idx}_")
+        self.statements.append(statement)
+        self.vars.update(statement_vars)
+        return idx
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Call `callback` after a successful commit; dropped on rollback."""
+        self._after_commit.append(callback)
+
+    def _run_after_commit(self) -> None:
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"After-commit callback failed: {str(e)}")
+
+    async def commit(self) -> List[Any]:
+        """Send all buffered statements in one transaction."""
+        if not self.statements:
+            self._run_after_commit()
+            return []
+        query_str = "\n".join(
+            ["BEGIN TRANSACTION;", *self.statements, "COMMIT TRANSACTION;"]
+        )
+        try:
+            results = await _run_statements(query_str, self.vars)
+        except Exception as e:
+            logger.error(f"Transaction with {len(self.statements)} statements failed")
+            logger.exception(e)
+            raise
+        # Depending on the server version BEGIN/COMMIT may report a result too
+        if len(results) == len(self.statements) + 2:
+            results = results[1:-1]
+        self.results = results
+        self._run_after_commit()
+        return results
+
+
+_current_transaction: ContextVar[Optional[Transaction]] = ContextVar(
+    "_current_transaction", default=None
+)
+
+
+def current_transaction() -> Optional[Transaction]:
+    """The transaction() block the caller runs in, if any."""
+    return _current_transaction.get()
+
+
+@asynccontextmanager
+async def transaction() -> AsyncIterator[Transaction]:
+    """
+    Group repo_create/repo_update/repo_upsert/repo_relate/repo_delete/repo_insert
+    calls made inside the block into a single atomic write.
+
+    Buffered creates get a client-generated id so later statements (e.g. a
+    RELATE) can reference the new record before it exists. repo_query keeps
+    executing immediately; use `tx.query(...)` to buffer raw statements.
+    Nested blocks join the outermost transaction.
+    """
+    current = _current_transaction.get()
+    if current is not None:
+        yield current
+        return
+
+    tx = Transaction()
+    token = _current_transaction.set(tx)
+    try:
+        yield tx
+    finally:
+        _current_transaction.reset(token)
+    await tx.commit()
+
+
 async def repo_query(
     query_str: str, vars: Optional[Dict[str, Any]] = None
 ) -> List[Dict[str, Any]]:
     """Execute a SurrealQL query and return the results"""
 
+    started = time.perf_counter()
     async with db_connection() as connection:
         try:
             result = parse_record_ids(await connection.query(query_str, vars))
             if isinstance(result, str):
                 raise RuntimeError(result)
+            _record_query("query", query_str, started, result)
             return result
         except Exception as e:
+            _record_query("query", query_str, started, failed=True)
             logger.error(f"Query: {query_str[:200]} vars: {vars}")
             logger.exception(e)
             raise
 
 
+async def repo_batch(
+    statements: List[Union[str, Tuple[str, Optional[Dict[str, Any]]]]],
+) -> List[List[Dict[str, Any]]]:
+    """
+    Execute independent statements in a single request and return the result of
+    each one, in order.
+
+    Every entry is either a query string or a (query, vars) tuple and must hold
+    exactly one statement. Variables are namespaced per statement, so entries may
+    reuse the same $names.
+    """
+    parts: List[str] = []
+    merged_vars: Dict[str, Any] = {}
+    for idx, entry in enumerate(statements):
+        query_str, vars = (entry, None) if isinstance(entry, str) else entry
+        statement, statement_vars = _prepare_statement(query_str, vars, f"q{idx}_")
+        parts.append(statement)
+        merged_vars.update(statement_vars)
+
+    if not parts:
+        return []
+    try:
+        return await _run_statements("\n".join(parts), merged_vars)
+    except Exception as e:
+        logger.error(f"Batch of {len(parts)} statements failed: {parts[0][:200]}")
+        logger.exception(e)
+        raise
+
+
 async def repo_create(table: str, data: Dict[str, Any]) -> Dict[str, Any]:
     """Create a new record in the specified table"""
     # Remove 'id' attribute if it exists in data
     data.pop("id", None)
     data["created"] = datetime.now(timezone.utc)
     data["updated"] = datetime.now(timezone.utc)
+    tx = _current_transaction.get()
+    if tx:
+        record_id = RecordID(table, _new_record_key())
+        tx.query("CREATE $id CONTENT $data", {"id": record_id, "data": data})
+        return [dict(data, id=str(record_id))]
+    started = time.perf_counter()
     try:
         async with db_connection() as connection:
-            return parse_record_ids(await connection.insert(table, data))
+            result = parse_record_ids(await connection.insert(table, data))
+        _record_query("create", f"INSERT INTO {table}", started, result)
+        return result
     except Exception as e:
+        _record_query("create", f"INSERT INTO {table}", started, failed=True)
         logger.exception(e)
         raise RuntimeError("Failed to create record")
 
@@ -102,6 +438,10 @@ async def repo_relate(
     query = f"RELATE {source}->{relationship}->{target} CONTENT $data;"
     # logger.debug(f"Relate query: {query}")
 
+    tx = _current_transaction.get()
+    if tx:
+        tx.query(query, {"data": data})
+        return []
     return await repo_query(
         query,
         {
@@ -118,6 +458,10 @@ async def repo_upsert(
     if add_timestamp:
         data["updated"] = datetime.now(timezone.utc)
     query = f"UPSERT {id if id else table} MERGE $data;"
+    tx = _current_transaction.get()
+    if tx:
+        tx.query(query, {"data": data})
+        return [dict(data, id=id)] if id else []
     return await repo_query(query, {"data": data})
 
 
@@ -137,21 +481,21 @@ async def repo_update(
         data["updated"] = datetime.now(timezone.utc)
         query = f"UPDATE {record_id} MERGE $data;"
         # logger.debug(f"Update query: {query}")
-        result = await repo_query(query, {"data": data})
-        # if isinstance(result, list):
-        #     return [_return_data(item) for item in result]
-        return parse_record_ids(result)
+        tx = _current_transaction.get()
+        if tx:
+            tx.query(query, {"data": data})
+            return [dict(data, id=str(record_id))]
+        return await repo_query(query, {"data": data})
     except Exception as e:
         raise RuntimeError(f"Failed to update record: {str(e)}")
 
 
 async def repo_get_news_by_jota_id(jota_id: str) -> Dict[str, Any]:
     try:
-        results = await repo_query(
+        return await repo_query(
             "SELECT * omit embedding FROM news where jota_id=$jota_id",
             {"jota_id": jota_id},
         )
-        return parse_record_ids(results)
     except Exception as e:
         logger.exception(e)
         raise RuntimeError(f"Failed to fetch record: {str(e)}")
@@ -160,10 +504,18 @@ async def repo_get_news_by_jota_id(jota_id: str) -> Dict[str, Any]:
 async def repo_delete(record_id: Union[str, RecordID]):
     """Delete a record by record id"""
 
+    tx = _current_transaction.get()
+    if tx:
+        tx.query("DELETE $id", {"id": ensure_record_id(record_id)})
+        return None
+    started = time.perf_counter()
     try:
         async with db_connection() as connection:
-            return await connection.delete(ensure_record_id(record_id))
+            result = await connection.delete(ensure_record_id(record_id))
+        _record_query("delete", f"DELETE {record_id}", started, result)
+        return result
     except Exception as e:
+        _record_query("delete", f"DELETE {record_id}", started, failed=True)
         logger.exception(e)
         raise RuntimeError(f"Failed to delete record: {str(e)}")
 
@@ -172,10 +524,19 @@ async def repo_insert(
     table: str, data: List[Dict[str, Any]], ignore_duplicates: bool = False
 ) -> List[Dict[str, Any]]:
     """Create a new record in the specified table"""
+    tx = _current_transaction.get()
+    if tx:
+        ignore = "IGNORE " if ignore_duplicates else ""
+        tx.query(f"INSERT {ignore}INTO {table} $data", {"data": data})
+        return []
+    started = time.perf_counter()
     try:
         async with db_connection() as connection:
-            return parse_record_ids(await connection.insert(table, data))
+            result = parse_record_ids(await connection.insert(table, data))
+        _record_query("insert", f"INSERT INTO {table}", started, result)
+        return result
     except Exception as e:
+        _record_query("insert", f"INSERT INTO {table}", started, failed=True)
         if ignore_duplicates and "already contains" in str(e):
             return []
         logger.exception(e)
@@ -1,10 +1,22 @@
 from datetime import datetime
-from typing import Any, ClassVar, Dict, List, Optional, Type, TypeVar, cast
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    cast,
+)
 
 from loguru import logger
 from pydantic import BaseModel, ValidationError, field_validator, model_validator
 
 from open_notebook.database.repository import (
+    current_transaction,
     ensure_record_id,
     repo_create,
     repo_delete,
@@ -21,10 +33,46 @@ from open_notebook.exceptions import (
 
 T = TypeVar("T", bound="ObjectModel")
 
+# Called with the ID of every record saved, deleted or related through the
+# models, so in-process caches can drop what they hold for it
+_change_listeners: List[Callable[[str], None]] = []
+
+
+def add_change_listener(listener: Callable[[str], None]) -> None:
+    _change_listeners.append(listener)
+
+
+def notify_change(*record_ids: Optional[str]) -> None:
+    """
+    Tell the change listeners about `record_ids`. Inside a transaction() block
+    they are told after it commits, so a cache cannot reload the old state
+    between the invalidation and the commit, and a rollback changes nothing.
+    """
+    tx = current_transaction()
+    if tx is not None:
+        tx.after_commit(lambda: _notify_listeners(record_ids))
+        return
+    _notify_listeners(record_ids)
+
+
+def _notify_listeners(record_ids: Tuple[Optional[str], ...]) -> None:
+    for record_id in record_ids:
+        if not record_id:
+            continue
+        for listener in _change_listeners:
+            try:
+                listener(str(record_id))
+            except Exception as e:
+                logger.warning(f"Change listener failed for {record_id}: {str(e)}")
+
 
 class ObjectModel(BaseModel):
     id: Optional[str] = None
     table_name: ClassVar[str] = ""
+    # Columns stored on the table that the model never reads (e.g. embeddings).
+    # They are omitted when loading rows so they are not transferred, walked by
+    # parse_record_ids and then discarded during validation.
+    unloaded_fields: ClassVar[List[str]] = []
     created: Optional[datetime] = None
     updated: Optional[datetime] = None
 
@@ -40,10 +88,11 @@ class ObjectModel(BaseModel):
                 raise InvalidInputError(
                     "get_all() must be called from a specific model class"
                 )
+            select = target_class._select_clause()
             if order_by:
-                query = f"SELECT * FROM {table_name} ORDER BY {order_by}"
+                query = f"{select} FROM {table_name} ORDER BY {order_by}"
             else:
-                query = f"SELECT * FROM {table_name}"
+                query = f"{select} FROM {table_name}"
 
             result = await repo_query(query)
             objects = []
@@ -77,7 +126,10 @@ class ObjectModel(BaseModel):
                     raise InvalidInputError(f"No class found for table {table_name}")
                 target_class = cast(Type[T], found_class)
 
-            result = await repo_query("SELECT * FROM $id", {"id": ensure_record_id(id)})
+            result = await repo_query(
+                f"{target_class._select_clause()} FROM $id",
+                {"id": ensure_record_id(id)},
+            )
             if result:
                 return target_class(**result[0])
             else:
@@ -87,6 +139,13 @@ class ObjectModel(BaseModel):
             logger.exception(e)
             raise NotFoundError(f"Object with id {id} not found - {str(e)}")
 
+    @classmethod
+    def _select_clause(cls) -> str:
+        """SELECT clause that loads every column the model uses."""
+        if cls.unloaded_fields:
+            return f"SELECT * OMIT {', '.join(cls.unloaded_fields)}"
+        return "SELECT *"
+
     @classmethod
     def _get_class_by_table_name(cls, table_name: str) -> Optional[Type["ObjectModel"]]:
         """Find the appropriate subclass based on table_name."""
@@ -151,6 +210,7 @@ class ObjectModel(BaseModel):
                         setattr(self, key, type(getattr(self, key))(**value))
                     else:
                         setattr(self, key, value)
+            notify_change(self.id)
 
         except ValidationError as e:
             logger.error(f"Validation failed: {e}")
@@ -168,7 +228,9 @@ class ObjectModel(BaseModel):
             raise InvalidInputError("Cannot delete object without an ID")
         try:
             logger.debug(f"Deleting record with id {self.id}")
-            return await repo_delete(self.id)
+            result = await repo_delete(self.id)
+            notify_change(self.id)
+            return result
         except Exception as e:
             logger.error(
                 f"Error deleting {self.__class__.table_name} with id {self.id}: {str(e)}"
@@ -183,9 +245,11 @@ class ObjectModel(BaseModel):
         if not relationship or not target_id or not self.id:
             raise InvalidInputError("Relationship and target ID must be provided")
         try:
-            return await repo_relate(
+            result = await repo_relate(
                 source=self.id, relationship=relationship, target=target_id, data=data
             )
+            notify_change(self.id, target_id)
+            return result
         except Exception as e:
             logger.error(f"Error creating relationship: {str(e)}")
             logger.exception(e)
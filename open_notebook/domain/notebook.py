@@ -1,15 +1,50 @@
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from typing import Any, ClassVar, Dict, List, Literal, Optional, Tuple
+from itertools import islice
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    ClassVar,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+)
 
 from loguru import logger
 from pydantic import BaseModel, Field, field_validator
 
-from open_notebook.database.repository import ensure_record_id, repo_query
-from open_notebook.domain.base import ObjectModel
+from open_notebook.database.repository import (
+    ensure_record_id,
+    repo_batch,
+    repo_query,
+    transaction,
+)
+from open_notebook.domain.base import ObjectModel, notify_change
 from open_notebook.domain.models import model_manager
 from open_notebook.exceptions import DatabaseOperationError, InvalidInputError
-from open_notebook.utils import split_text
+from open_notebook.utils import content_hash, iter_split_text
+
+# Source.vectorize embeds chunks in batches of this size, with this many
+# batches in flight at once
+EMBEDDING_BATCH_SIZE = 32
+EMBEDDING_WORKERS = 4
+
+SOURCES_QUERY = """
+    select * omit source.full_text from (
+        select in as source from reference where out=$id
+        fetch source
+    ) order by source.updated desc
+"""
+
+NOTES_QUERY = """
+    select * omit note.content, note.embedding from (
+        select in as note from artifact where out=$id
+        fetch note
+    ) order by note.updated desc
+"""
 
 
 class Notebook(ObjectModel):
@@ -27,15 +62,7 @@ class Notebook(ObjectModel):
 
     async def get_sources(self) -> List["Source"]:
         try:
-            srcs = await repo_query(
-                """
-                select * omit source.full_text from (
-                select in as source from reference where out=$id
-                fetch source
-            ) order by source.updated desc
-            """,
-                {"id": ensure_record_id(self.id)},
-            )
+            srcs = await repo_query(SOURCES_QUERY, {"id": ensure_record_id(self.id)})
             return [Source(**src["source"]) for src in srcs] if srcs else []
         except Exception as e:
             logger.error(f"Error fetching sources for notebook {self.id}: {str(e)}")
@@ -44,21 +71,34 @@ class Notebook(ObjectModel):
 
     async def get_notes(self) -> List["Note"]:
         try:
-            srcs = await repo_query(
-                """
-            select * omit note.content, note.embedding from (
-                select in as note from artifact where out=$id
-                fetch note
-            ) order by note.updated desc
-            """,
-                {"id": ensure_record_id(self.id)},
-            )
+            srcs = await repo_query(NOTES_QUERY, {"id": ensure_record_id(self.id)})
             return [Note(**src["note"]) for src in srcs] if srcs else []
         except Exception as e:
             logger.error(f"Error fetching notes for notebook {self.id}: {str(e)}")
             logger.exception(e)
             raise DatabaseOperationError(e)
 
+    async def get_sources_and_notes(self) -> Tuple[List["Source"], List["Note"]]:
+        """Fetch the notebook's sources and notes in a single round trip."""
+        try:
+            notebook_id = ensure_record_id(self.id)
+            srcs, notes = await repo_batch(
+                [
+                    (SOURCES_QUERY, {"id": notebook_id}),
+                    (NOTES_QUERY, {"id": notebook_id}),
+                ]
+            )
+            return (
+                [Source(**src["source"]) for src in srcs or []],
+                [Note(**note["note"]) for note in notes or []],
+            )
+        except Exception as e:
+            logger.error(
+                f"Error fetching sources and notes for notebook {self.id}: {str(e)}"
+            )
+            logger.exception(e)
+            raise DatabaseOperationError(e)
+
     async def get_chat_sessions(self) -> List["ChatSession"]:
         try:
             srcs = await repo_query(
@@ -92,6 +132,7 @@ class Asset(BaseModel):
 
 class SourceEmbedding(ObjectModel):
     table_name: ClassVar[str] = "source_embedding"
+    unloaded_fields: ClassVar[List[str]] = ["embedding"]
     content: str
 
     async def get_source(self) -> "Source":
@@ -111,6 +152,7 @@ class SourceEmbedding(ObjectModel):
 
 class SourceInsight(ObjectModel):
     table_name: ClassVar[str] = "source_insight"
+    unloaded_fields: ClassVar[List[str]] = ["embedding"]
     insight_type: str
     content: str
 
@@ -134,9 +176,10 @@ class SourceInsight(ObjectModel):
             title=f"{self.insight_type} from source {source.title}",
             content=self.content,
         )
-        await note.save()
-        if notebook_id:
-            await note.add_to_notebook(notebook_id)
+        async with transaction():
+            await note.save()
+            if notebook_id:
+                await note.add_to_notebook(notebook_id)
         return note
 
 
@@ -146,11 +189,93 @@ class Source(ObjectModel):
     title: Optional[str] = None
     topics: Optional[List[str]] = Field(default_factory=list)
     full_text: Optional[str] = None
+    content_hash: Optional[str] = None
+
+    @classmethod
+    async def get_by_content_hash(cls, content_hash: str) -> Optional["Source"]:
+        """Return the oldest source whose full text has this hash, if any."""
+        try:
+            result = await repo_query(
+                """
+                SELECT * FROM source WHERE content_hash=$content_hash
+                ORDER BY created ASC LIMIT 1
+                """,
+                {"content_hash": content_hash},
+            )
+            return cls(**result[0]) if result else None
+        except Exception as e:
+            logger.error(f"Error fetching source by content hash: {str(e)}")
+            logger.exception(e)
+            raise DatabaseOperationError(e)
+
+    @classmethod
+    async def backfill_content_hashes(cls, batch_size: int = 100) -> int:
+        """
+        Store the content hash of sources created before hashes were kept, so
+        adding their content again reuses them. Sources are updated oldest
+        first, which keeps their order by `updated`. Returns how many were
+        updated.
+        """
+        updated = 0
+        try:
+            while True:
+                rows = await repo_query(
+                    """
+                    SELECT id, full_text, updated FROM source
+                    WHERE content_hash IS NONE AND full_text
+                    ORDER BY updated ASC LIMIT $limit
+                    """,
+                    {"limit": batch_size},
+                )
+                if not rows:
+                    break
+                hashes = await asyncio.to_thread(
+                    lambda: [content_hash(row["full_text"]) for row in rows]
+                )
+                async with transaction() as tx:
+                    for row, text_hash in zip(rows, hashes):
+                        tx.query(
+                            "UPDATE $id SET content_hash=$content_hash",
+                            {
+                                "id": ensure_record_id(row["id"]),
+                                "content_hash": text_hash,
+                            },
+                        )
+                updated += len(rows)
+        except Exception as e:
+            logger.error(f"Error backfilling source content hashes: {str(e)}")
+            logger.exception(e)
+            raise DatabaseOperationError(e)
+        if updated:
+            logger.info(f"Stored the content hash of {updated} existing sources")
+        return updated
+
+    async def is_in_notebook(self, notebook_id: str) -> bool:
+        try:
+            result = await repo_query(
+                "SELECT id FROM reference WHERE in=$id AND out=$notebook_id LIMIT 1",
+                {
+                    "id": ensure_record_id(self.id),
+                    "notebook_id": ensure_record_id(notebook_id),
+                },
+            )
+            return bool(result)
+        except Exception as e:
+            logger.error(f"Error checking notebook membership of {self.id}: {str(e)}")
+            logger.exception(e)
+            raise DatabaseOperationError(e)
 
     async def get_context(
         self, context_size: Literal["short", "long"] = "short"
     ) -> Dict[str, Any]:
-        insights_list = await self.get_insights()
+        return self.build_context(await self.get_insights(), context_size)
+
+    def build_context(
+        self,
+        insights_list: List[SourceInsight],
+        context_size: Literal["short", "long"] = "short",
+    ) -> Dict[str, Any]:
+        """Context of the source from already fetched insights."""
         insights = [insight.model_dump() for insight in insights_list]
         if context_size == "long":
             return dict(
@@ -178,11 +303,26 @@ class Source(ObjectModel):
             logger.exception(e)
             raise DatabaseOperationError(f"Failed to count chunks for source: {str(e)}")
 
+    async def get_chunks(self) -> List[str]:
+        """Text of the stored embedding chunks, in document order."""
+        try:
+            result = await repo_query(
+                """
+                SELECT order, content FROM source_embedding WHERE source=$id ORDER BY order
+                """,
+                {"id": ensure_record_id(self.id)},
+            )
+            return [chunk["content"] for chunk in result]
+        except Exception as e:
+            logger.error(f"Error fetching chunks for source {self.id}: {str(e)}")
+            logger.exception(e)
+            raise DatabaseOperationError(f"Failed to fetch chunks for source: {str(e)}")
+
     async def get_insights(self) -> List[SourceInsight]:
         try:
             result = await repo_query(
                 """
-                SELECT * FROM source_insight WHERE source=$id
+                SELECT * OMIT embedding FROM source_insight WHERE source=$id
                 """,
                 {"id": ensure_record_id(self.id)},
             )
@@ -197,7 +337,60 @@ class Source(ObjectModel):
             raise InvalidInputError("Notebook ID must be provided")
         return await self.relate("reference", notebook_id)
 
-    async def vectorize(self) -> None:
+    async def remove_from_notebook(self, notebook_id: str) -> bool:
+        """
+        Unlink the source from a notebook. Deduplicated sources are shared, so
+        the source itself (with its chunks and insights) is only deleted when
+        no other notebook references it. Returns whether it was deleted.
+        """
+        if not notebook_id:
+            raise InvalidInputError("Notebook ID must be provided")
+        try:
+            async with transaction() as tx:
+                tx.query(
+                    "DELETE reference WHERE in=$id AND out=$notebook_id",
+                    {
+                        "id": ensure_record_id(self.id),
+                        "notebook_id": ensure_record_id(notebook_id),
+                    },
+                )
+                delete_idx = tx.query(
+                    "DELETE $id WHERE count(->reference) = 0 RETURN BEFORE",
+                    {"id": ensure_record_id(self.id)},
+                )
+            notify_change(self.id, notebook_id)
+            return bool(tx.results[delete_idx])
+        except Exception as e:
+            logger.error(
+                f"Error removing source {self.id} from notebook {notebook_id}: {str(e)}"
+            )
+            logger.exception(e)
+            raise DatabaseOperationError(e)
+
+    async def vectorize(
+        self,
+        on_progress: Optional[Callable[[int, Optional[int]], Awaitable[None]]] = None,
+        resume_from: Optional[int] = None,
+        on_checkpoint: Optional[Callable[[int], Awaitable[None]]] = None,
+    ) -> None:
+        """
+        Chunk, embed and store the source's full text as a streaming pipeline.
+
+        Chunks are produced in a worker thread, embedded in batches by a few
+        concurrent workers and written as soon as each batch is embedded. The
+        bounded queues between the stages apply backpressure, so only a handful
+        of batches are held in memory regardless of the document size, and early
+        chunks become searchable while later ones are still being embedded.
+
+        `on_progress(written, total)` is awaited after every written batch;
+        `total` is None until the whole text has been chunked.
+
+        Batches may be written out of order, so `on_checkpoint(n)` is awaited
+        whenever the first `n` chunks are all stored. Passing that `n` back as
+        `resume_from` continues an interrupted run: chunks from `n` on are
+        deleted (they may be partially written) and embedded again, earlier
+        ones are kept.
+        """
         logger.info(f"Starting vectorization for source {self.id}")
         EMBEDDING_MODEL = await model_manager.get_embedding_model()
 
@@ -206,58 +399,103 @@ class Source(ObjectModel):
                 logger.warning(f"No text to vectorize for source {self.id}")
                 return
 
-            chunks = split_text(
-                self.full_text,
-            )
-            chunk_count = len(chunks)
-            logger.info(f"Split into {chunk_count} chunks for source {self.id}")
+            source_id = ensure_record_id(self.id)
+            start = resume_from or 0
+            if resume_from is not None:
+                await repo_query(
+                    "DELETE source_embedding WHERE source=$id AND order >= $start;",
+                    {"id": source_id, "start": start},
+                )
+            # Splitting is deterministic, so skipping the first chunks of a new
+            # split lines them up with the ones already stored
+            chunks = islice(iter_split_text(self.full_text), start, None)
+            embed_queue: asyncio.Queue = asyncio.Queue(maxsize=EMBEDDING_WORKERS)
+            write_queue: asyncio.Queue = asyncio.Queue(maxsize=EMBEDDING_WORKERS)
+            chunk_count = start
+            chunking_done = False
+            written = start
+            stored_prefix = start
+            stored_batches: Dict[int, int] = {}
+
+            async def produce_chunks() -> None:
+                nonlocal chunk_count, chunking_done
+                while True:
+                    batch = await asyncio.to_thread(
+                        list, islice(chunks, EMBEDDING_BATCH_SIZE)
+                    )
+                    if not batch:
+                        break
+                    await embed_queue.put((chunk_count, batch))
+                    chunk_count += len(batch)
+                chunking_done = True
+                for _ in range(EMBEDDING_WORKERS):
+                    await embed_queue.put(None)
+
+            async def embed_chunks() -> None:
+                while (item := await embed_queue.get()) is not None:
+                    order, batch = item
+                    logger.debug(f"Embedding chunks {order}-{order + len(batch) - 1}")
+                    embeddings = await EMBEDDING_MODEL.aembed(batch)
+                    await write_queue.put((order, batch, embeddings))
+
+            async def write_chunks() -> None:
+                nonlocal written, stored_prefix
+                while (item := await write_queue.get()) is not None:
+                    order, batch, embeddings = item
+                    await repo_query(
+                        "INSERT INTO source_embedding $records RETURN NONE;",
+                        {
+                            "records": [
+                                {
+                                    "source": source_id,
+                                    "order": order + offset,
+                                    "content": content,
+                                    "embedding": embedding,
+                                }
+                                for offset, (content, embedding) in enumerate(
+                                    zip(batch, embeddings)
+                                )
+                            ]
+                        },
+                    )
+                    written += len(batch)
+                    stored_batches[order] = len(batch)
+                    previous_prefix = stored_prefix
+                    while stored_prefix in stored_batches:
+                        stored_prefix += stored_batches.pop(stored_prefix)
+                    if on_checkpoint and stored_prefix > previous_prefix:
+                        await on_checkpoint(stored_prefix)
+                    if on_progress:
+                        await on_progress(
+                            written, chunk_count if chunking_done else None
+                        )
+
+            async def run_embedders() -> None:
+                async with asyncio.TaskGroup() as embedders:
+                    for _ in range(EMBEDDING_WORKERS):
+                        embedders.create_task(embed_chunks())
+                await write_queue.put(None)
+
+            # A failure in any stage cancels the others
+            try:
+                async with asyncio.TaskGroup() as pipeline:
+                    pipeline.create_task(produce_chunks())
+                    pipeline.create_task(run_embedders())
+                    pipeline.create_task(write_chunks())
+            except ExceptionGroup as group:
+                failure = group.exceptions[0]
+                while isinstance(failure, ExceptionGroup):
+                    failure = failure.exceptions[0]
+                raise failure
 
             if chunk_count == 0:
                 logger.warning("No chunks created after splitting")
                 return
-
-            # Process chunks concurrently using async gather
-            logger.info("Starting concurrent processing of chunks")
-
-            async def process_chunk(
-                idx: int, chunk: str
-            ) -> Tuple[int, List[float], str]:
-                logger.debug(f"Processing chunk {idx}/{chunk_count}")
-                try:
-                    embedding = (await EMBEDDING_MODEL.aembed([chunk]))[0]
-                    cleaned_content = chunk
-                    logger.debug(f"Successfully processed chunk {idx}")
-                    return (idx, embedding, cleaned_content)
-                except Exception as e:
-                    logger.error(f"Error processing chunk {idx}: {str(e)}")
-                    raise
-
-            # Create tasks for all chunks and process them concurrently
-            tasks = [process_chunk(idx, chunk) for idx, chunk in enumerate(chunks)]
-            results = await asyncio.gather(*tasks)
-
-            logger.info(f"Parallel processing complete. Got {len(results)} results")
-
-            # Insert results in order (they're already ordered by index)
-            for idx, embedding, content in results:
-                logger.debug(f"Inserting chunk {idx} into database")
-                await repo_query(
-                    """
-                    CREATE source_embedding CONTENT {
-                            "source": $source_id,
-                            "order": $order,
-                            "content": $content,
-                            "embedding": $embedding,
-                    };""",
-                    {
-                        "source_id": ensure_record_id(self.id),
-                        "order": idx,
-                        "content": content,
-                        "embedding": embedding,
-                    },
-                )
-
-            logger.info(f"Vectorization complete for source {self.id}")
+            if on_progress:
+                await on_progress(written, chunk_count)
+            logger.info(
+                f"Vectorization complete for source {self.id}: {chunk_count} chunks"
+            )
 
         except Exception as e:
             logger.error(f"Error vectorizing source {self.id}: {str(e)}")
@@ -275,7 +513,7 @@ class Source(ObjectModel):
             embedding = (
                 (await EMBEDDING_MODEL.aembed([content]))[0] if EMBEDDING_MODEL else []
             )
-            return await repo_query(
+            result = await repo_query(
                 """
                 CREATE source_insight CONTENT {
                         "source": $source_id,
@@ -290,13 +528,97 @@ class Source(ObjectModel):
                     "embedding": embedding,
                 },
             )
+            notify_change(self.id)
+            return result
         except Exception as e:
             logger.error(f"Error adding insight to source {self.id}: {str(e)}")
             raise  # DatabaseOperationError(e)
 
 
+class SourceIngestion(ObjectModel):
+    """
+    Checkpoint of a background source ingestion.
+
+    `stage` only moves forward (pending, extracted, saved, embedded, done);
+    together with `chunks_embedded` and `transformations_done` it tells a
+    resumed ingestion which work is already finished. The extraction output
+    is kept in `extracted` until the source is saved.
+    """
+
+    table_name: ClassVar[str] = "source_ingestion"
+    STAGES: ClassVar[List[str]] = ["pending", "extracted", "saved", "embedded", "done"]
+
+    notebook_id: Optional[str] = None
+    content_state: Dict[str, Any] = Field(default_factory=dict)
+    transformations: List[str] = Field(default_factory=list)
+    embed: bool = False
+    deduplicate: bool = True
+    stage: str = "pending"
+    extracted: Optional[Dict[str, Any]] = None
+    source: Optional[str] = None
+    chunks_embedded: int = 0
+    transformations_done: List[str] = Field(default_factory=list)
+    error: Optional[str] = None
+
+    @classmethod
+    async def get_incomplete(cls, limit: int = 100) -> List["SourceIngestion"]:
+        """Ingestions that have not finished, oldest first."""
+        try:
+            result = await repo_query(
+                """
+                SELECT * FROM source_ingestion WHERE stage != "done"
+                ORDER BY created ASC LIMIT $limit
+                """,
+                {"limit": limit},
+            )
+            return [cls(**ingestion) for ingestion in result]
+        except Exception as e:
+            logger.error(f"Error fetching incomplete ingestions: {str(e)}")
+            logger.exception(e)
+            raise DatabaseOperationError(e)
+
+    def reached(self, stage: str) -> bool:
+        return self.STAGES.index(self.stage) >= self.STAGES.index(stage)
+
+    async def checkpoint(self, **changes: Any) -> None:
+        """
+        Persist the given fields. Inside a transaction() block the update is
+        committed atomically with the block's other writes.
+        """
+        if not changes:
+            return
+        assignments = []
+        vars: Dict[str, Any] = {"id": ensure_record_id(self.id)}
+        for key, value in changes.items():
+            setattr(self, key, value)
+            if value is None:
+                assignments.append(f"{key} = NONE")
+            else:
+                assignments.append(f"{key} = ${key}")
+                vars[key] = ensure_record_id(value) if key == "source" else value
+        async with transaction() as tx:
+            tx.query(f"UPDATE $id SET {', '.join(assignments)};", vars)
+
+    async def mark_transformation_done(self, transformation_id: str) -> None:
+        # Added server-side, as transformations finish concurrently
+        if transformation_id not in self.transformations_done:
+            self.transformations_done.append(transformation_id)
+        async with transaction() as tx:
+            tx.query(
+                """
+                UPDATE $id SET transformations_done =
+                    array::union(transformations_done, [$transformation_id]);
+                """,
+                {
+                    "id": ensure_record_id(self.id),
+                    "transformation_id": transformation_id,
+                },
+            )
+
+
 class Note(ObjectModel):
     table_name: ClassVar[str] = "note"
+    unloaded_fields: ClassVar[List[str]] = ["embedding"]
     title: Optional[str] = None
     note_type: Optional[Literal["human", "ai"]] = None
     content: Optional[str] = None
@@ -1,4 +1,4 @@
-from typing import ClassVar, Optional
+from typing import ClassVar, Literal, Optional
 
 from pydantic import Field
 
@@ -12,6 +12,9 @@ class Transformation(ObjectModel):
     description: str
     prompt: str
     apply_default: bool
+    # "map_reduce" runs the prompt over chunks of long inputs and combines the
+    # partial outputs, instead of sending the whole text in one prompt
+    execution_mode: Literal["single", "map_reduce"] = "single"
 
 
 class DefaultPrompts(RecordModel):
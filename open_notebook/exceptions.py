@@ -22,6 +22,12 @@ class InvalidInputError(OpenNotebookError):
     pass
 
 
+class FileTooLargeError(InvalidInputError):
+    """Raised when an uploaded file exceeds the configured size limit."""
+
+    pass
+
+
 class NotFoundError(OpenNotebookError):
     """Raised when a requested resource is not found."""
 
@@ -9,10 +9,15 @@ from langgraph.types import Send
 from pydantic import BaseModel, Field
 from typing_extensions import TypedDict
 
+from open_notebook.context_packer import ContextItem, pack_items
 from open_notebook.domain.notebook import vector_search
-from open_notebook.graphs.utils import provision_langchain_model
+from open_notebook.graphs.utils import llm_priority, provision_langchain_model
+from open_notebook.llm_scheduler import Priority
 from open_notebook.utils import clean_thinking_content
 
+# Search results placed in each answer prompt; the most similar are kept
+SEARCH_RESULTS_TOKEN_BUDGET = 12_000
+
 
 class SubGraphState(TypedDict):
     question: str
@@ -57,6 +62,7 @@ async def call_model_with_messages(state: ThreadState, config: RunnableConfig) -
         system_prompt,
         config.get("configurable", {}).get("strategy_model"),
         "tools",
+        priority=llm_priority(config, Priority.INTERACTIVE),
         max_tokens=2000,
         structured=dict(type="json"),
     )
@@ -96,6 +102,20 @@ async def provide_answer(state: SubGraphState, config: RunnableConfig) -> dict:
     results = await vector_search(state["term"], 10, True, True)
     if len(results) == 0:
         return {"answers": []}
+    packed = pack_items(
+        [
+            ContextItem(
+                id=str(result["id"]),
+                kind="result",
+                parent_id=str(pid) if (pid := result.get("parent_id")) else None,
+                payload=result,
+                score=result.get("similarity") or 0.0,
+            )
+            for result in results
+        ],
+        SEARCH_RESULTS_TOKEN_BUDGET,
+    )
+    results = [item.payload for item in packed.items]
     payload["results"] = results
     ids = [r["id"] for r in results]
     payload["ids"] = ids
@@ -104,6 +124,7 @@ async def provide_answer(state: SubGraphState, config: RunnableConfig) -> dict:
         system_prompt,
         config.get("configurable", {}).get("answer_model"),
         "tools",
+        priority=llm_priority(config, Priority.INTERACTIVE),
         max_tokens=2000,
     )
     ai_message = await model.ainvoke(system_prompt)
@@ -116,6 +137,7 @@ async def write_final_answer(state: ThreadState, config: RunnableConfig) -> dict
         system_prompt,
         config.get("configurable", {}).get("final_answer_model"),
         "tools",
+        priority=llm_priority(config, Priority.INTERACTIVE),
         max_tokens=2000,
     )
     ai_message = await model.ainvoke(system_prompt)
@@ -1,18 +1,29 @@
-import asyncio
-import sqlite3
-from typing import Annotated, Optional
+import os
+from typing import Annotated, Any, AsyncIterator, List, Optional, Tuple
 
 from ai_prompter import Prompter
-from langchain_core.messages import SystemMessage
+from langchain_core.messages import HumanMessage, RemoveMessage, SystemMessage
 from langchain_core.runnables import RunnableConfig
-from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.message import add_messages
+from langgraph.graph.state import CompiledStateGraph
+from loguru import logger
 from typing_extensions import TypedDict
 
-from open_notebook.config import LANGGRAPH_CHECKPOINT_FILE
+from open_notebook.checkpointer import get_checkpointer, prune_checkpoints
 from open_notebook.domain.notebook import Notebook
 from open_notebook.graphs.utils import provision_langchain_model
+from open_notebook.llm_scheduler import Priority
+from open_notebook.utils import clean_thinking_content
+
+# Turns kept verbatim in the thread; older ones are folded into its summary.
+# 0 keeps the whole history.
+HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "10"))
+# Turns allowed over HISTORY_TURNS before they are folded, so the summary is
+# not rewritten on every turn
+HISTORY_SUMMARY_BATCH = int(os.getenv("CHAT_HISTORY_SUMMARY_BATCH", "5"))
+SUMMARY_MAX_TOKENS = 1000
 
 
 class ThreadState(TypedDict):
@@ -20,31 +31,151 @@ class ThreadState(TypedDict):
     notebook: Optional[Notebook]
     context: Optional[str]
     context_config: Optional[dict]
+    summary: Optional[str]
 
 
-def call_model_with_messages(state: ThreadState, config: RunnableConfig) -> dict:
+async def call_model_with_messages(state: ThreadState, config: RunnableConfig) -> dict:
     system_prompt = Prompter(prompt_template="chat").render(data=state)
     payload = [SystemMessage(content=system_prompt)] + state.get("messages", [])
-    model = asyncio.run(
-        provision_langchain_model(
-            str(payload),
-            config.get("configurable", {}).get("model_id"),
-            "chat",
-            max_tokens=10000,
-        )
+    model = await provision_langchain_model(
+        str(payload),
+        config.get("configurable", {}).get("model_id"),
+        "chat",
+        priority=Priority.INTERACTIVE,
+        max_tokens=10000,
     )
-    ai_message = model.invoke(payload)
+    # Passing the config on lets graph.astream(stream_mode="messages") receive
+    # the answer token by token
+    ai_message = await model.ainvoke(payload, config)
     return {"messages": ai_message}
 
 
-conn = sqlite3.connect(
-    LANGGRAPH_CHECKPOINT_FILE,
-    check_same_thread=False,
-)
-memory = SqliteSaver(conn)
+def _turns_to_fold(messages: List[Any]) -> int:
+    """How many of the oldest messages fall outside the kept turns, if it is time to fold them."""
+    if HISTORY_TURNS <= 0:
+        return 0
+    turn_starts = [
+        idx for idx, message in enumerate(messages) if message.type == "human"
+    ]
+    if len(turn_starts) <= HISTORY_TURNS + HISTORY_SUMMARY_BATCH:
+        return 0
+    return turn_starts[-HISTORY_TURNS]
+
+
+def _transcript(messages: List[Any]) -> str:
+    lines = []
+    for message in messages:
+        if message.type == "human":
+            lines.append(f"User: {message_text(message.content)}")
+        elif message.type == "ai":
+            lines.append(
+                f"Assistant: {clean_thinking_content(message_text(message.content))}"
+            )
+    return "\n\n".join(lines)
+
+
+async def summarize_history(state: ThreadState, config: RunnableConfig) -> dict:
+    """
+    Fold the turns older than the last HISTORY_TURNS into the thread's rolling
+    summary, so the prompt and the checkpoint stop growing with the session.
+    Runs after the answer, so it does not delay the first token.
+    """
+    messages = state.get("messages", [])
+    cut = _turns_to_fold(messages)
+    if not cut:
+        return {}
+    folded = messages[:cut]
+    system_prompt = Prompter(prompt_template="chat/summary").render(
+        data={"summary": state.get("summary")}
+    )
+    payload = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=_transcript(folded)),
+    ]
+    try:
+        model = await provision_langchain_model(
+            str(payload),
+            None,
+            "transformation",
+            priority=Priority.DEFAULT,
+            max_tokens=SUMMARY_MAX_TOKENS,
+        )
+        response = await model.ainvoke(payload)
+        summary = clean_thinking_content(message_text(response.content))
+    except Exception as e:
+        logger.warning(f"Could not summarize chat history: {str(e)}")
+        return {}
+    if not summary:
+        return {}
+    logger.debug(f"Folded {len(folded)} chat messages into the summary")
+    return {
+        "summary": summary,
+        "messages": [RemoveMessage(id=message.id) for message in folded],
+    }
+
 
 agent_state = StateGraph(ThreadState)
 agent_state.add_node("agent", call_model_with_messages)
+agent_state.add_node("summarize_history", summarize_history)
 agent_state.add_edge(START, "agent")
-agent_state.add_edge("agent", END)
-graph = agent_state.compile(checkpointer=memory)
+agent_state.add_edge("agent", "summarize_history")
+agent_state.add_edge("summarize_history", END)
+
+
+_compiled: Optional[Tuple[BaseCheckpointSaver, CompiledStateGraph]] = None
+
+
+async def get_chat_graph() -> CompiledStateGraph:
+    """Chat graph with the checkpointer of the running event loop."""
+    global _compiled
+    checkpointer = await get_checkpointer()
+    if _compiled is None or _compiled[0] is not checkpointer:
+        _compiled = (checkpointer, agent_state.compile(checkpointer=checkpointer))
+    return _compiled[1]
+
+
+def message_text(content: Any) -> str:
+    """Text of a message's content; some providers use lists of content blocks."""
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content or []
+    )
+
+
+async def stream_chat(
+    graph: CompiledStateGraph, state: Any, config: RunnableConfig
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Run one chat turn. Yields ("token", text) for each piece of the answer as
+    the model produces it, then ("state", values) with the saved thread state.
+    If the turn folded old messages into the summary, the thread's older
+    checkpoints, which still hold them, are pruned once the run has saved its
+    last checkpoint.
+    """
+    values = None
+    folded = False
+    async for mode, data in graph.astream(
+        state, config, stream_mode=["messages", "updates", "values"]
+    ):
+        if mode == "values":
+            values = data
+            continue
+        if mode == "updates":
+            folded = folded or bool(data.get("summarize_history"))
+            continue
+        chunk, metadata = data
+        if metadata.get("langgraph_node") != "agent":
+            continue
+        text = message_text(chunk.content)
+        if text:
+            yield "token", text
+
+    thread_id = config.get("configurable", {}).get("thread_id")
+    if folded and thread_id:
+        try:
+            await prune_checkpoints(str(thread_id))
+        except Exception as e:
+            logger.warning(f"Could not compact checkpoints of {thread_id}: {str(e)}")
+    yield "state", values
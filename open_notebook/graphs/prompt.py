@@ -7,7 +7,8 @@ from langgraph.graph import END, START, StateGraph
 from loguru import logger
 from typing_extensions import TypedDict
 
-from open_notebook.graphs.utils import provision_langchain_model
+from open_notebook.graphs.utils import llm_priority, provision_langchain_model
+from open_notebook.llm_scheduler import Priority
 
 
 class PatternChainState(TypedDict):
@@ -27,6 +28,7 @@ async def call_model(state: dict, config: RunnableConfig) -> dict:
         str(payload),
         config.get("configurable", {}).get("model_id"),
         "transformation",
+        priority=llm_priority(config, Priority.DEFAULT),
         max_tokens=5000,
     )
 
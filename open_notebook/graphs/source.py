@@ -1,18 +1,37 @@
+import asyncio
+import contextlib
 import operator
-from typing import Any, Dict, List, Optional
+import os
+from typing import (
+    Any,
+    AsyncContextManager,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
+import httpx
 from content_core import extract_content
-from content_core.common import ProcessSourceState
+from content_core.common import ProcessSourceOutput, ProcessSourceState
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
 from langgraph.types import Send
 from loguru import logger
 from typing_extensions import Annotated, TypedDict
 
+from open_notebook.cache import DiskCache, make_cache_key
+from open_notebook.config import CACHE_FOLDER
+from open_notebook.database.repository import transaction
 from open_notebook.domain.content_settings import ContentSettings
-from open_notebook.domain.notebook import Asset, Source
+from open_notebook.domain.notebook import Asset, Source, SourceIngestion
 from open_notebook.domain.transformation import Transformation
 from open_notebook.graphs.transformation import graph as transform_graph
+from open_notebook.uploads import file_sha256
+from open_notebook.utils import content_hash
 
 
 class SourceState(TypedDict):
@@ -22,6 +41,8 @@ class SourceState(TypedDict):
     source: Source
     transformation: Annotated[list, operator.add]
     embed: bool
+    # Reuse an existing source with the same content instead of creating a copy
+    deduplicate: bool
 
 
 class TransformationState(TypedDict):
@@ -29,9 +50,144 @@ class TransformationState(TypedDict):
     transformation: Transformation
 
 
-async def content_process(state: SourceState) -> dict:
+# Extraction results are cached on disk so re-adding the same file or URL does
+# not download and parse it again. Set EXTRACTION_CACHE_MAX_MB=0 to disable.
+extraction_cache = DiskCache(
+    f"{CACHE_FOLDER}/extraction",
+    int(os.getenv("EXTRACTION_CACHE_MAX_MB", "1024")) * 1024 * 1024,
+)
+# URLs that expose neither ETag nor Last-Modified are only cached this long
+URL_CACHE_TTL = 24 * 60 * 60
+
+
+def _normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit(
+        (
+            parts.scheme.lower(),
+            parts.netloc.lower(),
+            parts.path or "/",
+            query,
+            "",
+        )
+    )
+
+
+async def _url_validator(url: str) -> Optional[str]:
+    """ETag or Last-Modified of the URL, if the server provides one."""
+    try:
+        async with httpx.AsyncClient(follow_redirects=True, timeout=5) as client:
+            response = await client.head(url)
+    except httpx.HTTPError as e:
+        logger.debug(f"Could not fetch validators for {url}: {str(e)}")
+        return None
+    if response.status_code >= 400:
+        return None
+    return response.headers.get("etag") or response.headers.get("last-modified")
+
+
+async def _extraction_cache_key(
+    content_state: Dict[str, Any],
+) -> Optional[Tuple[str, Optional[float]]]:
+    """
+    Cache key and TTL for an extraction request, or None when it should not be
+    cached (raw text input or an unreadable file).
+    """
+    engines = (
+        content_state.get("url_engine"),
+        content_state.get("document_engine"),
+        content_state.get("output_format"),
+    )
+    if content_state.get("file_path"):
+        try:
+            # Usually known from the upload already
+            file_hash = await asyncio.to_thread(file_sha256, content_state["file_path"])
+        except OSError:
+            return None
+        return make_cache_key("file", file_hash, *engines), None
+    if content_state.get("url"):
+        url = _normalize_url(content_state["url"])
+        validator = await _url_validator(content_state["url"])
+        ttl = None if validator else URL_CACHE_TTL
+        return make_cache_key("url", url, validator, *engines), ttl
+    return None
+
+
+class IngestionProgress:
+    """
+    Stage-level progress of one source ingestion, passed to the graph as
+    `configurable.progress`. Every change is handed to `sink` (e.g. to persist
+    it on a background command); sink failures are logged and never interrupt
+    the ingestion.
+    """
+
+    def __init__(self, sink: Callable[[Dict[str, Any]], Awaitable[None]]):
+        self.sink = sink
+        self.state: Dict[str, Any] = {}
+
+    async def update(self, **changes: Any) -> None:
+        self.state.update(changes)
+        try:
+            await self.sink(dict(self.state))
+        except Exception as e:
+            logger.warning(f"Could not report ingestion progress: {str(e)}")
+
+
+class IngestionLimits:
+    """
+    Per-stage concurrency limits shared by ingestions running side by side,
+    passed to the graph as `configurable.limits`. Extraction, embedding and
+    LLM transformations use different resources, so each gets its own cap.
+    """
+
+    def __init__(self, extraction: int, embedding: int, transformation: int):
+        self.extraction = asyncio.Semaphore(extraction)
+        self.embedding = asyncio.Semaphore(embedding)
+        self.transformation = asyncio.Semaphore(transformation)
+
+
+def _stage_limit(
+    config: Optional[RunnableConfig], stage: str
+) -> AsyncContextManager[Any]:
+    limits = (config or {}).get("configurable", {}).get("limits")
+    if limits is None:
+        return contextlib.nullcontext()
+    return getattr(limits, stage)
+
+
+def _get_ingestion(config: Optional[RunnableConfig]) -> Optional[SourceIngestion]:
+    return (config or {}).get("configurable", {}).get("ingestion")
+
+
+def _get_progress(config: Optional[RunnableConfig]) -> Optional[IngestionProgress]:
+    return (config or {}).get("configurable", {}).get("progress")
+
+
+async def _report(config: Optional[RunnableConfig], **changes: Any) -> None:
+    progress = _get_progress(config)
+    if progress:
+        await progress.update(**changes)
+
+
+def _embedding_progress(
+    config: Optional[RunnableConfig],
+) -> Optional[Callable[[int, Optional[int]], Awaitable[None]]]:
+    if not _get_progress(config):
+        return None
+
+    async def on_progress(embedded: int, total: Optional[int]) -> None:
+        await _report(
+            config, stage="embedding", chunks_embedded=embedded, chunks_total=total
+        )
+
+    return on_progress
+
+
+async def _extract_content(
+    content_state: Dict[str, Any], config: RunnableConfig
+) -> ProcessSourceOutput:
     content_settings = ContentSettings()
-    content_state: Dict[str, Any] = state["content_state"]
 
     content_state["url_engine"] = (
         content_settings.default_content_processing_engine_url or "auto"
@@ -41,29 +197,165 @@ async def content_process(state: SourceState) -> dict:
     )
     content_state["output_format"] = "markdown"
 
-    processed_state = await extract_content(content_state)
+    cache_key = (
+        await _extraction_cache_key(content_state) if extraction_cache.enabled else None
+    )
+    if cache_key:
+        cached = await asyncio.to_thread(extraction_cache.get, cache_key[0])
+        if cached is not None:
+            logger.debug("Using cached content extraction")
+            cached.update(
+                url=content_state.get("url") or "",
+                file_path=content_state.get("file_path") or "",
+            )
+            return ProcessSourceOutput(**cached)
+
+    async with _stage_limit(config, "extraction"):
+        processed_state = await extract_content(content_state)
+
+    if cache_key and processed_state.content:
+        await asyncio.to_thread(
+            extraction_cache.set,
+            cache_key[0],
+            processed_state.model_dump(),
+            cache_key[1],
+        )
+    return processed_state
+
+
+async def content_process(state: SourceState, config: RunnableConfig) -> dict:
+    ingestion = _get_ingestion(config)
+    if ingestion and ingestion.reached("saved"):
+        # Resuming after the source was saved; save_source loads it
+        return {}
+    if ingestion and ingestion.extracted is not None:
+        logger.debug(f"Resuming ingestion {ingestion.id} from its extraction")
+        return {"content_state": ProcessSourceOutput(**ingestion.extracted)}
+
+    await _report(config, stage="extracting")
+    processed_state = await _extract_content(state["content_state"], config)
+    if ingestion:
+        await ingestion.checkpoint(
+            stage="extracted", extracted=processed_state.model_dump()
+        )
     return {"content_state": processed_state}
 
 
-async def save_source(state: SourceState) -> dict:
+async def reuse_existing_source(
+    state: SourceState, text_hash: str, config: Optional[RunnableConfig] = None
+) -> Optional[dict]:
+    """
+    Link an existing source with the same content to the notebook instead of
+    creating a new one. Embeddings are only created if the existing source has
+    none, and transformations it already has insights for are skipped.
+    """
+    source = await Source.get_by_content_hash(text_hash)
+    if not source:
+        return None
+    logger.info(f"Reusing source {source.id} with identical content")
+
+    notebook_id = state["notebook_id"]
+    if notebook_id and not await source.is_in_notebook(notebook_id):
+        await source.add_to_notebook(notebook_id)
+
+    embed = state["embed"] and await source.get_embedded_chunks() == 0
+    ingestion = _get_ingestion(config)
+    if ingestion:
+        await ingestion.checkpoint(
+            stage="saved" if embed else "embedded", source=source.id, extracted=None
+        )
+    return await _process_saved_source(state, source, config, embed, skip_applied=True)
+
+
+async def _report_transformations_start(
+    config: Optional[RunnableConfig], to_apply: List[Transformation]
+) -> None:
+    if to_apply:
+        await _report(
+            config,
+            stage="transformations",
+            transformations_done=0,
+            transformations_total=len(to_apply),
+        )
+
+
+async def _process_saved_source(
+    state: SourceState,
+    source: Source,
+    config: Optional[RunnableConfig],
+    embed: bool,
+    skip_applied: bool = False,
+) -> dict:
+    """Embed a saved source and select the transformations still to apply."""
+    ingestion = _get_ingestion(config)
+    if embed:
+        logger.debug("Embedding content for vector search")
+        await _report(config, stage="chunking")
+        checkpoint_args: Dict[str, Any] = {}
+        if ingestion:
+            checkpoint_args = dict(
+                resume_from=ingestion.chunks_embedded,
+                on_checkpoint=lambda count: ingestion.checkpoint(chunks_embedded=count),
+            )
+        async with _stage_limit(config, "embedding"):
+            await source.vectorize(
+                on_progress=_embedding_progress(config), **checkpoint_args
+            )
+        if ingestion:
+            await ingestion.checkpoint(stage="embedded")
+
+    to_apply = state["apply_transformations"]
+    if skip_applied:
+        applied = {insight.insight_type for insight in await source.get_insights()}
+        to_apply = [t for t in to_apply if t.title not in applied]
+    if ingestion:
+        to_apply = [
+            t for t in to_apply if str(t.id) not in ingestion.transformations_done
+        ]
+    await _report_transformations_start(config, to_apply)
+    return {"source": source, "apply_transformations": to_apply}
+
+
+async def save_source(state: SourceState, config: RunnableConfig) -> dict:
+    ingestion = _get_ingestion(config)
+    if ingestion and ingestion.reached("saved"):
+        logger.info(f"Resuming ingestion {ingestion.id} of source {ingestion.source}")
+        source = await Source.get(ingestion.source)
+        # Insights added right before an interruption may not be checkpointed
+        return await _process_saved_source(
+            state,
+            source,
+            config,
+            embed=state["embed"] and not ingestion.reached("embedded"),
+            skip_applied=True,
+        )
+
+    await _report(config, stage="saving")
     content_state = state["content_state"]
 
+    text_hash = content_hash(content_state.content) if content_state.content else None
+    if text_hash and state.get("deduplicate", True):
+        reused = await reuse_existing_source(state, text_hash, config)
+        if reused:
+            return reused
+
     source = Source(
         asset=Asset(url=content_state.url, file_path=content_state.file_path),
         full_text=content_state.content,
         title=content_state.title,
+        content_hash=text_hash,
     )
-    await source.save()
+    async with transaction():
+        await source.save()
 
-    if state["notebook_id"]:
-        logger.debug(f"Adding source to notebook {state['notebook_id']}")
-        await source.add_to_notebook(state["notebook_id"])
+        if state["notebook_id"]:
+            logger.debug(f"Adding source to notebook {state['notebook_id']}")
+            await source.add_to_notebook(state["notebook_id"])
 
-    if state["embed"]:
-        logger.debug("Embedding content for vector search")
-        await source.vectorize()
+        if ingestion:
+            await ingestion.checkpoint(stage="saved", source=source.id, extracted=None)
 
-    return {"source": source}
+    return await _process_saved_source(state, source, config, state["embed"])
 
 
 def trigger_transformations(state: SourceState, config: RunnableConfig) -> List[Send]:
@@ -85,18 +377,31 @@ def trigger_transformations(state: SourceState, config: RunnableConfig) -> List[
     ]
 
 
-async def transform_content(state: TransformationState) -> Optional[dict]:
+async def transform_content(
+    state: TransformationState, config: RunnableConfig
+) -> Optional[dict]:
     source = state["source"]
-    content = source.full_text
-    if not content:
+    if not source.full_text:
         return None
     transformation: Transformation = state["transformation"]
 
     logger.debug(f"Applying transformation {transformation.name}")
-    result = await transform_graph.ainvoke(
-        dict(input_text=content, transformation=transformation)
-    )
-    await source.add_insight(transformation.title, result["output"])
+    # Passing the source rather than its text lets map-reduce transformations
+    # reuse the chunks stored by save_source, which runs vectorize first; the
+    # transformation graph also saves the insight. The config carries
+    # llm_priority and model_id to the model calls.
+    async with _stage_limit(config, "transformation"):
+        result = await transform_graph.ainvoke(
+            dict(source=source, transformation=transformation), config
+        )
+    ingestion = _get_ingestion(config)
+    if ingestion:
+        await ingestion.mark_transformation_done(str(transformation.id))
+    progress = _get_progress(config)
+    if progress:
+        await progress.update(
+            transformations_done=progress.state.get("transformations_done", 0) + 1
+        )
     return {
         "transformation": [
             {
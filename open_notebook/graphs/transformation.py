@@ -1,13 +1,43 @@
+import asyncio
+import hashlib
+import os
+from typing import List, Optional
+
 from ai_prompter import Prompter
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
+from loguru import logger
 from typing_extensions import TypedDict
 
+from open_notebook.cache import DiskCache, make_cache_key
+from open_notebook.config import CACHE_FOLDER
 from open_notebook.domain.notebook import Source
 from open_notebook.domain.transformation import DefaultPrompts, Transformation
-from open_notebook.graphs.utils import provision_langchain_model
-from open_notebook.utils import clean_thinking_content
+from open_notebook.graphs.utils import llm_priority, provision_langchain_model
+from open_notebook.llm_scheduler import Priority
+from open_notebook.utils import (
+    clean_thinking_content,
+    estimate_token_count,
+    split_text,
+    token_counts,
+)
+
+MAX_OUTPUT_TOKENS = 5055
+# Map-reduce transformations: size of the sections the prompt is applied to,
+# and how many sections are transformed at once
+MAP_REDUCE_CHUNK_TOKENS = int(os.getenv("TRANSFORMATION_CHUNK_TOKENS", "8000"))
+MAP_REDUCE_CONCURRENCY = int(os.getenv("TRANSFORMATION_MAP_CONCURRENCY", "4"))
+# Most partial outputs combined by one reduce call
+REDUCE_FAN_IN = 4
+
+# Outputs keyed by rendered prompt, model and input, so re-running the same
+# transformation on the same text does not call the model again. Set
+# TRANSFORMATION_CACHE_MAX_MB=0 to disable.
+transformation_cache = DiskCache(
+    f"{CACHE_FOLDER}/transformations",
+    int(os.getenv("TRANSFORMATION_CACHE_MAX_MB", "256")) * 1024 * 1024,
+)
 
 
 class TransformationState(TypedDict):
@@ -17,11 +47,132 @@ class TransformationState(TypedDict):
     output: str
 
 
+async def _transform(system_prompt: str, content: str, config: RunnableConfig) -> str:
+    """Run one prompt over `content`, reusing a cached output when there is one."""
+    payload = [SystemMessage(content=system_prompt)] + [HumanMessage(content=content)]
+    chain = await provision_langchain_model(
+        str(payload),
+        config.get("configurable", {}).get("model_id"),
+        "transformation",
+        priority=llm_priority(config, Priority.BACKGROUND),
+        max_tokens=MAX_OUTPUT_TOKENS,
+    )
+
+    cache_key = make_cache_key(
+        "transformation",
+        system_prompt,
+        chain.model_key,
+        MAX_OUTPUT_TOKENS,
+        hashlib.sha256(content.encode("utf-8")).hexdigest(),
+    )
+    cached = (
+        await asyncio.to_thread(transformation_cache.get, cache_key)
+        if transformation_cache.enabled
+        else None
+    )
+    if cached is not None:
+        logger.debug("Using cached transformation output")
+        return cached
+
+    response = await chain.ainvoke(payload)
+
+    # Clean thinking content from the response
+    cleaned_content = clean_thinking_content(response.content)
+    if cleaned_content:
+        await asyncio.to_thread(transformation_cache.set, cache_key, cleaned_content)
+    return cleaned_content
+
+
+def _group(
+    texts: List[str], max_tokens: int, max_items: int = 0, min_items: int = 1
+) -> List[List[str]]:
+    """
+    Split consecutive texts into groups of at most `max_tokens` tokens (and
+    `max_items` texts, if set). A group only closes once it has `min_items`
+    texts, even if that exceeds the token budget.
+    """
+    groups: List[List[str]] = []
+    current: List[str] = []
+    size = 0
+    for text, tokens in zip(texts, token_counts(texts)):
+        fits = size + tokens <= max_tokens and (
+            not max_items or len(current) < max_items
+        )
+        if current and not fits and len(current) >= min_items:
+            groups.append(current)
+            current, size = [], 0
+        current.append(text)
+        size += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def _sections(source: Optional[Source], content: str) -> List[str]:
+    """
+    Sections of about MAP_REDUCE_CHUNK_TOKENS tokens for the map step. A
+    source's stored embedding chunks are regrouped instead of splitting its
+    text again; they overlap slightly, which only repeats a few sentences at
+    the section boundaries.
+    """
+    if estimate_token_count(content) <= MAP_REDUCE_CHUNK_TOKENS:
+        return [content]
+    chunks = await source.get_chunks() if source else []
+    if not chunks:
+        return await asyncio.to_thread(split_text, content, MAP_REDUCE_CHUNK_TOKENS)
+    groups = await asyncio.to_thread(_group, chunks, MAP_REDUCE_CHUNK_TOKENS)
+    return ["\n\n".join(group) for group in groups]
+
+
+async def _map_reduce(
+    instructions: str, sections: List[str], config: RunnableConfig
+) -> str:
+    """
+    Apply the transformation to every section concurrently, then combine the
+    partial outputs in a tree of reduce calls of up to REDUCE_FAN_IN outputs
+    each, until a single output is left.
+    """
+    limit = asyncio.Semaphore(MAP_REDUCE_CONCURRENCY)
+    map_prompt = f"{instructions}\n\n# INPUT"
+    reduce_prompt = Prompter(prompt_template="transformation/reduce").render(
+        data={"instructions": instructions}
+    )
+
+    async def run(system_prompt: str, content: str) -> str:
+        async with limit:
+            return await _transform(system_prompt, content, config)
+
+    async def reduce(parts: List[str]) -> str:
+        if len(parts) == 1:
+            return parts[0]
+        combined = "\n\n".join(
+            f"## PART {idx}\n\n{part}" for idx, part in enumerate(parts, 1)
+        )
+        return await run(reduce_prompt, combined)
+
+    logger.debug(f"Running transformation over {len(sections)} sections")
+    async with asyncio.TaskGroup() as group:
+        tasks = [group.create_task(run(map_prompt, section)) for section in sections]
+    outputs = [task.result() for task in tasks if task.result()]
+
+    while len(outputs) > 1:
+        groups = await asyncio.to_thread(
+            _group, outputs, MAP_REDUCE_CHUNK_TOKENS, REDUCE_FAN_IN, 2
+        )
+        logger.debug(f"Reducing {len(outputs)} partial outputs into {len(groups)}")
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(reduce(parts)) for parts in groups]
+        outputs = [task.result() for task in tasks if task.result()]
+    return outputs[0] if outputs else ""
+
+
 async def run_transformation(state: dict, config: RunnableConfig) -> dict:
     source: Source = state.get("source")
     content = state.get("input_text")
     assert source or content, "No content to transform"
     transformation: Transformation = state["transformation"]
+    # Stored chunks only match the source's own text, not an explicit input
+    chunk_source = None if content else source
     if not content:
         content = source.full_text
     transformation_template_text = transformation.prompt
@@ -29,23 +180,21 @@ async def run_transformation(state: dict, config: RunnableConfig) -> dict:
     if default_prompts.transformation_instructions:
         transformation_template_text = f"{default_prompts.transformation_instructions}\n\n{transformation_template_text}"
 
-    transformation_template_text = f"{transformation_template_text}\n\n# INPUT"
-
-    system_prompt = Prompter(template_text=transformation_template_text).render(
+    instructions = Prompter(template_text=transformation_template_text).render(
         data=state
     )
-    payload = [SystemMessage(content=system_prompt)] + [HumanMessage(content=content)]
-    chain = await provision_langchain_model(
-        str(payload),
-        config.get("configurable", {}).get("model_id"),
-        "transformation",
-        max_tokens=5055,
-    )
 
-    response = await chain.ainvoke(payload)
-
-    # Clean thinking content from the response
-    cleaned_content = clean_thinking_content(response.content)
+    sections = (
+        await _sections(chunk_source, content)
+        if transformation.execution_mode == "map_reduce"
+        else [content]
+    )
+    if len(sections) > 1:
+        cleaned_content = await _map_reduce(instructions, sections, config)
+    else:
+        cleaned_content = await _transform(
+            f"{instructions}\n\n# INPUT", content, config
+        )
 
     if source:
         await source.add_insight(transformation.title, cleaned_content)
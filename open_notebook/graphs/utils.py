@@ -3,21 +3,43 @@ from langchain_core.language_models.chat_models import BaseChatModel
 from loguru import logger
 
 from open_notebook.domain.models import model_manager
-from open_notebook.utils import token_count
+from open_notebook.llm_scheduler import Priority, ScheduledModel, parse_priority
+from open_notebook.utils import estimate_token_count, token_count
+
+LARGE_CONTEXT_THRESHOLD = 105_000
+
+
+def llm_priority(config, default: Priority) -> Priority:
+    """Priority requested through `configurable.llm_priority`, else `default`."""
+    return parse_priority(
+        (config or {}).get("configurable", {}).get("llm_priority"), default
+    )
 
 
 async def provision_langchain_model(
-    content, model_id, default_type, **kwargs
+    content, model_id, default_type, priority=Priority.DEFAULT, **kwargs
 ) -> BaseChatModel:
     """
     Returns the best model to use based on the context size and on whether there is a specific model being requested in Config.
     If context > 105_000, returns the large_context_model
     If model_id is specified in Config, returns that model
     Otherwise, returns the default model for the given type
+
+    The model is wrapped in a ScheduledModel, so its calls are queued by the
+    LLM scheduler with the given priority.
     """
-    tokens = token_count(content)
+    # Only pay for exact tokenization when the content may be near the
+    # threshold. The chars/4 estimate undercounts digits, code, base64 and
+    # URLs, so content is only taken as small when even 2 bytes per token
+    # keeps it under the threshold.
+    tokens = estimate_token_count(content)
+    if (
+        tokens < 1.25 * LARGE_CONTEXT_THRESHOLD
+        and len(content.encode("utf-8")) / 2 > LARGE_CONTEXT_THRESHOLD
+    ):
+        tokens = token_count(content)
 
-    if tokens > 105_000:
+    if tokens > LARGE_CONTEXT_THRESHOLD:
         logger.debug(
             f"Using large context model because the content has {tokens} tokens"
         )
@@ -29,4 +51,10 @@ async def provision_langchain_model(
 
     logger.debug(f"Using model: {model}")
     assert isinstance(model, LanguageModel), f"Model is not a LanguageModel: {model}"
-    return model.to_langchain()
+    return ScheduledModel(
+        model.to_langchain(),
+        f"{model.provider}/{model.get_model_name()}",
+        parse_priority(priority),
+        input_tokens=tokens,
+        max_tokens=kwargs.get("max_tokens") or 0,
+    )
@@ -0,0 +1,446 @@
+"""
+Process-wide scheduling of LLM calls.
+
+Every chat model handed out by `provision_langchain_model` goes through the
+scheduler, which applies:
+
+- per model (or per provider) token buckets for requests and tokens per
+  minute, so bursts of ingestion stay within provider rate limits;
+- a global cap on in-flight LLM calls;
+- priority classes, so interactive chat and search are served before queued
+  background transformations.
+
+Time spent waiting is exported as metrics. Limits are configured with
+LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE and
+LLM_RATE_LIMITS (JSON overrides per "provider/model" or "provider").
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import (
+    Runnable,
+    RunnableBinding,
+    RunnableConfig,
+    RunnableLambda,
+)
+from loguru import logger
+
+from open_notebook.metrics import COUNT_BUCKETS, counter, histogram
+
+QUEUE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+llm_queue_seconds = histogram(
+    "open_notebook_llm_queue_seconds",
+    "Time LLM calls waited for rate limits and a concurrency slot",
+    ("model", "priority"),
+    QUEUE_BUCKETS,
+)
+llm_call_seconds = histogram(
+    "open_notebook_llm_call_duration_seconds",
+    "Duration of LLM calls once scheduled",
+    ("model", "priority"),
+    QUEUE_BUCKETS,
+)
+llm_queue_depth = histogram(
+    "open_notebook_llm_queue_depth",
+    "LLM calls already waiting when a call was queued",
+    ("priority",),
+    COUNT_BUCKETS,
+)
+llm_calls_total = counter(
+    "open_notebook_llm_calls_total",
+    "LLM calls by outcome",
+    ("model", "priority", "outcome"),
+)
+
+
+class Priority(IntEnum):
+    """Scheduling class of an LLM call; lower values are served first."""
+
+    INTERACTIVE = 0
+    DEFAULT = 1
+    BACKGROUND = 2
+
+
+def parse_priority(value: Any, default: Priority = Priority.DEFAULT) -> Priority:
+    """Priority from a Priority, its name or its value (e.g. from a graph config)."""
+    if value is None:
+        return default
+    if isinstance(value, str):
+        try:
+            return Priority[value.upper()]
+        except KeyError:
+            logger.warning(f"Unknown LLM priority {value}, using {default.name}")
+            return default
+    return Priority(value)
+
+
+class _PriorityQueue:
+    """Futures waiting for a resource, ordered by priority then arrival."""
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[int, int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, priority: Priority, amount: int = 1) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._counter), amount, future))
+        return future
+
+    def peek(self) -> Optional[Tuple[int, asyncio.Future]]:
+        """Amount and future of the first waiter still waiting."""
+        while self._heap and self._heap[0][3].done():
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        _, _, amount, future = self._heap[0]
+        return amount, future
+
+    def pop(self) -> None:
+        heapq.heappop(self._heap)
+
+
+class TokenBucket:
+    """
+    Refills `per_minute` units per minute up to a burst of the same size.
+    Waiters are served strictly in priority order, so a large request at the
+    head is not starved by smaller ones behind it.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+        self._waiters = _PriorityQueue()
+        self._drainer: Optional[asyncio.Task] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(
+            self.capacity, self.available + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    async def acquire(self, amount: float, priority: Priority) -> None:
+        # A request larger than the burst would never fit; let it drain the bucket
+        amount = min(amount, self.capacity)
+        self._refill()
+        if not len(self._waiters) and self.available >= amount:
+            self.available -= amount
+            return
+        future = self._waiters.push(priority, int(amount))
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.create_task(self._drain())
+        await future
+
+    async def _drain(self) -> None:
+        while (head := self._waiters.peek()) is not None:
+            amount, future = head
+            self._refill()
+            if self.available >= amount:
+                self.available -= amount
+                self._waiters.pop()
+                future.set_result(None)
+                continue
+            await asyncio.sleep((amount - self.available) / self.rate)
+
+
+class _ConcurrencyGate:
+    """At most `limit` holders; waiters are admitted by priority."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = _PriorityQueue()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, priority: Priority) -> None:
+        if self.active < self.limit and not len(self._waiters):
+            self.active += 1
+            return
+        future = self._waiters.push(priority)
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled right after being handed the slot: pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        head = self._waiters.peek()
+        if head is None:
+            self.active -= 1
+            return
+        # Hand the slot over directly so a newcomer cannot take it first
+        self._waiters.pop()
+        head[1].set_result(None)
+
+
+def _positive_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, str(default))))
+    except ValueError:
+        logger.warning(f"Invalid {name}, using {default}")
+        return default
+
+
+def _load_rate_limits() -> Dict[str, Dict[str, float]]:
+    raw = os.getenv("LLM_RATE_LIMITS")
+    if not raw:
+        return {}
+    try:
+        return {key.lower(): value for key, value in json.loads(raw).items()}
+    except (ValueError, AttributeError):
+        logger.warning("LLM_RATE_LIMITS is not valid JSON, ignoring it")
+        return {}
+
+
+class LLMScheduler:
+    """
+    Rate limits, concurrency cap and priorities for LLM calls in one event
+    loop. Use `get_scheduler()` rather than creating instances.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        rate_limits: Optional[Dict[str, Dict[str, float]]] = None,
+    ):
+        self.gate = _ConcurrencyGate(max_concurrency) if max_concurrency else None
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.rate_limits = rate_limits or {}
+        self._buckets: Dict[Tuple[str, str], Optional[TokenBucket]] = {}
+
+    def _bucket(self, model_key: str, kind: str) -> Optional[TokenBucket]:
+        """Bucket for `model_key` ("provider/model"), shared per override key."""
+        provider = model_key.split("/", 1)[0]
+        key = next(
+            (k for k in (model_key, provider) if k in self.rate_limits), model_key
+        )
+        if (key, kind) not in self._buckets:
+            default = (
+                self.requests_per_minute
+                if kind == "requests_per_minute"
+                else self.tokens_per_minute
+            )
+            per_minute = self.rate_limits.get(key, {}).get(kind, default)
+            self._buckets[(key, kind)] = TokenBucket(per_minute) if per_minute else None
+        return self._buckets[(key, kind)]
+
+    @asynccontextmanager
+    async def slot(
+        self, model_key: str, priority: Priority, tokens: int = 0
+    ) -> AsyncIterator[None]:
+        """Wait for the model's rate limits and a concurrency slot."""
+        model_key = model_key.lower()
+        labels = dict(model=model_key, priority=priority.name.lower())
+        queued = time.perf_counter()
+        if self.gate:
+            llm_queue_depth.observe(self.gate.waiting, priority=labels["priority"])
+
+        requests = self._bucket(model_key, "requests_per_minute")
+        if requests:
+            await requests.acquire(1, priority)
+        token_bucket = self._bucket(model_key, "tokens_per_minute")
+        if token_bucket and tokens:
+            await token_bucket.acquire(tokens, priority)
+        if self.gate:
+            await self.gate.acquire(priority)
+
+        started = time.perf_counter()
+        waited = started - queued
+        llm_queue_seconds.observe(waited, **labels)
+        if waited > 1:
+            logger.debug(f"LLM call to {model_key} waited {waited:.1f}s in queue")
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        finally:
+            if self.gate:
+                self.gate.release()
+            llm_call_seconds.observe(time.perf_counter() - started, **labels)
+            llm_calls_total.inc(outcome=outcome, **labels)
+
+
+# Scheduler state uses asyncio primitives, which belong to one event loop. The
+# API and the worker each run a single loop, so this is process-wide there.
+_schedulers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, LLMScheduler]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_scheduler() -> LLMScheduler:
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = LLMScheduler(
+            max_concurrency=_positive_int("LLM_MAX_CONCURRENCY", 8),
+            requests_per_minute=_positive_int("LLM_REQUESTS_PER_MINUTE", 0),
+            tokens_per_minute=_positive_int("LLM_TOKENS_PER_MINUTE", 0),
+            rate_limits=_load_rate_limits(),
+        )
+        _schedulers[loop] = scheduler
+    return scheduler
+
+
+class ScheduledModel(BaseChatModel):
+    """
+    Chat model that runs a LangChain chat model through the scheduler.
+
+    Being a chat model itself, it composes like one (`prompt | model`,
+    `with_retry`, `bind_tools`, `with_structured_output`), and every
+    generation or stream it makes holds a scheduler slot. Tools are bound on
+    this model, so bound calls are scheduled too. The scheduler lives in the
+    event loop, so sync calls go straight to the model, unscheduled.
+    """
+
+    model: BaseChatModel
+    model_key: str
+    priority: Priority = Priority.DEFAULT
+    # Providers count requested output tokens against the limit up front
+    tokens: int = 0
+
+    def __init__(
+        self,
+        model: BaseChatModel,
+        model_key: str,
+        priority: Priority,
+        input_tokens: int = 0,
+        max_tokens: int = 0,
+        **kwargs: Any,
+    ):
+        super().__init__(
+            model=model,
+            model_key=model_key,
+            priority=priority,
+            tokens=input_tokens + max_tokens,
+            **kwargs,
+        )
+
+    @property
+    def _llm_type(self) -> str:
+        return self.model._llm_type
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return dict(self.model._identifying_params)
+
+    def _should_stream(self, **kwargs: Any) -> bool:
+        return self.model._should_stream(**kwargs)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self._warn_unscheduled()
+        return self.model._generate(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        self._warn_unscheduled()
+        yield from self.model._stream(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+
+    def _warn_unscheduled(self) -> None:
+        logger.warning(
+            f"Sync call to {self.model_key} bypasses the LLM scheduler; "
+            "use ainvoke or astream to apply its limits"
+        )
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        async with get_scheduler().slot(self.model_key, self.priority, self.tokens):
+            return await self.model._agenerate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        async with get_scheduler().slot(self.model_key, self.priority, self.tokens):
+            async for chunk in self.model._astream(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            ):
+                yield chunk
+
+    def bind_tools(
+        self,
+        tools: Sequence[Any],
+        *,
+        tool_choice: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Runnable[LanguageModelInput, AIMessage]:
+        # Let the provider format the tools, then bind the result here so the
+        # calls still go through the scheduler
+        bound = self.model.bind_tools(tools, tool_choice=tool_choice, **kwargs)
+        if isinstance(bound, RunnableBinding) and bound.bound is self.model:
+            return self.bind(**bound.kwargs)
+        if isinstance(bound, BaseChatModel):
+            return ScheduledModel(bound, self.model_key, self.priority, self.tokens)
+        return self._schedule_runnable(bound)
+
+    def _schedule_runnable(
+        self, runnable: Runnable[LanguageModelInput, AIMessage]
+    ) -> Runnable[LanguageModelInput, AIMessage]:
+        """Runnable whose async calls to `runnable` hold a scheduler slot."""
+
+        async def ainvoke(
+            input: LanguageModelInput, config: RunnableConfig
+        ) -> AIMessage:
+            async with get_scheduler().slot(self.model_key, self.priority, self.tokens):
+                return await runnable.ainvoke(input, config)
+
+        def invoke(input: LanguageModelInput, config: RunnableConfig) -> AIMessage:
+            self._warn_unscheduled()
+            return runnable.invoke(input, config)
+
+        return RunnableLambda(invoke, afunc=ainvoke)
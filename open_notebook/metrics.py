@@ -0,0 +1,186 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Metrics live in a module-level registry and are rendered by `render_metrics()`
+for the API's /metrics endpoint. Values are per process; each worker exposes
+its own series.
+"""
+
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Label sets beyond this are folded into a single "other" series so an
+# unexpected source of label values cannot grow memory without bound.
+MAX_SERIES_PER_METRIC = 500
+OVERFLOW_LABEL = "other"
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1_000, 5_000, 10_000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str], series: Dict) -> Tuple[str, ...]:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        if key not in series and len(series) >= MAX_SERIES_PER_METRIC:
+            key = (OVERFLOW_LABEL,) * len(self.labelnames)
+        return key
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        with self._lock:
+            key = self._key(labels, self._values)
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        lines = self._header()
+        for key, value in values:
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Bucketed distribution with running sum and count per label set."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            key = self._key(labels, self._series)
+            series = self._series.get(key)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._series[key] = series
+            series[0][idx] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = [
+                (key, list(counts), total[0])
+                for key, (counts, total) in self._series.items()
+            ]
+        lines = self._header()
+        bounds = [*self.buckets, float("inf")]
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames, key, f'le="{_format_value(bound)}"'
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    """Create (or fetch the already registered) counter `name`."""
+    return registry.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DURATION_BUCKETS,
+) -> Histogram:
+    """Create (or fetch the already registered) histogram `name`."""
+    return registry.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+
+def render_metrics() -> str:
+    """Render every registered metric in Prometheus text format."""
+    return registry.render()
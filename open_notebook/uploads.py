@@ -0,0 +1,311 @@
+"""
+Streaming storage of uploaded source files.
+
+Uploads are written to UPLOADS_FOLDER from worker threads while their SHA-256
+is computed, so extraction can identify a file without reading it again.
+Large files can be sent in pieces through an UploadSession, which keeps the
+received prefix across dropped connections and API restarts.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from loguru import logger
+from pydantic import BaseModel
+
+from open_notebook.cache import DiskCache, make_cache_key
+from open_notebook.config import CACHE_FOLDER, UPLOADS_FOLDER
+from open_notebook.exceptions import (
+    FileTooLargeError,
+    InvalidInputError,
+    NotFoundError,
+)
+
+# Largest accepted upload; 0 disables the limit
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "4096")) * 1024 * 1024
+# Uploads are hashed and written in blocks of this size
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+SESSIONS_FOLDER = f"{UPLOADS_FOLDER}/.sessions"
+# Unfinished upload sessions are removed after this many seconds
+SESSION_TTL = 24 * 60 * 60
+
+# Hashes of stored files, keyed by path, size and modification time. Shared
+# through the cache folder with the worker that extracts the files.
+file_hashes = DiskCache(f"{CACHE_FOLDER}/file_hashes", 16 * 1024 * 1024)
+
+_SESSION_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+# Running hash of each session's received data, so appending does not read
+# the partial file again. Rebuilt from disk after a restart.
+_session_digests: Dict[str, Tuple[int, Any]] = {}
+_session_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _file_key(path: str) -> str:
+    stat = os.stat(path)
+    return make_cache_key(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def remember_file_hash(path: str, sha256: str) -> None:
+    file_hashes.set(_file_key(path), sha256)
+
+
+def _hash_file(path: str, limit: Optional[int] = None) -> Any:
+    digest = hashlib.sha256()
+    remaining = limit
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            size = (
+                UPLOAD_BLOCK_SIZE
+                if remaining is None
+                else min(remaining, UPLOAD_BLOCK_SIZE)
+            )
+            block = f.read(size)
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest
+
+
+def file_sha256(path: str) -> str:
+    """
+    SHA-256 of a file, reusing the hash computed while it was uploaded.
+    Blocks on disk I/O; call it through `asyncio.to_thread` from async code.
+    """
+    key = _file_key(path)
+    cached = file_hashes.get(key)
+    if cached:
+        return cached
+    sha256 = _hash_file(path).hexdigest()
+    file_hashes.set(key, sha256)
+    return sha256
+
+
+def new_upload_path(filename: str) -> Path:
+    """Unique destination in the uploads folder that keeps the file's name."""
+    name = Path(filename).name
+    return (
+        Path(UPLOADS_FOLDER)
+        / f"{Path(name).stem}_{uuid.uuid4().hex}{Path(name).suffix}"
+    )
+
+
+def _check_size(size: int) -> None:
+    if MAX_UPLOAD_BYTES > 0 and size > MAX_UPLOAD_BYTES:
+        raise FileTooLargeError(
+            f"File exceeds the upload limit of {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+        )
+
+
+async def _blocks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Regroup a byte stream into UPLOAD_BLOCK_SIZE blocks."""
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer.extend(chunk)
+        if len(buffer) >= UPLOAD_BLOCK_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+class HashingWriter:
+    """
+    Writes blocks to a file from a worker thread, updating a SHA-256 with
+    each one. `size` counts the bytes stored so far, including `offset`.
+    """
+
+    def __init__(self, handle: Any, offset: int, digest: Any):
+        self.handle = handle
+        self.size = offset
+        self.digest = digest
+
+    @classmethod
+    async def open(
+        cls, path: Path, offset: int = 0, digest: Optional[Any] = None
+    ) -> "HashingWriter":
+        def open_at_offset():
+            handle = open(path, "r+b" if offset else "wb")
+            if offset:
+                handle.seek(offset)
+                handle.truncate()
+            return handle
+
+        handle = await asyncio.to_thread(open_at_offset)
+        return cls(handle, offset, digest or hashlib.sha256())
+
+    def _write(self, block: bytes) -> None:
+        self.handle.write(block)
+        self.digest.update(block)
+
+    async def write(self, block: bytes) -> None:
+        await asyncio.to_thread(self._write, block)
+        self.size += len(block)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self.handle.close)
+
+
+async def save_upload(
+    chunks: AsyncIterator[bytes], filename: str
+) -> Tuple[Path, str, int]:
+    """
+    Stream an upload into the uploads folder and return its path, SHA-256 and
+    size. Nothing is kept if the upload fails or exceeds the size limit.
+    """
+    await asyncio.to_thread(os.makedirs, UPLOADS_FOLDER, exist_ok=True)
+    destination = new_upload_path(filename)
+    writer = await HashingWriter.open(destination)
+    try:
+        async for block in _blocks(chunks):
+            _check_size(writer.size + len(block))
+            await writer.write(block)
+    except BaseException:
+        await writer.close()
+        await asyncio.to_thread(destination.unlink, missing_ok=True)
+        raise
+    await writer.close()
+    sha256 = writer.digest.hexdigest()
+    await asyncio.to_thread(remember_file_hash, str(destination), sha256)
+    return destination, sha256, writer.size
+
+
+class UploadSession(BaseModel):
+    """
+    Resumable upload of one file, sent as consecutive pieces.
+
+    Each piece is appended at the session's current `offset`; if a transfer
+    breaks, whatever was received is kept and the client continues from the
+    offset reported by the server.
+    """
+
+    id: str
+    filename: str
+    size: Optional[int] = None
+    offset: int = 0
+    created: float
+
+    @staticmethod
+    def _path(upload_id: str, suffix: str) -> Path:
+        return Path(SESSIONS_FOLDER) / f"{upload_id}{suffix}"
+
+    @property
+    def data_path(self) -> Path:
+        return self._path(self.id, ".part")
+
+    async def _save(self) -> None:
+        def write():
+            tmp_path = self._path(self.id, ".json.tmp")
+            tmp_path.write_text(self.model_dump_json(), encoding="utf-8")
+            os.replace(tmp_path, self._path(self.id, ".json"))
+
+        await asyncio.to_thread(write)
+
+    @classmethod
+    async def create(cls, filename: str, size: Optional[int] = None) -> "UploadSession":
+        if not filename:
+            raise InvalidInputError("Filename is required")
+        if size is not None:
+            _check_size(size)
+        await asyncio.to_thread(_remove_stale_sessions)
+        session = cls(
+            id=uuid.uuid4().hex,
+            filename=Path(filename).name,
+            size=size,
+            created=time.time(),
+        )
+        await asyncio.to_thread(session.data_path.touch)
+        await session._save()
+        return session
+
+    @classmethod
+    async def load(cls, upload_id: str) -> "UploadSession":
+        if not _SESSION_ID_PATTERN.match(upload_id):
+            raise NotFoundError(f"Upload {upload_id} not found")
+        try:
+            data = await asyncio.to_thread(
+                cls._path(upload_id, ".json").read_text, encoding="utf-8"
+            )
+        except FileNotFoundError:
+            raise NotFoundError(f"Upload {upload_id} not found")
+        return cls(**json.loads(data))
+
+    async def _digest(self) -> Any:
+        cached = _session_digests.get(self.id)
+        if cached and cached[0] == self.offset:
+            return cached[1]
+        logger.debug(f"Rehashing the first {self.offset} bytes of upload {self.id}")
+        return await asyncio.to_thread(_hash_file, str(self.data_path), self.offset)
+
+    async def append(self, chunks: AsyncIterator[bytes], offset: int) -> None:
+        """
+        Append a piece that starts at `offset`, which must equal the bytes
+        received so far. The received prefix is kept even if the piece fails.
+        """
+        async with _session_locks.setdefault(self.id, asyncio.Lock()):
+            current = await UploadSession.load(self.id)
+            self.offset = current.offset
+            if offset != self.offset:
+                raise InvalidInputError(
+                    f"Upload {self.id} expects data at offset {self.offset}, not {offset}"
+                )
+            writer = await HashingWriter.open(
+                self.data_path, self.offset, (await self._digest()).copy()
+            )
+            try:
+                async for block in _blocks(chunks):
+                    total = writer.size + len(block)
+                    _check_size(total)
+                    if self.size is not None and total > self.size:
+                        raise InvalidInputError(
+                            f"Upload {self.id} is larger than its declared size"
+                        )
+                    await writer.write(block)
+            finally:
+                await writer.close()
+                self.offset = writer.size
+                _session_digests[self.id] = (writer.size, writer.digest)
+                await self._save()
+
+    async def complete(self) -> Tuple[Path, str, int]:
+        """Move the received file to the uploads folder; returns path, SHA-256 and size."""
+        async with _session_locks.setdefault(self.id, asyncio.Lock()):
+            self.offset = (await UploadSession.load(self.id)).offset
+            if self.size is not None and self.offset != self.size:
+                raise InvalidInputError(
+                    f"Upload {self.id} is incomplete: {self.offset} of {self.size} bytes"
+                )
+            sha256 = (await self._digest()).hexdigest()
+            destination = new_upload_path(self.filename)
+            await asyncio.to_thread(os.replace, self.data_path, destination)
+            await asyncio.to_thread(remember_file_hash, str(destination), sha256)
+            await self.abort()
+            return destination, sha256, self.offset
+
+    async def abort(self) -> None:
+        _session_digests.pop(self.id, None)
+        _session_locks.pop(self.id, None)
+        for suffix in (".part", ".json"):
+            await asyncio.to_thread(self._path(self.id, suffix).unlink, missing_ok=True)
+
+
+def _remove_stale_sessions() -> None:
+    os.makedirs(SESSIONS_FOLDER, exist_ok=True)
+    cutoff = time.time() - SESSION_TTL
+    for entry in os.scandir(SESSIONS_FOLDER):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                session_id = entry.name.split(".")[0]
+                _session_digests.pop(session_id, None)
+                _session_locks.pop(session_id, None)
+        except OSError:
+            continue
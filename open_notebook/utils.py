@@ -1,15 +1,26 @@
+import hashlib
+import math
 import re
 import unicodedata
+from collections import deque
+from functools import lru_cache
 from importlib.metadata import PackageNotFoundError, version
-from typing import Tuple
+from typing import Deque, Iterator, List, Tuple
 from urllib.parse import urlparse
 
 import requests
 import tomli
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from packaging.version import parse as parse_version
 
 
+@lru_cache(maxsize=None)
+def _get_encoding():
+    """Load the 'o200k_base' encoding once, on first use."""
+    import tiktoken
+
+    return tiktoken.get_encoding("o200k_base")
+
+
 def token_count(input_string) -> int:
     """
     Count the number of tokens in the input string using the 'o200k_base' encoding.
@@ -20,12 +31,59 @@ def token_count(input_string) -> int:
     Returns:
         int: The number of tokens in the input string.
     """
-    import tiktoken
+    return len(_get_encoding().encode(input_string))
+
+
+def token_counts(input_strings: List[str]) -> List[int]:
+    """
+    Count the tokens of several strings in one call, encoding them in parallel.
 
-    encoding = tiktoken.get_encoding("o200k_base")
-    tokens = encoding.encode(input_string)
-    token_count = len(tokens)
-    return token_count
+    Args:
+        input_strings (List[str]): The strings to count tokens for.
+
+    Returns:
+        List[int]: The number of tokens of each string, in order.
+    """
+    if not input_strings:
+        return []
+    return [len(tokens) for tokens in _get_encoding().encode_batch(input_strings)]
+
+
+def estimate_token_count(input_string: str) -> int:
+    """
+    Cheaply estimate the number of tokens without running the tokenizer.
+
+    Assumes about 4 characters per token for ASCII text and about 3 UTF-8 bytes
+    per token otherwise, which keeps CJK text from being badly underestimated.
+    Use it for threshold checks; use token_count when the exact number matters.
+
+    Args:
+        input_string (str): The input string to estimate tokens for.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    if input_string.isascii():
+        return math.ceil(len(input_string) / 4)
+    return max(
+        math.ceil(len(input_string) / 4),
+        math.ceil(len(input_string.encode("utf-8")) / 3),
+    )
+
+
+def content_hash(text: str) -> str:
+    """
+    SHA-256 of the text after Unicode (NFC) and whitespace normalization, so the
+    same document extracted twice hashes the same.
+
+    Args:
+        text (str): The text to hash.
+
+    Returns:
+        str: The hex digest.
+    """
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
 
 
 def token_cost(token_count, cost_per_million=0.150) -> float:
@@ -42,64 +100,183 @@ def token_cost(token_count, cost_per_million=0.150) -> float:
     return cost_per_million * (token_count / 1_000_000)
 
 
+# Split points in order of preference, from paragraphs down to single characters
+SPLIT_SEPARATORS = [
+    "\n\n",
+    "\n",
+    ".",
+    ",",
+    " ",
+    "\u200b",  # Zero-width space
+    "\uff0c",  # Fullwidth comma
+    "\u3001",  # Ideographic comma
+    "\uff0e",  # Fullwidth full stop
+    "\u3002",  # Ideographic full stop
+    "",
+]
+
+
+def _split_keeping_separator(text: str, separator: str) -> List[str]:
+    """Split on a literal separator, keeping it at the start of each piece."""
+    if not separator:
+        return list(text)
+    first, *rest = text.split(separator)
+    pieces = [first] + [separator + piece for piece in rest]
+    return [piece for piece in pieces if piece]
+
+
+class _ChunkMerger:
+    """
+    Greedily packs consecutive pieces into chunks of at most `chunk_size`
+    tokens, carrying up to `chunk_overlap` tokens of trailing pieces into the
+    next chunk. Piece lengths are passed in, so nothing is tokenized twice.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.pieces: Deque[Tuple[str, int]] = deque()
+        self.total = 0
+
+    def add(self, piece: str, length: int) -> Iterator[str]:
+        if self.total + length > self.chunk_size and self.pieces:
+            chunk = self._join()
+            if chunk:
+                yield chunk
+            while self.total > self.chunk_overlap or (
+                self.total + length > self.chunk_size and self.total > 0
+            ):
+                self.total -= self.pieces.popleft()[1]
+        self.pieces.append((piece, length))
+        self.total += length
+
+    def flush(self) -> Iterator[str]:
+        chunk = self._join()
+        if chunk:
+            yield chunk
+        self.pieces.clear()
+        self.total = 0
+
+    def _join(self) -> str:
+        return "".join(piece for piece, _ in self.pieces).strip()
+
+
+def _iter_chunks(
+    text: str, separators: List[str], chunk_size: int, chunk_overlap: int
+) -> Iterator[str]:
+    # Use the first separator present in the text; pieces that are still too
+    # large are split again with the separators that come after it.
+    separator = separators[-1]
+    remaining: List[str] = []
+    for idx, candidate in enumerate(separators):
+        if not candidate:
+            separator = candidate
+            break
+        if candidate in text:
+            separator = candidate
+            remaining = separators[idx + 1 :]
+            break
+
+    pieces = _split_keeping_separator(text, separator)
+    merger = _ChunkMerger(chunk_size, chunk_overlap)
+    encoding = _get_encoding()
+    for piece in pieces:
+        length = len(encoding.encode(piece))
+        if length < chunk_size:
+            yield from merger.add(piece, length)
+            continue
+        yield from merger.flush()
+        if remaining:
+            yield from _iter_chunks(piece, remaining, chunk_size, chunk_overlap)
+        else:
+            yield piece
+    yield from merger.flush()
+
+
+def iter_split_text(txt: str, chunk_size=500) -> Iterator[str]:
+    """
+    Lazily split the input text into chunks of at most `chunk_size` tokens.
+
+    Every piece of text is tokenized once and its length reused while packing,
+    so the cost grows linearly with the size of the document. Chunks are
+    produced in order as they are completed.
+
+    Args:
+        txt (str): The input text to be split.
+        chunk_size (int): The maximum size of each chunk in tokens. Default is 500.
+
+    Yields:
+        str: The next text chunk.
+    """
+    overlap = int(chunk_size * 0.15)
+    yield from _iter_chunks(txt, SPLIT_SEPARATORS, chunk_size, overlap)
+
+
 def split_text(txt: str, chunk_size=500):
     """
     Split the input text into chunks.
 
+    Pieces are cut at the first of SPLIT_SEPARATORS found in the text and
+    recursively at the next ones when still too large, then packed into chunks
+    of at most `chunk_size` tokens with a 15% token overlap. This produces the
+    same chunks as langchain's RecursiveCharacterTextSplitter configured with
+    those separators and token_count as length function.
+
     Args:
         txt (str): The input text to be split.
-        chunk (int): The size of each chunk. Default is 1000.
-        overlap (int): The number of characters to overlap between chunks. Default is 0.
-        separator (str): The separator to use when splitting the text. Default is " ".
+        chunk_size (int): The maximum size of each chunk in tokens. Default is 500.
 
     Returns:
         list: A list of text chunks.
     """
-    overlap = int(chunk_size * 0.15)
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap,
-        length_function=token_count,
-        separators=[
-            "\n\n",
-            "\n",
-            ".",
-            ",",
-            " ",
-            "\u200b",  # Zero-width space
-            "\uff0c",  # Fullwidth comma
-            "\u3001",  # Ideographic comma
-            "\uff0e",  # Fullwidth full stop
-            "\u3002",  # Ideographic full stop
-            "",
-        ],
-    )
-    return text_splitter.split_text(txt)
+    return list(iter_split_text(txt, chunk_size))
 
 
 def remove_non_ascii(text) -> str:
     return re.sub(r"[^\x00-\x7F]+", "", text)
 
 
+_SPECIAL_WHITESPACE_PATTERN = re.compile(r"[\u2000-\u200B\u202F\u205F\u3000]")
+_LINE_TERMINATOR_PATTERN = re.compile(r"[\u2028\u2029\r]")
+_DISALLOWED_CHARS_PATTERN = re.compile(r"[^\w\s.,!?\-\n\t]", flags=re.UNICODE)
+
+
+def _char_class(codes: List[int]) -> str:
+    """Build a regex character class from sorted code points, merging runs."""
+    ranges = []
+    start = prev = codes[0]
+    for code in codes[1:]:
+        if code != prev + 1:
+            ranges.append((start, prev))
+            start = code
+        prev = code
+    ranges.append((start, prev))
+    return "[" + "".join(f"\\U{lo:08x}-\\U{hi:08x}" for lo, hi in ranges) + "]"
+
+
 def remove_non_printable(text) -> str:
     # Replace any special Unicode whitespace characters with a regular space
-    text = re.sub(r"[\u2000-\u200B\u202F\u205F\u3000]", " ", text)
+    text = _SPECIAL_WHITESPACE_PATTERN.sub(" ", text)
 
     # Replace unusual line terminators with a single newline
-    text = re.sub(r"[\u2028\u2029\r]", "\n", text)
-
-    # Remove control characters, except newlines and tabs
-    text = "".join(
-        char for char in text if unicodedata.category(char)[0] != "C" or char in "\n\t"
+    text = _LINE_TERMINATOR_PATTERN.sub("\n", text)
+
+    # Remove control characters, except newlines and tabs. Only the distinct
+    # characters of the text need a category lookup; the ones to drop are then
+    # removed in a single regex pass instead of a per-character Python loop.
+    control_codes = sorted(
+        ord(char)
+        for char in set(text)
+        if unicodedata.category(char)[0] == "C" and char not in "\n\t"
     )
+    if control_codes:
+        text = re.sub(_char_class(control_codes), "", text)
 
     # Replace non-breaking spaces with regular spaces
     text = text.replace("\xa0", " ").strip()
 
     # Keep letters (including accented ones), numbers, spaces, newlines, tabs, and basic punctuation
-    return re.sub(r"[^\w\s.,!?\-\n\t]", "", text, flags=re.UNICODE)
-
-
+    return _DISALLOWED_CHARS_PATTERN.sub("", text)
 
 
 def get_version_from_github(repo_url: str, branch: str = "main") -> str:
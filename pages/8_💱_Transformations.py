@@ -92,12 +92,21 @@ with transformations_tab:
                     transformation.apply_default,
                     key=f"{transformation.id}_apply_default",
                 )
+                map_reduce = st.checkbox(
+                    "Process long sources in chunks (map-reduce)",
+                    transformation.execution_mode == "map_reduce",
+                    key=f"{transformation.id}_map_reduce",
+                    help="Runs the prompt over chunks of long sources in parallel and combines the results, instead of sending the whole text to a large context model.",
+                )
                 if st.button("Save", key=f"{transformation.id}_save"):
                     transformation.name = name
                     transformation.title = title
                     transformation.description = description
                     transformation.prompt = prompt
                     transformation.apply_default = apply_default
+                    transformation.execution_mode = (
+                        "map_reduce" if map_reduce else "single"
+                    )
                     st.toast(f"Transformation '{name}' saved successfully!")
                     transformations_service.update_transformation(transformation)
                     st.rerun()
@@ -101,12 +101,16 @@ def source_panel(source_id: str, notebook_id=None, modal=False):
 
             with st.container(border=True):
                 st.caption(
-                    "Deleting the source will also delete all its insights and embeddings"
+                    "Deleting the source will also delete all its insights and embeddings, unless other notebooks use it"
+                    if notebook_id
+                    else "Deleting the source will also delete all its insights and embeddings"
                 )
                 if st.button(
                     "Delete", type="primary", key=f"bt_delete_source_{source_with_metadata.id}"
                 ):
-                    sources_service.delete_source(source_with_metadata.id)
+                    sources_service.delete_source(
+                        source_with_metadata.id, notebook_id=notebook_id
+                    )
                     st.rerun()
 
     with source_tab:
@@ -2,13 +2,13 @@ import asyncio
 
 import humanize
 import streamlit as st
-from langchain_core.runnables import RunnableConfig
 from loguru import logger
 
+from api.chat_service import chat_service
 from api.notes_service import notes_service
 from api.search_service import search_service
+from open_notebook.context_packer import DEFAULT_CONTEXT_TOKEN_BUDGET
 from open_notebook.domain.notebook import ChatSession, Notebook
-from open_notebook.graphs.chat import graph as chat_graph
 
 from open_notebook.utils import parse_thinking_content, token_count
 from pages.stream_app.utils import (
@@ -19,11 +19,8 @@ from pages.stream_app.utils import (
 from .note import make_note_from_chat
 
 
-# todo: build a smarter, more robust context manager function
-def build_context(notebook_id):
-    from api.context_service import context_service
-
-    # Convert context_config format for API
+def api_context_config(notebook_id):
+    """The notebook's context selection in the format of the API."""
     context_config = {"sources": {}, "notes": {}}
 
     for id, status in st.session_state[notebook_id]["context_config"].items():
@@ -38,10 +35,20 @@ def build_context(notebook_id):
             context_config["sources"][item_id] = status
         elif item_type == "note":
             context_config["notes"][item_id] = status
+    return context_config
+
+
+# todo: build a smarter, more robust context manager function
+def build_context(notebook_id, question=None):
+    from api.context_service import context_service
 
-    # Get context via API
+    # Get context via API, ranked against the question when there is one and
+    # packed into the budget chat applies
     result = context_service.get_notebook_context(
-        notebook_id=notebook_id, context_config=context_config
+        notebook_id=notebook_id,
+        context_config=api_context_config(notebook_id),
+        question=question,
+        token_budget=DEFAULT_CONTEXT_TOKEN_BUDGET,
     )
 
     # Store in session state for compatibility
@@ -49,20 +56,31 @@ def build_context(notebook_id):
         "note": result["notes"],
         "source": result["sources"],
     }
+    st.session_state[notebook_id]["context_dropped"] = result.get("dropped", [])
 
     return st.session_state[notebook_id]["context"]
 
 
-def execute_chat(txt_input, context, current_session):
-    current_state = st.session_state[current_session.id]
-    current_state["messages"] += [txt_input]
-    current_state["context"] = context
-    result = chat_graph.invoke(
-        input=current_state,
-        config=RunnableConfig(configurable={"thread_id": current_session.id}),
-    )
-    current_session.save()
-    return result
+def execute_chat(txt_input, notebook_id, current_session, placeholder=None):
+    """
+    Run a chat turn through the API, which builds the notebook context and
+    keeps the session state. The answer is shown in `placeholder` as it
+    streams in; returns the session's messages and the summary of older ones.
+    """
+    answer = ""
+    for event, data in chat_service.send_message(
+        session_id=current_session.id,
+        message=txt_input,
+        notebook_id=notebook_id,
+        context_config=api_context_config(notebook_id),
+    ):
+        if event == "token":
+            answer += data["content"]
+            if placeholder is not None:
+                placeholder.markdown(answer)
+        elif event == "error":
+            raise RuntimeError(data["message"])
+    return chat_service.get_history(current_session.id)
 
 
 def chat_sidebar(current_notebook: Notebook, current_session: ChatSession):
@@ -72,6 +90,11 @@ def chat_sidebar(current_notebook: Notebook, current_session: ChatSession):
     )
     chat_tab, research_tab = st.tabs(["Chat", "Research"])
     with st.expander(f"Context ({tokens} tokens), {len(str(context))} chars"):
+        dropped = st.session_state[current_notebook.id].get("context_dropped")
+        if dropped:
+            st.caption(
+                f"{len(dropped)} items were left out to fit the context token budget"
+            )
         st.json(context)
     notebook_state = st.session_state.setdefault(current_notebook.id, {})
     research_state = notebook_state.setdefault("research", {})
@@ -131,12 +154,18 @@ def chat_sidebar(current_notebook: Notebook, current_session: ChatSession):
             request = st.chat_input("Enter your question")
             # removing for now since it's not multi-model capable right now
             if request:
-                response = execute_chat(
+                streaming = st.empty()
+                with streaming.container():
+                    with st.chat_message(name="ai"):
+                        answer = st.empty()
+                history = execute_chat(
                     txt_input=request,
-                    context=context,
+                    notebook_id=current_notebook.id,
                     current_session=current_session,
+                    placeholder=answer,
                 )
-                st.session_state[current_session.id]["messages"] = response["messages"]
+                streaming.empty()
+                st.session_state[current_session.id].update(history)
 
             for msg in st.session_state[current_session.id]["messages"][::-1]:
                 if msg.type not in ["human", "ai"]:
@@ -175,6 +204,11 @@ def chat_sidebar(current_notebook: Notebook, current_session: ChatSession):
                         # Human messages - display normally
                         st.markdown(convert_source_references(msg.content))
 
+            summary = st.session_state[current_session.id].get("summary")
+            if summary:
+                with st.expander("Earlier conversation (summarized)"):
+                    st.markdown(convert_source_references(summary))
+
     with research_tab:
         st.subheader("Research Synthesis", anchor=False)
         st.caption(
@@ -7,11 +7,14 @@ import nest_asyncio
 import streamlit as st
 from loguru import logger
 
+from api.chat_service import chat_service
+from open_notebook.database.repository import transaction
+
 nest_asyncio.apply()
 from api.models_service import models_service
 from open_notebook.database.migrate import MigrationManager
 from open_notebook.domain.notebook import ChatSession, Notebook
-from open_notebook.graphs.chat import ThreadState, graph
+from open_notebook.graphs.chat import ThreadState
 from open_notebook.utils import (
     compare_versions,
     get_installed_version,
@@ -61,8 +64,13 @@ def create_session_for_notebook(notebook_id: str, session_name: str = None):
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     title = f"Chat Session {current_time}" if not session_name else session_name
     chat_session = ChatSession(title=title)
-    asyncio.run(chat_session.save())
-    asyncio.run(chat_session.relate_to_notebook(notebook_id))
+
+    async def _create():
+        async with transaction():
+            await chat_session.save()
+            await chat_session.relate_to_notebook(notebook_id)
+
+    asyncio.run(_create())
     return chat_session
 
 
@@ -101,16 +109,15 @@ def setup_stream_state(current_notebook: Notebook) -> ChatSession:
     # sets the active session for the notebook
     st.session_state[current_notebook.id]["active_session"] = chat_session.id
 
-    # gets the existing state for the session from Langgraph state
-    existing_state = graph.get_state(
-        {"configurable": {"thread_id": chat_session.id}}
-    ).values
-    if not existing_state or len(existing_state.keys()) == 0:
-        st.session_state[chat_session.id] = ThreadState(
-            messages=[], context=None, notebook=None, context_config={}
-        )
-    else:
-        st.session_state[chat_session.id] = existing_state
+    # gets the messages of the session, kept by the API in Langgraph state
+    history = chat_service.get_history(chat_session.id)
+    st.session_state[chat_session.id] = ThreadState(
+        messages=history["messages"],
+        context=None,
+        notebook=None,
+        context_config={},
+        summary=history["summary"],
+    )
 
     st.session_state[current_notebook.id]["active_session"] = chat_session.id
     return chat_session
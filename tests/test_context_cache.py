@@ -0,0 +1,186 @@
+import asyncio
+
+import pytest
+
+from api.models import ContextConfig
+from open_notebook import context_cache
+from open_notebook.context_cache import NotebookContextCache, _wanted_keys
+from open_notebook.database.repository import transaction
+from open_notebook.domain import base
+from open_notebook.domain.base import notify_change
+
+SOURCE = ("source", "source:1", "short")
+NOTE = ("note", "note:1", "short")
+LONG_NOTE = ("note", "note:1", "long")
+
+
+def source_context(title="Solar"):
+    return {
+        "id": "source:1",
+        "title": title,
+        "insights": [{"id": "source_insight:1", "content": "summary"}],
+    }
+
+
+def note_context(content="costs"):
+    return {"id": "note:1", "title": "Note", "content": content}
+
+
+class FakeDatabase:
+    """Versions and contexts served to a cache instead of SurrealDB."""
+
+    def __init__(self, cache):
+        self.versions = {"source:1": ("v1", ()), "note:1": ("v1",)}
+        self.contexts = {
+            SOURCE: source_context(),
+            NOTE: note_context(),
+            LONG_NOTE: note_context(),
+        }
+        self.loads = []
+        self.during_load = None
+        cache._versions = self.get_versions
+        cache._load = self.load
+
+    async def get_versions(self, notebook_id, context_config):
+        keys = _wanted_keys(context_config) if context_config else [SOURCE, NOTE]
+        return keys, dict(self.versions)
+
+    async def load(self, keys):
+        self.loads.append(list(keys))
+        contexts = {key: self.contexts[key] for key in keys}
+        if self.during_load:
+            self.during_load()
+        return contexts
+
+
+@pytest.fixture(autouse=True)
+def count_one_token_per_item(monkeypatch):
+    monkeypatch.setattr(
+        context_cache, "cached_token_counts", lambda texts: [1] * len(texts)
+    )
+
+
+def test_wanted_keys_follow_the_context_config():
+    config = ContextConfig(
+        sources={
+            "1": "insights",
+            "source:2": "full content",
+            "3": "not in context",
+        },
+        notes={"n1": "full content", "n2": "not in context"},
+    )
+    assert _wanted_keys(config) == [
+        ("source", "source:1", "short"),
+        ("source", "source:2", "long"),
+        ("note", "note:n1", "long"),
+    ]
+
+
+def test_get_loads_only_changed_entries():
+    async def run():
+        cache = NotebookContextCache(100, revalidate_after=0)
+        db = FakeDatabase(cache)
+        first = await cache.get("notebook:1")
+        db.versions["note:1"] = ("v2",)
+        db.contexts[NOTE] = note_context("new costs")
+        second = await cache.get("notebook:1")
+        return db.loads, first, second
+
+    loads, first, second = asyncio.run(run())
+    assert loads == [[SOURCE, NOTE], [NOTE]]
+    assert first.sources == second.sources == [source_context()]
+    assert second.notes == [note_context("new costs")]
+    assert [(item.kind, item.tokens) for item in second.items] == [
+        ("insight", 1),
+        ("note", 1),
+    ]
+
+
+def test_get_skips_the_version_check_while_fresh():
+    async def run():
+        cache = NotebookContextCache(100, revalidate_after=60)
+        db = FakeDatabase(cache)
+        checks = 0
+        get_versions = db.get_versions
+
+        async def count_checks(*args):
+            nonlocal checks
+            checks += 1
+            return await get_versions(*args)
+
+        cache._versions = count_checks
+        await cache.get("notebook:1")
+        await cache.get("notebook:1")
+        return checks
+
+    assert asyncio.run(run()) == 1
+
+
+def test_invalidating_an_insight_reloads_its_source():
+    async def run():
+        cache = NotebookContextCache(100, revalidate_after=60)
+        db = FakeDatabase(cache)
+        await cache.get("notebook:1")
+        cache.invalidate("source_insight:1")
+        db.contexts[SOURCE] = source_context("Solar, updated")
+        context = await cache.get("notebook:1")
+        return db.loads, context
+
+    loads, context = asyncio.run(run())
+    assert loads == [[SOURCE, NOTE], [SOURCE]]
+    assert context.sources == [source_context("Solar, updated")]
+
+
+def test_view_loaded_during_an_invalidation_is_rechecked():
+    async def run():
+        cache = NotebookContextCache(100, revalidate_after=60)
+        db = FakeDatabase(cache)
+
+        def save_note():
+            db.versions["note:1"] = ("v2",)
+            db.contexts[NOTE] = note_context("new costs")
+            cache.invalidate("note:1")
+
+        # The note changes after its old state was read
+        db.during_load = save_note
+        db.contexts[NOTE] = note_context("old costs")
+        await cache.get("notebook:1")
+        db.during_load = None
+        context = await cache.get("notebook:1")
+        return db.loads, context
+
+    loads, context = asyncio.run(run())
+    assert loads == [[SOURCE, NOTE], [NOTE]]
+    assert context.notes == [note_context("new costs")]
+
+
+def test_least_recently_used_entries_are_evicted():
+    async def run():
+        cache = NotebookContextCache(2, revalidate_after=60)
+        FakeDatabase(cache)
+        await cache.get("notebook:1")
+        await cache.get("notebook:1", ContextConfig(notes={"1": "full content"}))
+        return cache
+
+    cache = asyncio.run(run())
+    assert list(cache._entries) == [NOTE[1:], LONG_NOTE[1:]]
+    assert len(cache._views) == 2
+    # The evicted source no longer maps its insights
+    assert cache._parents == {}
+
+
+def test_changes_in_a_transaction_are_notified_after_commit(monkeypatch):
+    seen = []
+    monkeypatch.setattr(base, "_change_listeners", [seen.append])
+
+    async def run():
+        async with transaction():
+            notify_change("source:1")
+            assert seen == []
+        with pytest.raises(RuntimeError):
+            async with transaction():
+                notify_change("note:1")
+                raise RuntimeError()
+
+    asyncio.run(run())
+    assert seen == ["source:1"]
@@ -0,0 +1,131 @@
+from open_notebook import context_packer
+from open_notebook.context_packer import (
+    ContextItem,
+    context_items,
+    pack_items,
+    pack_notebook_context,
+    score_items,
+)
+
+
+def item(id, tokens, kind="note", text="", score=0.0, parent_id=None):
+    return ContextItem(
+        id=id,
+        kind=kind,
+        text=text,
+        payload={"id": id},
+        tokens=tokens,
+        score=score,
+        parent_id=parent_id,
+    )
+
+
+def count_by_words(calls):
+    def token_counts(texts):
+        calls.append(list(texts))
+        return [len(text.split()) for text in texts]
+
+    return token_counts
+
+
+def test_score_items_ranks_matching_items_first():
+    items = [
+        item("a", 1, text="cooking pasta at home"),
+        item("b", 1, text="solar panel efficiency and solar storage"),
+        item("c", 1, text="wind turbines"),
+    ]
+    scores = score_items(items, "How efficient are solar panels?")
+    assert scores[1] > scores[0] == scores[2] == 0
+    assert score_items(items, "") == [0.0, 0.0, 0.0]
+
+
+def test_pack_items_keeps_best_items_within_budget():
+    items = [
+        item("low", 30, score=0.1),
+        item("best", 60, score=0.9),
+        item("next", 50, score=0.8),
+    ]
+    packed = pack_items(items, 100)
+    # "next" does not fit after "best", so the smaller "low" takes its place
+    assert [kept.id for kept in packed.items] == ["low", "best"]
+    assert packed.tokens == 90
+    assert [(d.id, d.tokens) for d in packed.dropped] == [("next", 50)]
+
+
+def test_pack_items_without_budget_keeps_everything():
+    items = [item("a", 10), item("b", 20)]
+    packed = pack_items(items, None)
+    assert [kept.id for kept in packed.items] == ["a", "b"]
+    assert packed.tokens == 30
+    assert not packed.dropped
+
+
+def test_pack_items_prefers_denser_kinds_without_a_question():
+    items = [
+        item("text", 10, kind="full_text"),
+        item("note", 10, kind="note"),
+        item("insight", 10, kind="insight"),
+    ]
+    packed = pack_items(items, 20)
+    assert [kept.id for kept in packed.items] == ["note", "insight"]
+
+
+def test_pack_items_uses_question_relevance():
+    items = [
+        item("pasta", 10, text="cooking pasta"),
+        item("solar", 10, text="solar panels"),
+    ]
+    packed = pack_items(items, 10, question="solar")
+    assert [kept.id for kept in packed.items] == ["solar"]
+    assert packed.dropped[0].id == "pasta"
+
+
+def test_token_counts_are_cached_per_text(monkeypatch):
+    calls = []
+    monkeypatch.setattr(context_packer, "token_counts", count_by_words(calls))
+    monkeypatch.setattr(context_packer, "_token_cache", context_packer.OrderedDict())
+
+    assert context_packer.cached_token_counts(["one two", "three"]) == [2, 1]
+    assert context_packer.cached_token_counts(["three", "four five six"]) == [1, 3]
+    assert calls == [["one two", "three"], ["four five six"]]
+
+
+def test_pack_notebook_context_keeps_insights_when_full_text_is_dropped(
+    monkeypatch,
+):
+    monkeypatch.setattr(context_packer, "token_counts", count_by_words([]))
+    sources = [
+        {
+            "id": "source:1",
+            "title": "Solar",
+            "insights": [{"id": "source_insight:1", "content": "solar summary"}],
+            "full_text": " ".join(["solar"] * 200),
+        },
+        {
+            "id": "source:2",
+            "title": "Pasta",
+            "insights": [{"id": "source_insight:2", "content": "pasta summary"}],
+        },
+    ]
+    notes = [{"id": "note:1", "title": "Solar note", "content": "solar costs"}]
+
+    items = context_items(sources, notes)
+    assert [(i.kind, i.parent_id) for i in items] == [
+        ("insight", "source:1"),
+        ("full_text", "source:1"),
+        ("insight", "source:2"),
+        ("note", None),
+    ]
+
+    context, packed = pack_notebook_context(
+        sources, notes, budget=15, question="solar", items=items
+    )
+    assert context["source"] == [
+        {
+            "id": "source:1",
+            "title": "Solar",
+            "insights": [{"id": "source_insight:1", "content": "solar summary"}],
+        }
+    ]
+    assert context["note"] == notes
+    assert {d.id for d in packed.dropped} == {"source:1", "source_insight:2"}
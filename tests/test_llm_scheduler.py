@@ -0,0 +1,165 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+from open_notebook.llm_scheduler import (
+    LLMScheduler,
+    Priority,
+    ScheduledModel,
+    TokenBucket,
+    _ConcurrencyGate,
+    _schedulers,
+    parse_priority,
+)
+
+
+def fake_model(replies=1):
+    return GenericFakeChatModel(
+        messages=iter([AIMessage(content="hello world")] * replies)
+    )
+
+
+def test_parse_priority():
+    assert parse_priority("interactive") is Priority.INTERACTIVE
+    assert parse_priority(2) is Priority.BACKGROUND
+    assert parse_priority(None, Priority.BACKGROUND) is Priority.BACKGROUND
+    assert parse_priority("urgent") is Priority.DEFAULT
+
+
+def test_token_bucket_serves_waiters_by_priority():
+    async def run():
+        # 1000 per second, so each waiter below waits about 10ms
+        bucket = TokenBucket(60_000)
+        await bucket.acquire(60_000, Priority.DEFAULT)
+        order = []
+
+        async def acquire(name, priority):
+            await bucket.acquire(10, priority)
+            order.append(name)
+
+        background = asyncio.create_task(acquire("background", Priority.BACKGROUND))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(acquire("interactive", Priority.INTERACTIVE))
+        await asyncio.gather(background, interactive)
+        return order
+
+    assert asyncio.run(run()) == ["interactive", "background"]
+
+
+def test_token_bucket_caps_requests_at_capacity():
+    async def run():
+        bucket = TokenBucket(60)
+        await asyncio.wait_for(bucket.acquire(1_000, Priority.DEFAULT), 1)
+        return bucket.available
+
+    assert asyncio.run(run()) == pytest.approx(0, abs=0.1)
+
+
+def test_concurrency_gate_hands_slots_over_by_priority():
+    async def run():
+        gate = _ConcurrencyGate(1)
+        await gate.acquire(Priority.DEFAULT)
+        order = []
+
+        async def hold(name, priority):
+            await gate.acquire(priority)
+            order.append(name)
+            gate.release()
+
+        tasks = [
+            asyncio.create_task(hold("background", Priority.BACKGROUND)),
+            asyncio.create_task(hold("interactive", Priority.INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert gate.waiting == 2
+        gate.release()
+        await asyncio.gather(*tasks)
+        return order, gate.active
+
+    assert asyncio.run(run()) == (["interactive", "background"], 0)
+
+
+def test_scheduler_caps_concurrent_calls():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=2)
+        active = peak = 0
+
+        async def call():
+            nonlocal active, peak
+            async with scheduler.slot("openai/gpt", Priority.DEFAULT):
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        return peak
+
+    assert asyncio.run(run()) == 2
+
+
+def test_scheduler_shares_provider_rate_limits():
+    scheduler = LLMScheduler(
+        max_concurrency=0,
+        requests_per_minute=100,
+        rate_limits={"openai": {"requests_per_minute": 10}},
+    )
+    first = scheduler._bucket("openai/gpt-4o", "requests_per_minute")
+    second = scheduler._bucket("openai/gpt-4o-mini", "requests_per_minute")
+    other = scheduler._bucket("anthropic/claude", "requests_per_minute")
+    assert first is second
+    assert first.capacity == 10
+    assert other.capacity == 100
+    assert scheduler._bucket("anthropic/claude", "tokens_per_minute") is None
+
+
+def test_scheduled_model_calls_wait_for_a_slot():
+    async def run():
+        scheduler = LLMScheduler(max_concurrency=1)
+        _schedulers[asyncio.get_running_loop()] = scheduler
+        model = ScheduledModel(fake_model(2), "fake/model", Priority.INTERACTIVE)
+        chain = ChatPromptTemplate.from_messages([("human", "{question}")]) | model
+
+        await scheduler.gate.acquire(Priority.DEFAULT)
+        call = asyncio.create_task(chain.ainvoke({"question": "hi"}))
+        for _ in range(100):
+            if scheduler.gate.waiting:
+                break
+            await asyncio.sleep(0.01)
+        assert not call.done() and scheduler.gate.waiting == 1
+        scheduler.gate.release()
+        answer = await call
+
+        chunks = [chunk.content async for chunk in model.astream("hi")]
+        return answer.content, "".join(chunks), scheduler.gate.active
+
+    assert asyncio.run(run()) == ("hello world", "hello world", 0)
+
+
+def test_scheduled_model_sync_calls_reach_the_model():
+    model = ScheduledModel(fake_model(2), "fake/model", Priority.DEFAULT)
+    assert model.invoke("hi").content == "hello world"
+    assert "".join(chunk.content for chunk in model.stream("hi")) == "hello world"
+
+
+class ToolModel(GenericFakeChatModel):
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=[tool.__name__ for tool in tools], **kwargs)
+
+
+def test_scheduled_model_binds_tools_on_itself():
+    def search(query: str) -> str:
+        """Search the notebook."""
+        return query
+
+    model = ScheduledModel(
+        ToolModel(messages=iter([AIMessage(content="hello world")])),
+        "fake/model",
+        Priority.DEFAULT,
+    )
+    bound = model.bind_tools([search])
+    assert bound.bound is model
+    assert bound.kwargs == {"tools": ["search"]}